@@ -1 +1,2 @@
-from api.routes.webhook.evolution.router import router as webhook_evolution_router
\ No newline at end of file
+from api.routes.webhook.evolution.router import router as webhook_evolution_router
+from api.routes.metrics.router import router as metrics_router
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Header, HTTPException
+from starlette import status
+
+from utils import get_env_var
+from utils.metrics import metrics
+
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["Metrics"]
+)
+
+METRICS_KEY = get_env_var("METRICS_KEY")
+
+
+@router.get("")
+async def get_metrics(apikey: str | None = Header(default=None)):
+    if METRICS_KEY and apikey != METRICS_KEY:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid API key"
+        )
+
+    return metrics.snapshot()
@@ -2,10 +2,12 @@ from api.routes.webhook.evolution.functions.sticker.static import add_caption_to
 from api.routes.webhook.evolution.functions.sticker.animated import animated
 from api.routes.webhook.evolution.functions.remember import remember_generator
 from api.routes.webhook.evolution.functions.tokens import token_consumption
-from api.routes.webhook.evolution.functions.generic import generic_conversation
+from api.routes.webhook.evolution.functions.generic import generic_conversation, generic_conversation_stream, save_generic_reply
 from api.routes.webhook.evolution.functions.image import list_images, search_images, generate_image
 from api.routes.webhook.evolution.functions.resume import get_resume_conversation
 from api.routes.webhook.evolution.functions.transcribe_audio import transcribe_audio
 from api.routes.webhook.evolution.functions.web_search import web_search
 from api.routes.webhook.evolution.functions.picture import get_pictures
-from api.routes.webhook.evolution.functions.twitter_video import download_twitter_video, extract_twitter_url
+from api.routes.webhook.evolution.functions.twitter_video import (
+    extract_twitter_url, get_twitter_media
+)
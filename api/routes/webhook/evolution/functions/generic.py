@@ -1,70 +1,141 @@
-import json
 from datetime import datetime
+from typing import AsyncIterator
 from uuid import uuid4
 
+from sqlalchemy.ext.asyncio import AsyncSession
+
 from database import PgConnection
 from database.models.base import User
 from database.models.content import Message
 from database.operations.base.user import UserRepository
 from database.operations.content.message import MessageRepository
-from services import manage_interaction
+from services import manage_interaction, manage_interaction_stream
+from services.context_builder import get_budget, fit_messages
+from services.message_buffer import message_buffer, CAPACITY as BUFFER_CAPACITY
+from services.message_embedder import recall
+from services.structured_output import GENERIC_REPLY
+from services.summarizer import get_summary, summary_tail
 from utils import get_env_var
+from utils.json_stream import JsonFieldStream
+
+
+STREAMING_FORMAT_HINT = 'Escreva o campo "language" antes do campo "text": {"language": "pt", "text": "..."}'
 
 
-async def generic_conversation(contact_id: int, user_name: str, last_message: str, user_id: int, message_context: dict, is_group: bool = True) -> dict:
+async def _get_gork_user(db: AsyncSession) -> User:
+    user_repo = UserRepository(User, db)
+    user_gork = await user_repo.find_by_name("Gork")
+    # TODO: This SHOULD BE removed later. A better solution has to be implemented.
+    if not user_gork:
+        user_gork = await user_repo.insert(User(name="Gork", src_id=str(uuid4()), phone_number=get_env_var("EVOLUTION_INSTANCE_NUMBER")))
+    return user_gork
+
+
+async def _build_prompt(db: AsyncSession, contact_id: int, user_name: str, last_message: str, message_context: dict, is_group: bool) -> str:
     quoted_text = message_context["text_quote"] if "text_quote" in message_context.keys() else None
 
+    chat_summary = None
+    if is_group:
+        messages = await message_buffer.recent(db, BUFFER_CAPACITY, group_id=contact_id)
+        chat_summary = await get_summary(db, contact_id)
+    else:
+        messages = await message_buffer.recent(db, BUFFER_CAPACITY, user_id=contact_id)
+
+    # Older messages related to the question, beyond the ones already in memory
+    related = await recall(
+        db, last_message, group_id=contact_id if is_group else None, user_id=None if is_group else contact_id,
+        exclude_ids=[msg.id for msg in messages if msg.id is not None]
+    )
+    related_text = "\n".join(msg.format() for msg in related)
+
+    if chat_summary is not None:
+        # Older messages are already in the summary, only the ones after it (or a short tail) are sent raw
+        messages = summary_tail(messages, chat_summary)
+
+    message = (
+            (f"Mensagem quotada: {quoted_text}\n" if quoted_text else "") +
+            "Última mensagem enviada e que dever ser respondida:\n"
+            f"{user_name}: {last_message} - {datetime.now().strftime('%H:%M')}"
+    )
+
+    budget = await get_budget(db, "generic")
+    reserved = message + related_text + (chat_summary.summary if chat_summary is not None else "")
+    messages = await fit_messages(messages, budget, reserved=reserved, dedupe=True)
+
+    formatted_messages = [msg.format() for msg in messages]
+    formatted_messages.append(message)
+    if chat_summary is not None and chat_summary.summary:
+        formatted_messages.insert(0, f"Resumo da conversa até aqui:\n{chat_summary.summary}\n\nMensagens recentes:")
+    if related:
+        formatted_messages.insert(0, f"Mensagens antigas relacionadas:\n{related_text}\n")
+    return "\n".join(formatted_messages)
+
+
+async def _save_reply(db: AsyncSession, contact_id: int, is_group: bool, text: str) -> None:
+    user_gork = await _get_gork_user(db)
+    message_repo = MessageRepository(Message, db)
+    reply = await message_repo.insert(Message(
+        message_id=str(uuid4()),
+        group_id = contact_id if is_group else None,
+        user_id=user_gork.id,
+        content=text,
+        created_at=datetime.now()
+    ))
+    message_buffer.append(reply, user_gork.name)
+
+
+async def generic_conversation(
+        contact_id: int, user_name: str, last_message: str,
+        user_id: int, message_context: dict, is_group: bool = True,
+        persist_reply: bool = True
+) -> dict:
+    """
+    Args:
+        persist_reply: Saves the reply as a Gork message. Speculative calls pass False
+            and save it with ``save_generic_reply`` only if the reply is actually sent
+    """
     async with PgConnection() as db:
-        user_repo = UserRepository(User, db)
-        user_gork = await user_repo.find_by_name("Gork")
-        # TODO: This SHOULD BE removed later. A better solution has to be implemented.
-        if not user_gork:
-            user_gork = await user_repo.insert(User(name="Gork", src_id=str(uuid4()), phone_number=get_env_var("EVOLUTION_INSTANCE_NUMBER")))
-
-        message_repo = MessageRepository(Message, db)
-        if is_group:
-            messages = await message_repo.find_by_group(contact_id, 20)
-        else:
-            messages = await message_repo.find_by_sender(contact_id, 15)
-
-        formatted_messages = []
-        existing_messages = []
-        for msg in messages:
-            sender_name = msg.sender.name or msg.sender.phone_jid or "Usuário Desconhecido"
-            content = msg.content or ""
-
-            if content.lower() in existing_messages:
-                continue
-
-            msg_date = msg.created_at.date()
-            today = datetime.now().date()
-
-            if msg_date != today:
-                timestamp = msg.created_at.strftime('%d/%m/%Y %H:%M')
-            else:
-                timestamp = msg.created_at.strftime('%H:%M')
-
-            formatted_messages.append(f"{sender_name}: {content} - {timestamp}")
-            existing_messages.append(content.lower())
-
-        message = (
-                (f"Mensagem quotada: {quoted_text}\n" if quoted_text else "") +
-                "Última mensagem enviada e que dever ser respondida:\n"
-                f"{user_name}: {last_message} - {datetime.now().strftime('%H:%M')}"
+        final_message = await _build_prompt(db, contact_id, user_name, last_message, message_context, is_group)
+
+        formatted_resp = await manage_interaction(
+            db, final_message, agent_name="generic", user_id=user_id, group_id=contact_id if is_group else None,
+            output_schema=GENERIC_REPLY
         )
 
-        formatted_messages.append(message)
-        final_message = "\n".join(formatted_messages)
+        if persist_reply:
+            await _save_reply(db, contact_id, is_group, formatted_resp.get("text"))
+
+        return formatted_resp
+
+
+async def save_generic_reply(contact_id: int, is_group: bool, text: str) -> None:
+    async with PgConnection() as db:
+        await _save_reply(db, contact_id, is_group, text)
+
+
+async def generic_conversation_stream(
+        contact_id: int, user_name: str, last_message: str,
+        user_id: int, message_context: dict, is_group: bool = True
+) -> AsyncIterator[tuple[str, str]]:
+    """
+    Streamed version of ``generic_conversation``.
+
+    Yields ``("text", delta)`` while the answer is generated and ``("language", value)``
+    once the language field is complete. The reply is saved when the stream ends.
+    """
+    async with PgConnection() as db:
+        final_message = await _build_prompt(db, contact_id, user_name, last_message, message_context, is_group)
 
-        resp = await manage_interaction(db, final_message, agent_name="generic", user_id=user_id, group_id=contact_id if is_group else None)
-        formatted_resp = json.loads(f"""{resp}""")
+        fields = JsonFieldStream()
+        async for chunk in manage_interaction_stream(
+                db, final_message, agent_name="generic", system_prompt=STREAMING_FORMAT_HINT,
+                user_id=user_id, group_id=contact_id if is_group else None
+        ):
+            for field, delta in fields.feed(chunk):
+                if field == "text":
+                    yield "text", delta
 
-        _ = await message_repo.insert(Message(
-            message_id=str(uuid4()),
-            group_id = contact_id if is_group else None,
-            user_id=user_gork.id,
-            content=formatted_resp.get("text"),
-            created_at=datetime.now()
-        ))
+            if "language" in fields.values:
+                yield "language", fields.values.pop("language")
 
-        return formatted_resp
\ No newline at end of file
+        await _save_reply(db, contact_id, is_group, fields.values.get("text", ""))
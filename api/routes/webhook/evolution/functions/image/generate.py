@@ -16,8 +16,9 @@ from external import completions
 from external.evolution import download_media
 from s3 import S3Client
 from services import verifiy_media
+from services.agent_registry import agent_registry
 from services.save_image import save_image
-from utils import get_env_var, project_root
+from utils import get_env_var
 
 
 async def generate_image(
@@ -28,11 +29,10 @@ async def generate_image(
     event_data = webhook_event["data"]
     message_id = event_data["key"]["id"]
 
-    with open(f"{project_root}/agents/modify_image.md", mode="r") as file:
-        image_system_prompt = file.read()
-
     mention_photo: list[tuple[str, User]] = []
     async with PgConnection() as db:
+        image_system_prompt = await agent_registry.render(db, "modify_image")
+
         user_repo = UserRepository(User, db)
         gork_user = await user_repo.find_by_phone_or_id(get_env_var("EVOLUTION_INSTANCE_NUMBER"))
         user_message = (
@@ -3,6 +3,7 @@ from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from services import manage_interaction
+from services.intent_classifier import predict_intent, normalize_label
 
 
 async def classify_intent(message: str, db: AsyncSession, commands: list[tuple[str, str]], medias: dict[str, str], user_id: int, group_id: Optional[int]) -> tuple[str, bool]:
@@ -15,6 +16,12 @@ async def classify_intent(message: str, db: AsyncSession, commands: list[tuple[s
     has_audio_quote = "Sim" if "audio_quote" in medias else "Não"
     has_image_quote = "Sim" if "image_quote" in medias else "Não"
 
+    # Text-only messages are tried on the local classifier first
+    if has_audio == has_image == has_audio_quote == has_image_quote == "Não":
+        label = await predict_intent(message)
+        if label:
+            return _parse_response(label)
+
     final_message = (
         f"\nMensagem: {message}:\n"
         f"Informações da última mensagem:\n"
@@ -24,18 +31,15 @@ async def classify_intent(message: str, db: AsyncSession, commands: list[tuple[s
         f"Quote imagem: {has_image_quote}\n"
     )
 
-    response = await manage_interaction(db, final_message, agent_name="intent-classifier", user_id=user_id, group_id=group_id)
-
-    parts = [p.strip().lower() for p in response.split(",")]
-    intent = parts[0]
-    wants_audio = "audio" in parts
+    response = await manage_interaction(
+        db, final_message, agent_name="intent-classifier", user_id=user_id, group_id=group_id,
+        cache_text=message, cache_context=f"{has_audio},{has_image},{has_audio_quote},{has_image_quote}"
+    )
 
-    valid_intents = [
-        "remember", "search", "image", "sticker", "transcribe",
-        "resume", "model", "help", "conversation", "audio"
-    ]
+    return _parse_response(response)
 
-    if intent not in valid_intents:
-        intent = "conversation"
 
-    return intent, wants_audio
\ No newline at end of file
+def _parse_response(response: str) -> tuple[str, bool]:
+    label = normalize_label(response) or "conversation"
+    parts = label.split(",")
+    return parts[0], "audio" in parts
\ No newline at end of file
@@ -1,4 +1,3 @@
-import json
 from datetime import datetime
 
 from database import PgConnection
@@ -6,6 +5,7 @@ from database.models.manager import Command, Remember
 from database.operations.manager import CommandRepository
 from database.operations.manager.remember import RememberRepository
 from services import manage_interaction
+from services.structured_output import REMEMBER
 
 
 async def remember_generator(user_id: int, message: str, group_id: int = None) -> tuple[Remember, str]:
@@ -19,8 +19,10 @@ async def remember_generator(user_id: int, message: str, group_id: int = None) -
             command="remember",
             group_id=group_id,
         ))
-        resp = await manage_interaction(db, message, agent_name="remember-formatter", command=new_command, user_id=user_id, group_id=group_id)
-        formatted_resp = json.loads(f"""{resp}""")
+        formatted_resp = await manage_interaction(
+            db, message, agent_name="remember-formatter", command=new_command, user_id=user_id, group_id=group_id,
+            output_schema=REMEMBER
+        )
         time_remember = datetime.strptime(formatted_resp.get("datetime"), "%Y-%m-%d %H:%M:%S")
         message = formatted_resp.get("message")
 
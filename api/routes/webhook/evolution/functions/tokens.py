@@ -4,8 +4,10 @@ from datetime import datetime, timedelta
 from database import PgConnection
 from database.models.manager import Interaction
 from database.operations.manager import InteractionRepository
+from utils.singleflight import singleflight
 
 
+@singleflight("token_consumption", key=lambda user_id=None, group_id=None: f"{user_id}:{group_id}")
 async def token_consumption(user_id: Optional[int] = None, group_id: Optional[int] = None) -> str:
     async with PgConnection() as db:
         interaction_repo = InteractionRepository(Interaction, db)
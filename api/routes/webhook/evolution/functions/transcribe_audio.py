@@ -5,21 +5,19 @@ from typing import Optional
 import soundfile as sf
 
 from database import PgConnection
-from database.models.manager import Interaction, Model, Agent, Command
+from database.models.manager import Interaction, Model, Command
 from database.operations.manager import (
-    InteractionRepository, ModelRepository,
-    AgentRepository, CommandRepository
+    InteractionRepository, ModelRepository, CommandRepository
 )
 from external import completions
 from external.evolution import download_media
+from services.agent_registry import agent_registry
 
 
 async def transcribe_audio(webhook_data:dict, user_id: int, group_id: Optional[int], command: bool = False) -> str:
     async with PgConnection() as db:
         model_repo = ModelRepository(Model, db)
-        agent_repo = AgentRepository(Agent, db)
-
-        transcriber_agent = await agent_repo.find_by_name("transcriber")
+        transcriber_agent = await agent_registry.get(db, "transcriber")
         audio_model = await model_repo.get_default_audio_model()
 
         event_data = webhook_data["data"]
@@ -56,7 +54,7 @@ async def transcribe_audio(webhook_data:dict, user_id: int, group_id: Optional[i
                 {
                     "role": "user",
                     "content": [
-                        {"type": "text", "text": transcriber_agent.prompt},
+                        {"type": "text", "text": await agent_registry.render(db, "transcriber")},
                         {
                             "type": "input_audio",
                             "input_audio": {
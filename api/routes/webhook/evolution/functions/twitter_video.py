@@ -2,25 +2,73 @@
 
 Este módulo fornece funcionalidades para extrair URLs do Twitter/X
 e baixar mídia (vídeos e imagens) de posts.
+
+A mídia nunca fica inteira em memória: o download é feito em streaming para um
+arquivo temporário, abortando assim que o ``Content-Length`` ou o total recebido
+passa de ``MAX_MEDIA_SIZE_BYTES``. O arquivo é enviado ao MinIO e a Evolution
+recebe uma URL pré-assinada em vez do base64 do vídeo.
+
+O objeto no MinIO é nomeado pelo id do post, então o mesmo post pedido de novo
+(em outro grupo, por x.com ou twitter.com, com ou sem query string) é servido
+direto do MinIO, sem passar pelo twitsave.com. Os objetos expiram depois de
+``TWITTER_CACHE_DAYS`` dias.
+
+Vídeos grandes demais ou em formatos que o WhatsApp não reproduz passam pelo
+``services.video_transcoder``: o que passa do limite é convertido lendo direto da
+URL, sem ser baixado antes, e o resto é verificado com ffprobe depois do download.
+O cache guarda o vídeo já convertido.
 """
 
 from __future__ import annotations
 
+import base64
+import os
 import re
+import tempfile
+import time
 from dataclasses import dataclass
 from typing import Literal
 from urllib.parse import urlparse
 
+import aiofiles
 import httpx
 from bs4 import BeautifulSoup
+
+from external.http import get_client
 from log import logger
+from s3 import S3Client
+from services.video_transcoder import TranscodeError, is_compatible, probe, transcode
+from utils import get_env_var
+from utils.metrics import metrics
+from utils.singleflight import singleflight
 
 
 # Constantes
 TWITTER_DOMAINS = ("twitter.com", "x.com")
+TWITTER_SUBDOMAINS = ("www.", "mobile.")
 TWITSAVE_API_URL = "https://twitsave.com/info"
+UPSTREAM = "twitter"
 DEFAULT_TIMEOUT = 30.0
-MAX_MEDIA_SIZE_BYTES = 50 * 1024 * 1024  # 50MB
+MAX_MEDIA_SIZE_BYTES = int(get_env_var("TWITTER_MAX_MEDIA_BYTES") or 50 * 1024 * 1024)  # 50MB
+CHUNK_SIZE = 64 * 1024
+MEDIA_BUCKET = "whatsapp"
+MEDIA_PREFIX = "twitter"
+URL_EXPIRES_MINUTES = 15
+CACHE_DAYS = int(get_env_var("TWITTER_CACHE_DAYS") or 30)
+
+TWITTER_URL_PATTERN = re.compile(
+    rf'https?://(?:www\.|mobile\.)?(?:{"|".join(re.escape(domain) for domain in TWITTER_DOMAINS)})'
+    r'/[\w-]+/status(?:es)?/\d+[^\s]*'
+)
+TWEET_ID_PATTERN = re.compile(r"/status(?:es)?/(\d+)")
+
+# Extensão e mimetype de cada tipo de mídia
+MEDIA_FORMATS = {
+    "video": (".mp4", "video/mp4"),
+    "image": (".jpeg", "image/jpeg"),
+}
+
+_expiration_set = False
 
 # Media types suportados
 MediaType = Literal["video", "image"]
@@ -28,16 +76,30 @@ MediaType = Literal["video", "image"]
 
 @dataclass
 class MediaDownloadResult:
-    """Resultado do download de mídia do Twitter/X."""
+    """Resultado do download de mídia do Twitter/X.
 
-    media_bytes: bytes | None
+    Logo após o download a mídia fica em ``media_path``, um arquivo temporário
+    removido com ``cleanup``. Pronta para envio, fica em ``media``: URL
+    pré-assinada do MinIO (ou base64, se o MinIO estiver indisponível).
+    """
+
+    media_path: str | None
     media_type: MediaType | None
     error: str | None
+    size: int = 0
+    media: str | None = None
+    cached: bool = False
 
     @property
     def is_success(self) -> bool:
         """Verifica se o download foi bem-sucedido."""
-        return self.media_bytes is not None and self.error is None
+        return (self.media_path is not None or self.media is not None) and self.error is None
+
+    def cleanup(self) -> None:
+        """Remove o arquivo temporário da mídia, se existir."""
+        if self.media_path and os.path.exists(self.media_path):
+            os.unlink(self.media_path)
+        self.media_path = None
 
 
 class TwitterVideoError(Exception):
@@ -64,6 +126,12 @@ class MediaDownloadError(TwitterVideoError):
     pass
 
 
+class MediaTooLargeError(MediaDownloadError):
+    """Mídia maior que ``MAX_MEDIA_SIZE_BYTES``."""
+
+    pass
+
+
 def extract_twitter_url(text: str) -> str | None:
     """
     Extrai o primeiro URL válido do Twitter/X de um texto.
@@ -81,11 +149,31 @@ def extract_twitter_url(text: str) -> str | None:
         >>> extract_twitter_url("Sem URL aqui")
         None
     """
-    pattern = rf'https?://(?:{"|".join(TWITTER_DOMAINS)})/[\w-]+/\d+'
-    match = re.search(pattern, text)
+    match = TWITTER_URL_PATTERN.search(text)
     return match.group(0) if match else None
 
 
+def extract_tweet_id(url: str) -> str | None:
+    """
+    Extrai o id do post de uma URL do Twitter/X.
+
+    O id identifica o post independente do domínio (x.com ou twitter.com), do
+    usuário no caminho e da query string, e é a chave do cache de mídia.
+
+    Args:
+        url: URL do post
+
+    Returns:
+        Id do post ou None se a URL não tiver um
+
+    Examples:
+        >>> extract_tweet_id("https://twitter.com/usuario/status/12345?s=20")
+        "12345"
+    """
+    match = TWEET_ID_PATTERN.search(urlparse(url).path)
+    return match.group(1) if match else None
+
+
 def _validate_twitter_url(url: str) -> str:
     """
     Valida e normaliza uma URL do Twitter/X.
@@ -104,7 +192,11 @@ def _validate_twitter_url(url: str) -> str:
     if not parsed.scheme:
         raise InvalidURLError("URL deve ter um esquema (http:// ou https://)")
 
-    if parsed.netloc not in TWITTER_DOMAINS:
+    netloc = parsed.netloc.lower()
+    for subdomain in TWITTER_SUBDOMAINS:
+        netloc = netloc.removeprefix(subdomain)
+
+    if netloc not in TWITTER_DOMAINS:
         raise InvalidURLError(
             f"URL inválida. Deve ser de {' ou '.join(TWITTER_DOMAINS)}"
         )
@@ -112,7 +204,7 @@ def _validate_twitter_url(url: str) -> str:
     if not parsed.path or parsed.path == "/":
         raise InvalidURLError("URL deve conter um caminho válido (ex: /usuario/status/12345)")
 
-    return url
+    return parsed._replace(netloc=netloc).geturl()
 
 
 def _extract_media_url_from_soup(
@@ -136,53 +228,140 @@ def _extract_media_url_from_soup(
     return image_element.get("src") if image_element else None
 
 
-def _validate_media_size(media_bytes: bytes) -> None:
+def _validate_media_size(size: int) -> None:
     """
-    Valida o tamanho da mídia baixada.
+    Valida o tamanho da mídia, declarado ou já recebido.
 
     Args:
-        media_bytes: Bytes da mídia
+        size: Tamanho da mídia em bytes
 
     Raises:
-        MediaDownloadError: Se a mídia for muito grande
+        MediaTooLargeError: Se a mídia for muito grande
     """
-    if len(media_bytes) > MAX_MEDIA_SIZE_BYTES:
-        size_mb = len(media_bytes) / (1024 * 1024)
+    if size > MAX_MEDIA_SIZE_BYTES:
+        size_mb = size / (1024 * 1024)
         max_mb = MAX_MEDIA_SIZE_BYTES / (1024 * 1024)
-        raise MediaDownloadError(
+        metrics.incr("twitter_media_aborts", reason="size")
+        raise MediaTooLargeError(
             f"Mídia muito grande: {size_mb:.2f}MB (máximo: {max_mb:.2f}MB)"
         )
 
-    if len(media_bytes) == 0:
-        raise MediaDownloadError("Mídia baixada está vazia")
 
-
-async def _download_media_bytes(client: httpx.AsyncClient, url: str) -> bytes:
+async def _download_media_file(
+    client: httpx.AsyncClient, url: str, media_type: MediaType
+) -> tuple[str, int]:
     """
-    Baixa os bytes de uma URL.
+    Baixa uma URL em streaming para um arquivo temporário.
+
+    O download é abortado antes de começar se o ``Content-Length`` passar do
+    limite, ou no meio se o total recebido passar (servidores que não informam
+    o tamanho ou informam errado).
 
     Args:
         client: Cliente HTTP assíncrono
         url: URL para baixar
+        media_type: Tipo de mídia, define a extensão do arquivo
 
     Returns:
-        Bytes da mídia
+        Caminho do arquivo temporário e tamanho em bytes
 
     Raises:
-        MediaDownloadError: Se houver erro no download
+        MediaDownloadError: Se houver erro no download ou a mídia for inválida
     """
+    suffix, _ = MEDIA_FORMATS[media_type]
+    fd, path = tempfile.mkstemp(prefix="twitter_", suffix=suffix)
+    os.close(fd)
+
     try:
-        response = await client.get(url)
-        response.raise_for_status()
-        return response.content
-    except httpx.TimeoutException as e:
-        raise MediaDownloadError("Timeout ao baixar a mídia") from e
-    except httpx.HTTPStatusError as e:
-        raise MediaDownloadError(
-            f"Erro HTTP ao baixar mídia: {e.response.status_code}"
-        ) from e
-    except Exception as e:
-        raise MediaDownloadError(f"Erro ao baixar mídia: {str(e)}") from e
+        async with client.stream(
+            "GET", url, timeout=DEFAULT_TIMEOUT, follow_redirects=True
+        ) as response:
+            response.raise_for_status()
+            _validate_media_size(int(response.headers.get("content-length") or 0))
+
+            size = 0
+            async with aiofiles.open(path, "wb") as media_file:
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    size += len(chunk)
+                    _validate_media_size(size)
+                    await media_file.write(chunk)
+
+        if size == 0:
+            raise MediaDownloadError("Mídia baixada está vazia")
+
+        return path, size
+    except BaseException as e:
+        os.unlink(path)
+        if isinstance(e, MediaDownloadError):
+            raise
+        if isinstance(e, httpx.TimeoutException):
+            raise MediaDownloadError("Timeout ao baixar a mídia") from e
+        if isinstance(e, httpx.HTTPStatusError):
+            raise MediaDownloadError(
+                f"Erro HTTP ao baixar mídia: {e.response.status_code}"
+            ) from e
+        if isinstance(e, Exception):
+            raise MediaDownloadError(f"Erro ao baixar mídia: {str(e)}") from e
+        raise
+
+
+async def _transcode_video(source: str, reason: str) -> tuple[str, int]:
+    """
+    Converte um vídeo para o perfil aceito pelo WhatsApp.
+
+    Args:
+        source: Caminho local ou URL do vídeo (lido em streaming pelo ffmpeg)
+        reason: Motivo da conversão (``size`` ou ``codec``), para as métricas
+
+    Returns:
+        Caminho do arquivo convertido e tamanho em bytes
+
+    Raises:
+        MediaDownloadError: Se a conversão falhar ou passar do tempo limite
+    """
+    start = time.monotonic()
+    try:
+        media_path = await transcode(source)
+    except TranscodeError as e:
+        metrics.incr("twitter_transcodes", reason=reason, outcome="error")
+        raise MediaDownloadError(f"Erro ao converter o vídeo: {str(e)}") from e
+
+    size = os.path.getsize(media_path)
+    metrics.incr("twitter_transcodes", reason=reason, outcome="ok")
+    await logger.info(
+        "TwitterMedia",
+        "Vídeo convertido",
+        {"reason": reason, "size": size, "seconds": round(time.monotonic() - start, 1)},
+    )
+    return media_path, size
+
+
+async def _ensure_playable(media_path: str, size: int) -> tuple[str, int]:
+    """
+    Converte o vídeo baixado se o WhatsApp não for reproduzi-lo.
+
+    Se o ffprobe não conseguir ler o arquivo ou a conversão falhar, o vídeo
+    original é enviado como antes.
+
+    Args:
+        media_path: Caminho do vídeo baixado
+        size: Tamanho do vídeo em bytes
+
+    Returns:
+        Caminho e tamanho do vídeo a enviar (o original é removido se convertido)
+    """
+    info = await probe(media_path)
+    if info is None or is_compatible(info):
+        return media_path, size
+
+    try:
+        converted_path, converted_size = await _transcode_video(media_path, "codec")
+    except MediaDownloadError as e:
+        await logger.warn("TwitterMedia", "Enviando vídeo original", str(e))
+        return media_path, size
+
+    os.unlink(media_path)
+    return converted_path, converted_size
 
 
 async def download_twitter_media(twitter_url: str) -> MediaDownloadResult:
@@ -200,7 +379,7 @@ async def download_twitter_media(twitter_url: str) -> MediaDownloadResult:
     Examples:
         >>> result = await download_twitter_media("https://x.com/usuario/status/12345")
         >>> if result.is_success:
-        ...     print(f"Baixou {result.media_type}: {len(result.media_bytes)} bytes")
+        ...     print(f"Baixou {result.media_type}: {result.size} bytes")
     """
     try:
         # Valida a URL
@@ -209,68 +388,64 @@ async def download_twitter_media(twitter_url: str) -> MediaDownloadResult:
             "TwitterMedia", "Download iniciado", {"url": validated_url}
         )
 
-        # Configura cliente HTTP
-        limits = httpx.Limits(max_keepalive_connections=5, max_connections=10)
-        async with httpx.AsyncClient(
-            timeout=DEFAULT_TIMEOUT,
-            limits=limits,
-            follow_redirects=True,
-        ) as client:
-            # Obtém informações da mídia do twitsave
-            try:
-                response = await client.post(
-                    TWITSAVE_API_URL, data={"url": validated_url}
-                )
-                response.raise_for_status()
-            except httpx.HTTPStatusError as e:
-                if e.response.status_code >= 500:
-                    return MediaDownloadResult(
-                        None, None, "Erro no servidor twitsave.com. Tente novamente."
-                    )
+        client = get_client(UPSTREAM)
+
+        # Obtém informações da mídia do twitsave
+        try:
+            response = await client.post(
+                TWITSAVE_API_URL,
+                data={"url": validated_url},
+                timeout=DEFAULT_TIMEOUT,
+                follow_redirects=True,
+            )
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code >= 500:
                 return MediaDownloadResult(
-                    None,
-                    None,
-                    f"Erro ao conectar com twitsave.com: {e.response.status_code}",
+                    None, None, "Erro no servidor twitsave.com. Tente novamente."
                 )
+            return MediaDownloadResult(
+                None,
+                None,
+                f"Erro ao conectar com twitsave.com: {e.response.status_code}",
+            )
 
-            # Parseia o HTML
-            soup = BeautifulSoup(response.text, "html.parser")
+        # Parseia o HTML
+        soup = BeautifulSoup(response.text, "html.parser")
 
-            # Tenta baixar vídeo primeiro
-            video_url = _extract_media_url_from_soup(soup, "video")
-            if video_url:
-                try:
-                    video_bytes = await _download_media_bytes(client, video_url)
-                    _validate_media_size(video_bytes)
-                    await logger.info(
-                        "TwitterMedia",
-                        "Vídeo baixado",
-                        {"size": len(video_bytes)},
-                    )
-                    return MediaDownloadResult(video_bytes, "video", None)
-                except MediaDownloadError as e:
-                    await logger.warning("TwitterMedia", "Erro vídeo", str(e))
-                    # Continua para tentar imagem
-
-            # Tenta baixar imagem
-            image_url = _extract_media_url_from_soup(soup, "image")
-            if image_url:
+        # Tenta baixar vídeo primeiro, depois imagem
+        for media_type in ("video", "image"):
+            media_url = _extract_media_url_from_soup(soup, media_type)
+            if not media_url:
+                continue
+
+            try:
                 try:
-                    image_bytes = await _download_media_bytes(client, image_url)
-                    _validate_media_size(image_bytes)
-                    await logger.info(
-                        "TwitterMedia",
-                        "Imagem baixada",
-                        {"size": len(image_bytes)},
-                    )
-                    return MediaDownloadResult(image_bytes, "image", None)
-                except MediaDownloadError as e:
-                    await logger.warning("TwitterMedia", "Erro imagem", str(e))
-
-            # Se chegou aqui, não encontrou mídia
-            return MediaDownloadResult(
-                None, None, "Não foi possível encontrar mídia (vídeo ou imagem) no post"
+                    media_path, size = await _download_media_file(client, media_url, media_type)
+                except MediaTooLargeError:
+                    if media_type != "video":
+                        raise
+                    # O ffmpeg lê a URL em streaming, o vídeo original nunca é baixado inteiro
+                    media_path, size = await _transcode_video(media_url, "size")
+                else:
+                    if media_type == "video":
+                        media_path, size = await _ensure_playable(media_path, size)
+            except MediaDownloadError as e:
+                await logger.warn("TwitterMedia", f"Erro {media_type}", str(e))
+                continue
+
+            await logger.info(
+                "TwitterMedia",
+                "Vídeo baixado" if media_type == "video" else "Imagem baixada",
+                {"size": size},
             )
+            metrics.observe("twitter_media_bytes", size, media_type=media_type)
+            return MediaDownloadResult(media_path, media_type, None, size)
+
+        # Se chegou aqui, não encontrou mídia
+        return MediaDownloadResult(
+            None, None, "Não foi possível encontrar mídia (vídeo ou imagem) no post"
+        )
 
     except InvalidURLError as e:
         return MediaDownloadResult(None, None, str(e))
@@ -279,3 +454,167 @@ async def download_twitter_media(twitter_url: str) -> MediaDownloadResult:
         return MediaDownloadResult(
             None, None, f"Erro ao processar URL: {str(e)}"
         )
+
+
+def _record_cache(outcome: str, size: int = 0) -> None:
+    """
+    Registra uma consulta ao cache de mídia.
+
+    Atualiza a taxa de acerto e o total de bytes que deixaram de ser baixados.
+
+    Args:
+        outcome: ``hit`` ou ``miss``
+        size: Tamanho da mídia servida do cache
+    """
+    metrics.incr("twitter_media_cache", outcome=outcome)
+    if outcome == "hit":
+        metrics.incr("twitter_media_cache_bytes_saved", size)
+
+    hits = metrics.counter("twitter_media_cache", outcome="hit")
+    misses = metrics.counter("twitter_media_cache", outcome="miss")
+    metrics.set_gauge("twitter_media_cache_hit_ratio", hits / (hits + misses))
+
+
+async def _connect_storage() -> S3Client:
+    """
+    Conecta ao MinIO e garante a expiração dos objetos do cache.
+
+    A regra de expiração é aplicada uma vez por processo. Se falhar (por exemplo,
+    credenciais sem permissão de ``PutBucketLifecycle``), o erro é registrado uma
+    vez e o cache continua funcionando, só sem expiração.
+
+    Returns:
+        Cliente do MinIO conectado
+    """
+    global _expiration_set
+
+    s3_conn = S3Client()
+    await s3_conn.connect()
+    if not _expiration_set:
+        _expiration_set = True
+        try:
+            await s3_conn.set_prefix_expiration(MEDIA_BUCKET, f"{MEDIA_PREFIX}/", CACHE_DAYS)
+        except Exception as e:
+            await logger.error("TwitterMedia", "Erro ao configurar expiração do cache", str(e))
+    return s3_conn
+
+
+async def _cached_media(s3_conn: S3Client, object_name: str) -> MediaDownloadResult | None:
+    """
+    Busca a mídia de um post no cache do MinIO.
+
+    O tipo vem do content type do objeto e o tamanho do próprio objeto.
+
+    Args:
+        s3_conn: Cliente do MinIO conectado
+        object_name: Nome do objeto do post
+
+    Returns:
+        MediaDownloadResult com a URL pré-assinada ou None se não estiver no cache
+    """
+    stat = await s3_conn.get_object_info(MEDIA_BUCKET, object_name)
+    if stat is None:
+        return None
+
+    media_type = next(
+        (name for name, (_, content_type) in MEDIA_FORMATS.items() if content_type == stat.content_type),
+        None,
+    )
+    if media_type is None:
+        return None
+
+    url = await s3_conn.get_presigned_url(
+        object_name, bucket_name=MEDIA_BUCKET, expires_minutes=URL_EXPIRES_MINUTES
+    )
+    return MediaDownloadResult(None, media_type, None, stat.size, media=url, cached=True)
+
+
+async def _store_media(
+    s3_conn: S3Client | None, result: MediaDownloadResult, object_name: str
+) -> str:
+    """
+    Guarda a mídia baixada no cache e a prepara para envio pela Evolution.
+
+    Envia o arquivo ao MinIO e retorna uma URL pré-assinada, que a Evolution
+    baixa por conta própria. Se o MinIO estiver indisponível, cai para o base64
+    do arquivo (limitado por ``MAX_MEDIA_SIZE_BYTES``) e nada é guardado.
+
+    Args:
+        s3_conn: Cliente do MinIO conectado, None se a conexão falhou
+        result: Download bem-sucedido
+        object_name: Nome do objeto do post
+
+    Returns:
+        Mídia para o campo ``media`` da Evolution (URL ou base64)
+    """
+    _, content_type = MEDIA_FORMATS[result.media_type]
+
+    if s3_conn is not None:
+        try:
+            await s3_conn.upload_file(result.media_path, object_name, content_type, bucket_name=MEDIA_BUCKET)
+            url = await s3_conn.get_presigned_url(
+                object_name, bucket_name=MEDIA_BUCKET, expires_minutes=URL_EXPIRES_MINUTES
+            )
+            metrics.incr("twitter_media_delivery", mode="url")
+            return url
+        except Exception as e:
+            await logger.warn("TwitterMedia", "MinIO indisponível, usando base64", str(e))
+
+    async with aiofiles.open(result.media_path, "rb") as media_file:
+        media_bytes = await media_file.read()
+    metrics.incr("twitter_media_delivery", mode="base64")
+    return base64.b64encode(media_bytes).decode("utf-8")
+
+
+@singleflight("twitter_media", key=lambda twitter_url: extract_tweet_id(twitter_url) or twitter_url)
+async def get_twitter_media(twitter_url: str) -> MediaDownloadResult:
+    """
+    Mídia de um post do Twitter/X pronta para envio pela Evolution.
+
+    Serve do cache do MinIO quando o post já foi baixado; senão baixa pelo
+    twitsave.com e guarda no cache. Pedidos simultâneos do mesmo post
+    compartilham o mesmo download.
+
+    Args:
+        twitter_url: URL do post do Twitter/X
+
+    Returns:
+        MediaDownloadResult com ``media`` preenchido (URL ou base64)
+
+    Examples:
+        >>> result = await get_twitter_media("https://x.com/usuario/status/12345")
+        >>> if result.is_success:
+        ...     await send_video(remote_id, result.media)
+    """
+    tweet_id = extract_tweet_id(twitter_url)
+    if tweet_id is None:
+        return MediaDownloadResult(
+            None, None, "URL deve conter o id do post (ex: /usuario/status/12345)"
+        )
+    object_name = f"{MEDIA_PREFIX}/{tweet_id}"
+
+    s3_conn = None
+    try:
+        s3_conn = await _connect_storage()
+        cached = await _cached_media(s3_conn, object_name)
+    except Exception as e:
+        await logger.warn("TwitterMedia", "Erro ao consultar cache", str(e))
+        cached = None
+
+    if cached is not None:
+        _record_cache("hit", cached.size)
+        await logger.info(
+            "TwitterMedia", "Servido do cache", {"tweet_id": tweet_id, "size": cached.size}
+        )
+        return cached
+
+    _record_cache("miss")
+    result = await download_twitter_media(twitter_url)
+    if not result.is_success:
+        return result
+
+    try:
+        result.media = await _store_media(s3_conn, result, object_name)
+    finally:
+        result.cleanup()
+    return result
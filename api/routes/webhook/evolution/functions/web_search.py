@@ -1,145 +1,304 @@
+import asyncio
+import json
+import time
 from datetime import datetime
-
-import httpx
+from typing import Awaitable, Optional, TypeVar
 
 from database import PgConnection
 from database.models.base import Group, User
-from database.models.content import Message
 from database.operations.base.group import GroupRepository
 from database.operations.base.user import UserRepository
-from database.operations.content.message import MessageRepository
 from external import get_url_content
+from external.brave import brave_client
 from services import manage_interaction
+from services.context_builder import get_budget, fit_messages
+from services.message_buffer import message_buffer, CAPACITY as BUFFER_CAPACITY
+from services.passages import select_passages
+from services.source_ranker import rank_sources, MIN_SCORE as RANKER_MIN_SCORE
+from services.structured_output import SOURCE_SELECTION
+from services.web_cache import search_cache, page_cache, normalize_query, normalize_url
 from external.evolution import send_message
+from log import logger
 from utils import get_env_var
+from utils.metrics import metrics
+from utils.singleflight import singleflight
 
 
-async def web_search(user_question: str, user_id: int, contact_id: str, is_group: bool = True):
-    brave_key = get_env_var("BRAVE_KEY")
+T = TypeVar("T")
+
+
+async def _brave_request(term: str) -> str:
+    try:
+        return json.dumps(await brave_client.search(term))
+    except Exception as error:
+        # Not cached, the next search tries again
+        await logger.warn("WebSearch", "Brave", f"Term: {term} - Error: {error!r}")
+        return ""
+
+
+@singleflight("brave_search", key=normalize_query)
+async def _brave_search(term: str) -> dict:
+    body = await search_cache.get(normalize_query(term), lambda: _brave_request(term))
+    return json.loads(body) if body else {}
+
+
+FETCH_CONCURRENCY = int(get_env_var("SEARCH_FETCH_CONCURRENCY") or 4)
+SOURCE_TIMEOUT = float(get_env_var("SEARCH_SOURCE_TIMEOUT_SECONDS") or 15)
+FETCH_DEADLINE = float(get_env_var("SEARCH_FETCH_DEADLINE_SECONDS") or 25)
+FIRST_SOURCE_GRACE = float(get_env_var("SEARCH_FIRST_SOURCE_GRACE_SECONDS") or 4)
+SOURCE_SELECTOR = (get_env_var("SEARCH_SOURCE_SELECTOR") or "agent").lower()
+MAX_REFERENCES = 8
+
+
+async def _timed(timings: dict[str, float], stage: str, awaitable: Awaitable[T]) -> T:
+    start = time.monotonic()
+    try:
+        return await awaitable
+    finally:
+        timings[stage] = time.monotonic() - start
+
+
+async def _report_timings(timings: dict[str, float], total: float) -> None:
+    for stage, seconds in timings.items():
+        metrics.observe("search_stage_seconds", seconds, stage=stage)
+    metrics.observe("search_seconds", total)
+
+    stages = " - ".join(f"{stage}: {seconds:.2f}s" for stage, seconds in timings.items())
+    await logger.info("WebSearch", "Stages", f"{stages} - total: {total:.2f}s")
+
+
+async def _fetch_source(semaphore: asyncio.Semaphore, url: str) -> str:
+    async with semaphore:
+        try:
+            return await asyncio.wait_for(
+                page_cache.get(normalize_url(url), lambda: get_url_content(url)),
+                timeout=SOURCE_TIMEOUT
+            )
+        except Exception as error:
+            await logger.warn("WebSearch", "Source", f"URL: {url} - Error: {error!r}")
+            return ""
+
+
+async def _fetch_sources(web_references: list[dict], selected: list[int]) -> list[tuple[dict, str]]:
+    """
+    Fetches the selected sources concurrently. A source that fails or comes empty is
+    replaced by the next one not selected; whatever arrived by ``FETCH_DEADLINE``, or
+    ``FIRST_SOURCE_GRACE`` seconds after the first source, is returned in the
+    selection order, so the summary does not wait on the slowest site.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + FETCH_DEADLINE
+    semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+    backups = [idx for idx in range(len(web_references)) if idx not in selected]
+
+    def start(idx: int) -> asyncio.Task:
+        return asyncio.create_task(_fetch_source(semaphore, web_references[idx]["url"]))
+
+    pending = {start(idx): idx for idx in selected}
+    contents: dict[int, str] = {}
+    try:
+        while pending and loop.time() < deadline:
+            done, _ = await asyncio.wait(pending, timeout=deadline - loop.time(), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                idx = pending.pop(task)
+                if task.result():
+                    if not contents:
+                        deadline = min(deadline, loop.time() + FIRST_SOURCE_GRACE)
+                    contents[idx] = task.result()
+                elif backups:
+                    backup = backups.pop(0)
+                    pending[start(backup)] = backup
+    finally:
+        for task in pending:
+            task.cancel()
+
+    metrics.incr("search_sources", len(contents), outcome="fetched")
+    metrics.incr("search_sources", len(pending), outcome="deadline")
+
+    order = [idx for idx in selected if idx in contents] + sorted(idx for idx in contents if idx not in selected)
+    return [(web_references[idx], contents[idx]) for idx in order]
+
+
+def _select_passages(fetched: list[tuple[dict, str]], query: str, budget: int, model: Optional[str]) -> list[tuple[dict, str]]:
+    return [(source, select_passages(content, query, budget, model)) for source, content in fetched]
+
+
+async def _send_notice(contact_id: str, term_search: str, user_id: int, group_id: Optional[int]) -> None:
+    # Own session, it runs alongside the rest of the search
+    try:
+        async with PgConnection() as db:
+            notice = await manage_interaction(db, term_search, agent_name="term-formatter", user_id=user_id, group_id=group_id)
+        await send_message(contact_id, notice)
+    except Exception as error:
+        await logger.warn("WebSearch", "Notice", str(error))
+
 
-    headers = {
-        "Content-Type": "application/json",
-        "x-subscription-token": brave_key
-    }
+async def _select_with_agent(db, final_message: str, final_message_sources: str, user_id: int, group_id: Optional[int], web_references: list[dict]) -> list[int]:
+    final_message_source_selector = f"""
+    Users interactions:
+    {final_message}
+    
+    Sources:
+    {final_message_sources}
+    """
+
+    web_sources = await manage_interaction(
+        db, final_message_source_selector, agent_name="source-selector", user_id=user_id, group_id=group_id,
+        output_schema=SOURCE_SELECTION
+    )
+    return [idx for idx in dict.fromkeys(web_sources["sources"]) if idx < len(web_references)] or [0]
+
+
+async def _select_locally(question: str, history: list[str], web_references: list[dict]) -> Optional[list[int]]:
+    """None when the agent should decide instead: no result is close enough or the encoder failed."""
+    start = time.monotonic()
+    try:
+        ranking = await asyncio.to_thread(rank_sources, question, history, web_references)
+    except Exception as error:
+        await logger.error("WebSearch", "SourceRanker", str(error))
+        metrics.incr("source_ranker", outcome="error")
+        return None
+
+    metrics.observe("source_ranker_seconds", time.monotonic() - start)
+    if ranking.best_score < RANKER_MIN_SCORE:
+        metrics.incr("source_ranker", outcome="low_score")
+        return None
+
+    metrics.incr("source_ranker", outcome="local")
+    return ranking.indices
+
+
+async def web_search(user_question: str, user_id: int, contact_id: str, is_group: bool = True):
+    """
+    Search pipeline. After the search terms, the "searching for" notice runs alongside
+    the Brave query instead of before it; sources are picked by ``source-selector`` or,
+    with ``SEARCH_SOURCE_SELECTOR=local``, by embedding similarity to the question,
+    and the summary starts with the sources fetched so far (see ``_fetch_sources``).
+    """
+    start = time.monotonic()
+    timings: dict[str, float] = {}
 
     async with PgConnection() as db:
         user_repo = UserRepository(User, db)
-        message_repo = MessageRepository(Message, db)
         group_repo = GroupRepository(Group, db)
 
         if is_group:
             group = await group_repo.find_by_src_id(contact_id.replace("@g.us", ""))
-            messages = await message_repo.find_by_group(group.id, 15)
+            messages = await message_buffer.recent(db, BUFFER_CAPACITY, group_id=group.id)
         else:
             user = await user_repo.find_by_lid(contact_id.replace("@lid", ""))
-            messages = await message_repo.find_by_sender(user.id, 15)
+            messages = await message_buffer.recent(db, BUFFER_CAPACITY, user_id=user.id)
+
+        budget = await get_budget(db, "term-search")
+        messages = await fit_messages(messages, budget, reserved=user_question)
 
         formatted_messages = []
 
         exist_last_message = False
         for msg in messages:
-            sender_name = msg.sender.name or msg.sender.phone_jid or "Usuário Desconhecido"
-            content = msg.content or ""
-
-            if content.strip() == user_question.strip():
+            if msg.content.strip() == user_question.strip():
                 exist_last_message = True
 
-            msg_date = msg.created_at.date()
-            today = datetime.now().date()
-
-            if msg_date != today:
-                timestamp = msg.created_at.strftime('%d/%m/%Y %H:%M')
-            else:
-                timestamp = msg.created_at.strftime('%H:%M')
-
-            formatted_messages.append(f"{sender_name}: {content} - {timestamp}")
+            formatted_messages.append(msg.format())
 
         if not exist_last_message:
             formatted_messages.append(f"Ultima mensagem enviada: {user_question} - {datetime.now().strftime('%H:%M')}")
 
         final_message = "\n".join(formatted_messages)
+        group_id = group.id if is_group else None
+
+        # The search terms depend on the conversation, so they are only reused within the same chat
+        term_search = await _timed(timings, "term_search", manage_interaction(
+            db, final_message, agent_name="term-search", user_id=user_id, group_id=group_id,
+            cache_text=user_question, cache_context=contact_id
+        ))
 
-        term_search = await manage_interaction(db, final_message, agent_name="term-search", user_id=user_id, group_id=group.id if is_group else None)
-        message_term_formatted = await manage_interaction(db, term_search, agent_name="term-formatter", user_id=user_id, group_id=group.id if is_group else None)
-
-        await send_message(contact_id, message_term_formatted)
-        async with httpx.AsyncClient() as client:
-            params = {"q": term_search}
-            response = await client.get("https://api.search.brave.com/res/v1/web/search", params=params, headers=headers)
-            body = response.json()
-            videos_data = body.get("videos", {"results": []})
-            video_reference = videos_data["results"][0] if len(videos_data["results"]) > 0 else None
-            web_data = body.get("web", {"results": []})
-            web_data_length = 8 if len(web_data["results"]) > 8 else len(web_data["results"])
-
-            web_references = web_data["results"][:web_data_length] if web_data["results"] else []
-
-            if not web_references:
-                return f"Não consegui encontrar nada na internet com o tema {term_search}"
-
-            tt_web_references = []
-            for idx, web_reference in enumerate(web_references):
-                tt_web_references.append(f"""
-                    {idx} - {web_reference["title"]}
-                    URL - {web_reference["url"]}
-                    Description - {web_reference.get("description")}
-                    Date of publication - {web_reference.get("page_age")}
-                    Subtype - {web_reference.get("subtype")}
-                    Age - {web_reference.get("age")}
-                """.strip())
-
-
-            final_message_sources = "\n\n".join(tt_web_references)
-            final_message_source_selector = f"""
-            Users interactions:
-            {final_message}
-            
-            Sources:
-            {final_message_sources}
+        # The notice only tells the user what is being searched, nothing downstream waits for it
+        notice = asyncio.create_task(_timed(timings, "notice", _send_notice(contact_id, term_search, user_id, group_id)))
+        body = await _timed(timings, "brave", _brave_search(term_search))
+
+        videos_data = body.get("videos", {"results": []})
+        video_reference = videos_data["results"][0] if len(videos_data["results"]) > 0 else None
+        web_references = body.get("web", {"results": []})["results"][:MAX_REFERENCES]
+
+        if not web_references:
+            await notice
+            return f"Não consegui encontrar nada na internet com o tema {term_search}"
+
+        tt_web_references = []
+        for idx, web_reference in enumerate(web_references):
+            tt_web_references.append(f"""
+                {idx} - {web_reference["title"]}
+                URL - {web_reference["url"]}
+                Description - {web_reference.get("description")}
+                Date of publication - {web_reference.get("page_age")}
+                Subtype - {web_reference.get("subtype")}
+                Age - {web_reference.get("age")}
+            """.strip())
+
+        final_message_sources = "\n\n".join(tt_web_references)
+
+        async def select_sources() -> list[int]:
+            if SOURCE_SELECTOR == "local":
+                history = [msg.content for msg in messages if msg.content.strip() != user_question.strip()]
+                selected = await _select_locally(f"{user_question}\n{term_search}", history, web_references)
+                if selected is not None:
+                    return selected
+            return await _select_with_agent(db, final_message, final_message_sources, user_id, group_id, web_references)
+
+        tt_web_sources = await _timed(timings, "source_selection", select_sources())
+
+        fetched = await _timed(timings, "fetch", _fetch_sources(web_references, tt_web_sources))
+
+        # Only the passages closest to the question go to the resumer, within its budget split by source
+        resumer_budget = await get_budget(db, "source-resumer")
+        fetched = await _timed(timings, "passages", asyncio.to_thread(
+            _select_passages, fetched, f"{term_search}\n{user_question}",
+            resumer_budget.tokens // max(len(fetched), 1), resumer_budget.model
+        ))
+
+        tt_final_sources = []
+        for source, content in fetched:
+            tt_final_sources.append(f"""
+                Title: {source["title"]}
+                URL: {source["url"]}
+                Description: {source.get("description")}
+                Subtype: {source.get("subtype")}
+                Content: {content}
+                Age: {source.get("age")}
+            """)
+
+        message_tt_sources = "\n\n".join(tt_final_sources)
+
+        if video_reference:
+            video_mention = f"""
+            Title: {video_reference["title"]}
+            URL: {video_reference["url"]}
+            Description: {video_reference.get("description")}
+            Age: {video_reference.get("age")}
+            Duration: {video_reference.get("video", {}).get("duration")}
+            Creator: {video_reference.get("video", {}).get("creator")}
             """
+        else:
+            video_mention = None
 
-            web_sources = await manage_interaction(db, final_message_source_selector, agent_name="source-selector", user_id=user_id, group_id=group.id if is_group else None)
-            tt_web_sources = [int(idx.strip()) for idx in web_sources.split(",")]
-
-            tt_final_sources = []
-            for idx in tt_web_sources:
-                source = web_references[idx]
-                url = source["url"]
-                content = get_url_content(url)
-                if not content:
-                    not_selected_web_sources = [idx for idx, _  in enumerate(web_references) if idx not in tt_web_sources]
-                    tt_web_sources.append(not_selected_web_sources[0])
-                    continue
-
-                tt_final_sources.append(f"""
-                    Title: {source["title"]}
-                    URL: {source["url"]}
-                    Description: {source.get("description")}
-                    Subtype: {source.get("subtype")}
-                    Content: {content}
-                    Age: {source.get("age")}
-                """)
-
-            message_tt_sources = "\n\n".join(tt_final_sources)
-
-            if video_reference:
-                video_mention = f"""
-                Title: {video_reference["title"]}
-                URL: {video_reference["url"]}
-                Description: {video_reference.get("description")}
-                Age: {video_reference.get("age")}
-                Duration: {video_reference.get("video", {}).get("duration")}
-                Creator: {video_reference.get("video", {}).get("creator")}
-                """
-            else:
-                video_mention = None
+        final_message_tt_sources = f"""
+        Text sources: {message_tt_sources}
+        """
 
+        if not tt_final_sources:
+            # Nothing could be fetched in time, answer from the search descriptions
             final_message_tt_sources = f"""
-            Text sources: {message_tt_sources}
-            """
+        Text sources: {final_message_sources}
+        """
 
-            final_message_tt_sources = final_message_tt_sources if video_mention else final_message_sources + f"\n\nVideo source: {video_mention}"
+        if video_mention:
+            final_message_tt_sources += f"\n\nVideo source: {video_mention}"
 
-            resume = await manage_interaction(db, final_message_tt_sources, agent_name="source-resumer", user_id=user_id, group_id=group.id if is_group else None)
+        resume = await _timed(timings, "resume", manage_interaction(
+            db, final_message_tt_sources, agent_name="source-resumer", user_id=user_id, group_id=group_id
+        ))
 
-            return resume
\ No newline at end of file
+        await notice
+        await _report_timings(timings, time.monotonic() - start)
+        return resume
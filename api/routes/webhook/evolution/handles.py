@@ -1,3 +1,4 @@
+import asyncio
 import re
 from datetime import datetime, timedelta
 from typing import Optional
@@ -13,28 +14,40 @@ from database.operations.base import UserRepository
 from database.operations.content import MessageRepository
 from database.operations.manager import ModelRepository
 from api.routes.webhook.evolution.functions import (
-    get_resume_conversation, generic_conversation,
+    get_resume_conversation, generic_conversation, generic_conversation_stream, save_generic_reply,
     static, animated, remember_generator,
     generate_image, list_images, search_images,
     token_consumption, transcribe_audio, web_search, get_pictures,
-    download_twitter_media, extract_twitter_url
+    extract_twitter_url, get_twitter_media
 )
 
-import base64
 from log import logger
 from external.evolution import (
     send_message, send_audio, send_sticker,
     send_animated_sticker, send_image, download_media, send_video
 )
 from services import describe_image, parse_params, action_remember
-from tts import text_to_speech
+from services.period_summary import parse_period
+from tts import text_to_speech, speak_stream
+from utils import get_env_var
 
 
 COMMANDS = [
     ("@Gork", "Interação genérica. _[Menção necessária apenas quando em grupos]_", "interaction", []),
     ("!help", "Mostra os comandos disponíveis. _[Ignora o restante da mensagem]_", "utility", []),
     ("!audio", "Envia áudio como forma de resposta. _[Adicione !english para voz em inglês]_", "audio", []),
-    ("!resume", "Faz um resumo das últimas 30 mensagens. _[Ignora o restante da mensagem]_", "utility", []),
+    (
+        "!resume",
+        "Faz um resumo da conversa. _[Ignora o restante da mensagem]_",
+        "utility",
+        [
+            (":period", "Resume um período em vez da conversa recente. *Máximo de 7 dias*", [
+                ("30m", "Últimos 30 minutos"),
+                ("6h", "Últimas 6 horas"),
+                ("1d", "Último dia"),
+            ]),
+        ]
+    ),
     ("!search", "Faz uma pesquisa por termo na internet e retorna um resumo.", "search", []),
     ("!model", "Mostra o modelo sendo utilizado.", "search", []),
     ("!picture", "Envia a foto dos usuários mencionados", "image", []),
@@ -70,6 +83,9 @@ COMMANDS = [
     ("!twitter", "Baixa vídeos ou imagens de links do X/Twitter e envia. _[Ex: !twitter https://x.com/usuario/status/12345]_", "media", []),
 ]
 
+AUDIO_STREAMING = (get_env_var("AUDIO_STREAMING") or "false").lower() == "true"
+AUDIO_STREAMING_PROGRESSIVE = (get_env_var("AUDIO_STREAMING_PROGRESSIVE") or "false").lower() == "true"
+
 
 async def is_message_too_old(timestamp: int, max_minutes: int = 20) -> bool:
     created_at = datetime.fromtimestamp(timestamp)
@@ -178,9 +194,19 @@ async def handle_resume_command(
         remote_id: str,
         message_id: str,
         user_id: int,
+        message: str,
         group_id: Optional[int] = None
 ):
-    resume = await get_resume_conversation(user_id, group_id=group_id)
+    params = parse_params(message)
+
+    period = None
+    if "period" in params:
+        period = parse_period(params["period"])
+        if period is None:
+            await send_message(remote_id, "Período inválido. Use por exemplo :period=30m, :period=6h ou :period=1d (máximo 7d)", message_id)
+            return
+
+    resume = await get_resume_conversation(user_id, group_id=group_id, period=period)
     await send_message(remote_id, resume, message_id)
 
 
@@ -314,11 +340,25 @@ async def handle_generic_conversation(
         treated_text: str,
         context: dict[str, str],
         group_id: Optional[int] = None,
-        audio: bool = False
+        audio: bool = False,
+        response_message: Optional[dict] = None
 ):
-
+    """
+    Args:
+        response_message: Reply already generated by a speculative ``generic_conversation``
+            call (not persisted yet). When given, no new completion is made
+    """
     is_group = True if group_id else False
-    response_message = await generic_conversation(group_id, user.name, treated_text, user.id, context, is_group)
+
+    if response_message is not None:
+        await save_generic_reply(group_id, is_group, response_message.get("text"))
+
+    elif audio and AUDIO_STREAMING:
+        await stream_generic_audio(remote_id, message_id, user, treated_text, context, group_id)
+        return
+
+    else:
+        response_message = await generic_conversation(group_id, user.name, treated_text, user.id, context, is_group)
 
     if audio:
         audio_base64 = await text_to_speech(
@@ -333,6 +373,44 @@ async def handle_generic_conversation(
         return
 
 
+async def stream_generic_audio(
+        remote_id: str,
+        message_id: str,
+        user: User,
+        treated_text: str,
+        context: dict[str, str],
+        group_id: Optional[int] = None,
+):
+    """
+    Pipes the streamed generic reply into sentence-level TTS.
+
+    Each sentence is synthesized as soon as it is complete, so when the completion ends
+    only the last sentence is left to synthesize. With AUDIO_STREAMING_PROGRESSIVE every
+    sentence is sent as its own audio instead of a single concatenated one.
+    """
+    is_group = True if group_id else False
+    language = asyncio.get_running_loop().create_future()
+
+    async def text_deltas():
+        async for field, value in generic_conversation_stream(group_id, user.name, treated_text, user.id, context, is_group):
+            if field == "language":
+                if not language.done():
+                    language.set_result(value)
+            else:
+                yield value
+
+    async def send_segment(audio_base64: str):
+        await send_audio(remote_id, audio_base64, message_id)
+
+    audio_base64 = await speak_stream(
+        text_deltas(), language,
+        on_segment=send_segment if AUDIO_STREAMING_PROGRESSIVE else None
+    )
+
+    if not AUDIO_STREAMING_PROGRESSIVE and audio_base64:
+        await send_audio(remote_id, audio_base64, message_id)
+
+
 def has_explicit_command(text: str) -> bool:
     return any(cmd in text.lower() for cmd, _, _, _ in COMMANDS if cmd.startswith("!"))
 
@@ -498,7 +576,7 @@ async def handle_twitter_command(
     twitter_url = extract_twitter_url(conversation)
 
     if not twitter_url:
-        await logger.warning(
+        await logger.warn(
             "TwitterCommand",
             "URL não encontrada",
             {"conversation": conversation}
@@ -521,8 +599,17 @@ async def handle_twitter_command(
     # Envia mensagem de processamento
     await send_message(remote_id, "⏳ Calma lá, chifrudo..", message_id)
 
-    # Baixa a mídia (vídeo ou imagem)
-    result = await download_twitter_media(twitter_url)
+    # Busca a mídia (vídeo ou imagem) no cache ou baixa e guarda no MinIO
+    try:
+        result = await get_twitter_media(twitter_url)
+    except Exception as e:
+        await logger.error("TwitterCommand", "Erro ao preparar mídia", str(e))
+        await send_message(
+            remote_id,
+            "❌ Esse vídeo ta quebrado, favor parar de gastar tokens nele.",
+            message_id
+        )
+        return
 
     if not result.is_success:
         await logger.error(
@@ -537,48 +624,22 @@ async def handle_twitter_command(
         await send_message(remote_id, f"❌ {result.error}", message_id)
         return
 
-    # Valida dados
-    if not result.media_bytes or not result.media_type:
-        await logger.error(
-            "TwitterCommand",
-            "Dados inválidos",
-            {"url": twitter_url, "has_bytes": bool(result.media_bytes), "media_type": result.media_type}
-        )
-        await send_message(
-            remote_id,
-            "❌ Deu ruim, cria. Tente daqui um tempo",
-            message_id
-        )
-        return
-
-    # Converte para base64 para envio
-    try:
-        media_base64 = base64.b64encode(result.media_bytes).decode('utf-8')
-    except Exception as e:
-        await logger.error("TwitterCommand", "Erro ao codificar base64", str(e))
-        await send_message(
-            remote_id,
-            "❌ Esse vídeo ta quebrado, favor parar de gastar tokens nele.",
-            message_id
-        )
-        return
-
     # Envia a mídia via WhatsApp de acordo com o tipo
     try:
         if result.media_type == "video":
-            await send_video(remote_id, media_base64, message_id)
+            await send_video(remote_id, result.media, message_id)
             await logger.info(
                 "TwitterCommand",
                 "Vídeo enviado",
-                {"url": twitter_url, "size": len(result.media_bytes)}
+                {"url": twitter_url, "size": result.size, "cached": result.cached}
             )
             await send_message(remote_id, "✅ Vídeo enviado com sucesso!", message_id)
         else:
-            await send_image(remote_id, media_base64)
+            await send_image(remote_id, result.media)
             await logger.info(
                 "TwitterCommand",
                 "Imagem enviada",
-                {"url": twitter_url, "size": len(result.media_bytes)}
+                {"url": twitter_url, "size": result.size, "cached": result.cached}
             )
             await send_message(remote_id, "✅ Imagem enviada com sucesso!", message_id)
     except Exception as e:
@@ -1,9 +1,11 @@
+import time
 from datetime import datetime
 from typing import Optional
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from api.routes.webhook.evolution.functions.generic import generic_conversation
 from api.routes.webhook.evolution.functions.intent import classify_intent
 from api.routes.webhook.evolution.functions.transcribe_audio import transcribe_audio
 from api.routes.webhook.evolution.handles import (
@@ -22,10 +24,16 @@ from database.operations.base import UserRepository, GroupRepository, WhiteListR
 from database.operations.content import MessageRepository
 from external import get_group_info
 from external.evolution import send_message
+from log import logger
 from services import verifiy_media, save_profile_pic
+from services.message_buffer import message_buffer
+from services.speculation import Speculation
 from utils import get_env_var
 
 
+SPECULATIVE_INTENT = (get_env_var("SPECULATIVE_INTENT") or "false").lower() == "true"
+
+
 async def process_group_message(
         body: dict,
         remote_id: str,
@@ -56,7 +64,7 @@ async def process_group_message(
     group = await group_repo.find_or_create(group_jid=group_jid)
 
     if not group.name:
-        gp_infos = get_group_info(remote_id)
+        gp_infos = await get_group_info(remote_id)
         group = await group_repo.find_or_create(
             group_jid=group_jid,
             name=gp_infos["subject"],
@@ -70,13 +78,14 @@ async def process_group_message(
 
     conversation = context_message.get("text_message", "")
 
-    await message_repo.find_or_create(
+    message = await message_repo.find_or_create(
         message_id=message_id,
         sender_id=user.id,
         group_id=group.id,
         content=conversation,
         created_at=datetime.fromtimestamp(event_data["messageTimestamp"])
     )
+    message_buffer.append(message, user.name)
 
     if not is_whitelisted:
         return
@@ -146,13 +155,14 @@ async def process_private_message(
 
     conversation = context.get("text_message", "")
 
-    await message_repo.find_or_create(
+    message = await message_repo.find_or_create(
         message_id=message_id,
         sender_id=user.id,
         group_id=None,
         content=conversation,
         created_at=datetime.fromtimestamp(event_data["messageTimestamp"])
     )
+    message_buffer.append(message, user.name)
 
     if not is_whitelisted:
         await send_message(
@@ -204,7 +214,7 @@ async def process_explicit_commands(
         return
 
     if "!resume" in lw_conversation:
-        await handle_resume_command(remote_id, message_id, user.id, group_id)
+        await handle_resume_command(remote_id, message_id, user.id, conversation, group_id)
         return
 
     if "!transcribe" in lw_conversation:
@@ -330,13 +340,28 @@ async def process_intent_based_commands(
         scheduler: AsyncIOScheduler,
         context: dict[str, str]
 ):
-    intent, wants_audio = await classify_intent(conversation, db, COMMANDS, context, user.id, group_id)
     is_group = True if group_id else False
 
+    # Most messages end up as a generic conversation, so with SPECULATIVE_INTENT the
+    # reply is generated while the intent is classified and discarded if not needed
+    speculation = None
+    if SPECULATIVE_INTENT:
+        speculation = Speculation("generic", generic_conversation(
+            group_id, user.name, treated_text, user.id, context, is_group, persist_reply=False
+        ))
+
+    try:
+        intent, wants_audio = await classify_intent(conversation, db, COMMANDS, context, user.id, group_id)
+    except BaseException:
+        if speculation:
+            await speculation.discard()
+        raise
+    decided_at = time.monotonic()
+
     intent_handlers = {
         "help": lambda: handle_help_command(remote_id, message_id),
         "model": lambda: handle_model_command(remote_id, message_id, db),
-        "resume": lambda: handle_resume_command(remote_id, message_id, user.id, group_id),
+        "resume": lambda: handle_resume_command(remote_id, message_id, user.id, conversation, group_id),
         "transcribe": lambda: handle_transcribe_command(remote_id, message_id, body, user.id, group_id),
         "search": lambda: handle_search_command(remote_id, message_id, treated_text, is_group, user.id),
         "image": lambda: handle_image_command(remote_id, user.id, treated_text, body, group_id),
@@ -347,8 +372,19 @@ async def process_intent_based_commands(
     handler = intent_handlers.get(intent)
 
     if handler:
+        if speculation:
+            await speculation.discard()
         await handler()
-    else:
-        await handle_generic_conversation(
-            remote_id, message_id, user, treated_text, context, group_id, wants_audio
-        )
\ No newline at end of file
+        return
+
+    response_message = None
+    if speculation:
+        try:
+            response_message = await speculation.use(decided_at)
+        except Exception as error:
+            await logger.error("Speculation", "Generic reply", str(error))
+
+    await handle_generic_conversation(
+        remote_id, message_id, user, treated_text, context, group_id, wants_audio,
+        response_message=response_message
+    )
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""
+Time-to-audio benchmark for !audio replies: batch TTS vs sentence-level streaming.
+
+The LLM is simulated by a token stream at a fixed rate, so only the TTS pipeline is
+measured. Uses the real Piper voices by default; --simulate replaces synthesis with a
+fixed cost per character for machines without the voice models.
+
+Usage:
+    python -m benchmarks.tts_streaming [--tokens-per-second 40] [--runs 3] [--simulate]
+"""
+import argparse
+import asyncio
+import io
+import statistics
+import time
+import wave
+
+from tts.piper_ import synthesize
+from tts.streaming import speak_stream
+
+
+ANSWER = (
+    "Boa pergunta! O Brasil tem seis biomas principais: Amazônia, Cerrado, Caatinga, "
+    "Mata Atlântica, Pampa e Pantanal. A Amazônia é a maior floresta tropical do mundo "
+    "e cobre quase metade do território nacional. O Cerrado é conhecido como a caixa "
+    "d'água do Brasil, porque abriga nascentes de rios importantes. A Caatinga é o único "
+    "bioma exclusivamente brasileiro e tem uma adaptação incrível à seca. Já a Mata "
+    "Atlântica sofreu muito com o desmatamento e hoje resta pouco da cobertura original. "
+    "O Pampa fica no sul e é marcado pelos campos abertos. Por fim, o Pantanal é a maior "
+    "planície alagável do planeta, com uma fauna riquíssima. Se quiser, posso detalhar "
+    "algum deles!"
+)
+
+SIMULATED_SECONDS_PER_CHAR = 0.002
+
+
+def simulated_synthesize(text: str, language: str) -> bytes:
+    time.sleep(len(text) * SIMULATED_SECONDS_PER_CHAR)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(22050)
+        wav_file.writeframes(b"\x00\x00" * int(22050 * len(text) / 15))
+    return buffer.getvalue()
+
+
+async def token_stream(text: str, tokens_per_second: float):
+    words = text.split(" ")
+    for idx, word in enumerate(words):
+        await asyncio.sleep(1 / tokens_per_second)
+        yield word if idx == 0 else f" {word}"
+
+
+async def run_batch(tokens_per_second: float, synthesizer) -> float:
+    start = time.perf_counter()
+    parts = [chunk async for chunk in token_stream(ANSWER, tokens_per_second)]
+    await asyncio.to_thread(synthesizer, "".join(parts), "pt")
+    return time.perf_counter() - start
+
+
+async def run_streaming(tokens_per_second: float, synthesizer) -> tuple[float, float]:
+    start = time.perf_counter()
+    first_segment = None
+
+    async def on_segment(_):
+        nonlocal first_segment
+        if first_segment is None:
+            first_segment = time.perf_counter() - start
+
+    language = asyncio.get_running_loop().create_future()
+    language.set_result("pt")
+    await speak_stream(token_stream(ANSWER, tokens_per_second), language, on_segment, synthesizer)
+    return time.perf_counter() - start, first_segment
+
+
+async def main(tokens_per_second: float, runs: int, simulate: bool):
+    synthesizer = simulated_synthesize if simulate else synthesize
+    synthesizer("Aquecimento.", "pt")
+
+    batch, streaming, first = [], [], []
+    for _ in range(runs):
+        batch.append(await run_batch(tokens_per_second, synthesizer))
+        total, first_segment = await run_streaming(tokens_per_second, synthesizer)
+        streaming.append(total)
+        first.append(first_segment)
+
+    print(f"answer: {len(ANSWER)} chars, {len(ANSWER.split())} tokens at {tokens_per_second}/s, {runs} runs")
+    print(f"batch      time-to-audio:       {statistics.median(batch):.2f}s")
+    print(f"streaming  time-to-audio:       {statistics.median(streaming):.2f}s")
+    print(f"streaming  time-to-first-audio: {statistics.median(first):.2f}s (progressive mode)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens-per-second", type=float, default=40)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--simulate", action="store_true")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.tokens_per_second, args.runs, args.simulate))
@@ -0,0 +1,85 @@
+"""
+Peak memory of concurrent !twitter downloads: in-memory body + base64 vs streaming to disk.
+
+The media server is simulated with an ``httpx.MockTransport`` that streams the video
+in chunks, so only the client side is measured. Each mode runs in its own process and
+reports how much its peak RSS grew over the RSS after imports.
+
+Usage:
+    python -m benchmarks.twitter_download_rss [--size-mb 40] [--concurrency 8]
+"""
+import argparse
+import asyncio
+import base64
+import multiprocessing
+import os
+import resource
+
+import httpx
+
+from api.routes.webhook.evolution.functions.twitter_video import _download_media_file
+
+
+CHUNK_SIZE = 64 * 1024
+MEDIA_URL = "https://video.twimg.com/benchmark.mp4"
+
+
+def media_client(size: int) -> httpx.AsyncClient:
+    chunk = b"\x00" * CHUNK_SIZE
+
+    async def body():
+        for sent in range(0, size, CHUNK_SIZE):
+            yield chunk[:min(CHUNK_SIZE, size - sent)]
+            await asyncio.sleep(0)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers={"content-length": str(size), "content-type": "video/mp4"}, content=body())
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+async def in_memory(client: httpx.AsyncClient) -> int:
+    # What !twitter did before: the whole body in memory, then encoded again for Evolution
+    response = await client.get(MEDIA_URL)
+    media_base64 = base64.b64encode(response.content).decode("utf-8")
+    return len(media_base64)
+
+
+async def streaming(client: httpx.AsyncClient) -> int:
+    path, size = await _download_media_file(client, MEDIA_URL, "video")
+    try:
+        return size
+    finally:
+        os.unlink(path)
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(mode: str, size: int, concurrency: int) -> float:
+    baseline = peak_rss_mb()
+    download = in_memory if mode == "in-memory" else streaming
+
+    async def main():
+        async with media_client(size) as client:
+            await asyncio.gather(*(download(client) for _ in range(concurrency)))
+
+    asyncio.run(main())
+    return peak_rss_mb() - baseline
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    print(f"media: {args.size_mb:.0f}MB, {args.concurrency} concurrent downloads")
+
+    context = multiprocessing.get_context("spawn")
+    for mode in ("in-memory", "streaming"):
+        with context.Pool(1) as pool:
+            growth = pool.apply(run, (mode, size, args.concurrency))
+        print(f"{mode:<10} peak RSS growth: {growth:.0f}MB")
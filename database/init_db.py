@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 
 from database import PgConnection
 from database.models.manager import Agent
@@ -7,23 +8,56 @@ from log import logger
 from utils import project_root
 
 
-async def init_agents() -> None:
-    files = os.listdir(f"{project_root}/agents")
-    md_files = [file for file in files if file.endswith(".md")]
-    async with PgConnection() as db:
-        agent_repo = AgentRepository(Agent, db)
+AGENTS_DIR = f"{project_root}/agents"
+
+
+def agent_files() -> dict[str, str]:
+    """Agent name -> path of every ``agents/*.md``."""
+    return {
+        file.rsplit(".", 1)[0]: f"{AGENTS_DIR}/{file}"
+        for file in os.listdir(AGENTS_DIR)
+        if file.endswith(".md")
+    }
+
+
+async def sync_agent_files(db, names: Optional[list[str]] = None) -> list[str]:
+    """
+    Writes the agent files whose content differs from the prompt in the database.
+
+    Args:
+        names: Only these agents. Defaults to every file in ``agents/``
 
-        for file in md_files:
-            agent_name = file.split(".")[0]
+    Returns:
+        Names of the agents inserted or updated
+    """
+    agent_repo = AgentRepository(Agent, db)
+    stored = {agent.name: agent for agent in await agent_repo.find_all(limit=1000)}
 
-            with open(f"{project_root}/agents/{file}", "r", encoding="utf-8") as f:
-                content = f.read()
+    changed = []
+    for agent_name, path in agent_files().items():
+        if names is not None and agent_name not in names:
+            continue
 
-            _ = await agent_repo.upsert_by_name(
-                name = agent_name,
-                prompt = content
-            )
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read()
+
+        agent = stored.get(agent_name)
+        if agent is not None and agent.prompt == content:
+            continue
+
+        _ = await agent_repo.upsert_by_name(
+            name = agent_name,
+            prompt = content
+        )
+        changed.append(agent_name)
+
+    return changed
+
+
+async def init_agents() -> None:
+    async with PgConnection() as db:
+        changed = await sync_agent_files(db)
 
-    await logger.info("Agents", "Initialization", "Successful")
+    await logger.info("Agents", "Initialization", f"Successful, {len(changed)} updated: {', '.join(changed) or '-'}")
 
-    return
\ No newline at end of file
+    return
@@ -0,0 +1,23 @@
+-- model routing
+-- depends: 20251221_01_7rSRX-favorite-message
+
+ALTER TABLE "manager"."model" ADD COLUMN routable BOOLEAN DEFAULT FALSE NOT NULL;
+
+UPDATE "manager"."model" SET routable = TRUE
+WHERE text_default
+   OR openrouter_id IN ('google/gemini-2.0-flash-lite-001', 'openai/gpt-4.1-mini', 'deepseek/deepseek-chat-v3.1');
+
+ALTER TABLE "manager"."agent" ADD COLUMN routing_policy TEXT DEFAULT 'default' NOT NULL;
+ALTER TABLE "manager"."agent" ADD COLUMN max_input_price NUMERIC(10, 2);
+ALTER TABLE "manager"."agent" ADD COLUMN pinned_model_id INTEGER;
+ALTER TABLE "manager"."agent" ADD CONSTRAINT agent_pinned_model_fk FOREIGN KEY (pinned_model_id) REFERENCES "manager"."model"(id);
+ALTER TABLE "manager"."agent" ADD CONSTRAINT agent_routing_policy_check CHECK (routing_policy IN ('default', 'pinned', 'fastest', 'cheapest'));
+
+UPDATE "manager"."agent" SET routing_policy = 'fastest', max_input_price = 0.50
+WHERE name IN ('intent-classifier', 'term-formatter', 'term-search', 'remember-formatter');
+
+ALTER TABLE "manager"."interaction" ADD COLUMN latency_ms INTEGER;
+ALTER TABLE "manager"."interaction" ADD COLUMN route_policy TEXT;
+ALTER TABLE "manager"."interaction" ADD COLUMN attempt SMALLINT DEFAULT 1 NOT NULL;
+
+CREATE INDEX interaction_model_inserted_idx ON "manager"."interaction" (model_id, inserted_at DESC);
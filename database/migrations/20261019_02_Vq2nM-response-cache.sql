@@ -0,0 +1,33 @@
+-- response cache
+-- depends: 20261019_01_kR7pX-model-routing
+
+ALTER TABLE "manager"."agent" ADD COLUMN cache_enabled BOOLEAN DEFAULT FALSE NOT NULL;
+ALTER TABLE "manager"."agent" ADD COLUMN cache_ttl_seconds INTEGER DEFAULT 3600 NOT NULL;
+ALTER TABLE "manager"."agent" ADD COLUMN cache_threshold NUMERIC(4, 3) DEFAULT 0.950 NOT NULL;
+
+UPDATE "manager"."agent" SET cache_enabled = TRUE, cache_ttl_seconds = 86400, cache_threshold = 0.970 WHERE name = 'intent-classifier';
+UPDATE "manager"."agent" SET cache_enabled = TRUE, cache_ttl_seconds = 1800, cache_threshold = 0.950 WHERE name = 'term-search';
+UPDATE "manager"."agent" SET cache_enabled = TRUE, cache_ttl_seconds = 86400, cache_threshold = 0.980 WHERE name = 'term-formatter';
+
+CREATE TABLE "manager"."response_cache" (
+    id SERIAL,
+    agent_id INTEGER NOT NULL,
+    model_id INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    prompt_embedding vector(384) NOT NULL,
+    response TEXT NOT NULL,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    latency_ms INTEGER,
+    hits INTEGER NOT NULL DEFAULT 0,
+    inserted_at TIMESTAMPTZ NOT NULL DEFAULT (NOW() AT TIME ZONE 'America/Sao_Paulo'),
+    expires_at TIMESTAMPTZ NOT NULL,
+
+    CONSTRAINT response_cache_pk PRIMARY KEY (id),
+    CONSTRAINT response_cache_agent_fk FOREIGN KEY (agent_id) REFERENCES "manager"."agent"(id) ON DELETE CASCADE,
+    CONSTRAINT response_cache_model_fk FOREIGN KEY (model_id) REFERENCES "manager"."model"(id)
+);
+
+CREATE INDEX response_cache_lookup_idx ON "manager"."response_cache" (agent_id, fingerprint, expires_at);
+CREATE INDEX response_cache_embedding_idx ON "manager"."response_cache" USING hnsw (prompt_embedding vector_cosine_ops);
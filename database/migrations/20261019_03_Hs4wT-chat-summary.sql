@@ -0,0 +1,18 @@
+-- chat summary
+-- depends: 20261019_02_Vq2nM-response-cache
+
+CREATE TABLE "content"."chat_summary" (
+    id SERIAL,
+    group_id INTEGER NOT NULL,
+    summary TEXT NOT NULL,
+    last_message_id INTEGER NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    inserted_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+
+    CONSTRAINT chat_summary_pk PRIMARY KEY (id),
+    CONSTRAINT chat_summary_group_uq UNIQUE (group_id),
+    CONSTRAINT chat_summary_group_fk FOREIGN KEY (group_id) REFERENCES "base"."group"(id) ON DELETE CASCADE
+);
+
+CREATE INDEX message_group_id_idx ON "content"."message" (group_id, id) WHERE deleted_at IS NULL;
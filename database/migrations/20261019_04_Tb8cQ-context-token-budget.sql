@@ -0,0 +1,8 @@
+-- context token budget
+-- depends: 20261019_03_Hs4wT-chat-summary
+
+ALTER TABLE "manager"."agent" ADD COLUMN context_token_budget INTEGER;
+
+UPDATE "manager"."agent" SET context_token_budget = 3000 WHERE name = 'generic';
+UPDATE "manager"."agent" SET context_token_budget = 1500 WHERE name = 'term-search';
+UPDATE "manager"."agent" SET context_token_budget = 6000 WHERE name = 'conversation-summarizer';
@@ -0,0 +1,18 @@
+-- summary chunk
+-- depends: 20261019_04_Tb8cQ-context-token-budget
+
+CREATE TABLE "content"."summary_chunk" (
+    id SERIAL,
+    group_id INTEGER NOT NULL,
+    first_message_id INTEGER NOT NULL,
+    last_message_id INTEGER NOT NULL,
+    message_count INTEGER NOT NULL,
+    summary TEXT NOT NULL,
+    inserted_at TIMESTAMP NOT NULL DEFAULT NOW(),
+
+    CONSTRAINT summary_chunk_pk PRIMARY KEY (id),
+    CONSTRAINT summary_chunk_range_uq UNIQUE (group_id, first_message_id, last_message_id),
+    CONSTRAINT summary_chunk_group_fk FOREIGN KEY (group_id) REFERENCES "base"."group"(id) ON DELETE CASCADE
+);
+
+CREATE INDEX summary_chunk_inserted_at_idx ON "content"."summary_chunk" (inserted_at);
@@ -0,0 +1,8 @@
+-- message embedding
+-- depends: 20261019_05_Pm2rJ-summary-chunk
+
+ALTER TABLE "content"."message" ADD COLUMN content_embedding vector(384);
+
+CREATE INDEX message_content_embedding_idx ON "content"."message" USING hnsw (content_embedding vector_cosine_ops);
+CREATE INDEX message_pending_embedding_idx ON "content"."message" (id)
+    WHERE content_embedding IS NULL AND content IS NOT NULL AND deleted_at IS NULL;
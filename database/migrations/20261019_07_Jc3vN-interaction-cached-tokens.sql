@@ -0,0 +1,4 @@
+-- interaction cached tokens
+-- depends: 20261019_06_Wd5eK-message-embedding
+
+ALTER TABLE "manager"."interaction" ADD COLUMN cached_tokens INTEGER DEFAULT 0 NOT NULL;
@@ -0,0 +1,20 @@
+-- web cache
+-- depends: 20261019_07_Jc3vN-interaction-cached-tokens
+
+CREATE TABLE "content"."web_cache" (
+    id SERIAL,
+    kind TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    inserted_at TIMESTAMPTZ NOT NULL DEFAULT (NOW() AT TIME ZONE 'America/Sao_Paulo'),
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT (NOW() AT TIME ZONE 'America/Sao_Paulo'),
+    expires_at TIMESTAMPTZ NOT NULL,
+
+    CONSTRAINT web_cache_pk PRIMARY KEY (id),
+    CONSTRAINT web_cache_key_uq UNIQUE (kind, fingerprint)
+);
+
+CREATE INDEX web_cache_expires_idx ON "content"."web_cache" (expires_at);
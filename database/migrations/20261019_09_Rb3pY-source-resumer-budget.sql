@@ -0,0 +1,4 @@
+-- source resumer budget
+-- depends: 20261019_08_Fn6sL-web-cache
+
+UPDATE "manager"."agent" SET context_token_budget = 6000 WHERE name = 'source-resumer';
@@ -0,0 +1,9 @@
+-- summarizer budget
+-- depends: 20261019_09_Rb3pY-source-resumer-budget
+
+-- conversation-summarizer is only created from agents/ at boot, after the migrations,
+-- so 20261019_04 had no row to update. The prompt is filled in by sync_agent_files.
+INSERT INTO "manager"."agent" (name, prompt, context_token_budget)
+VALUES ('conversation-summarizer', '', 6000)
+ON CONFLICT (name) DO UPDATE SET context_token_budget = EXCLUDED.context_token_budget
+WHERE "manager"."agent".context_token_budget IS NULL;
@@ -0,0 +1,9 @@
+-- resume period budget
+-- depends: 20261019_10_Ks8dW-summarizer-budget
+
+-- Created from agents/ at boot like conversation-summarizer; the prompts are filled in
+-- by sync_agent_files.
+INSERT INTO "manager"."agent" (name, prompt, context_token_budget)
+VALUES ('resume-map', '', 6000), ('resume-reduce', '', 6000)
+ON CONFLICT (name) DO UPDATE SET context_token_budget = EXCLUDED.context_token_budget
+WHERE "manager"."agent".context_token_budget IS NULL;
@@ -1,2 +1,5 @@
 from database.models.content.media import Media
-from database.models.content.message import Message
\ No newline at end of file
+from database.models.content.message import Message
+from database.models.content.chat_summary import ChatSummary
+from database.models.content.summary_chunk import SummaryChunk
+from database.models.content.web_cache import WebCache
\ No newline at end of file
@@ -0,0 +1,23 @@
+from sqlalchemy import (
+    Column, Integer, Text,
+    TIMESTAMP, func, ForeignKey
+)
+from sqlalchemy.orm import relationship
+
+from database.models import Base
+
+
+class ChatSummary(Base):
+    __tablename__ = "chat_summary"
+    __table_args__ = {"schema": "content"}
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    group_id = Column(Integer, ForeignKey("base.group.id"), unique=True, nullable=False)
+    summary = Column(Text, nullable=False)
+    last_message_id = Column(Integer, nullable=False)
+    message_count = Column(Integer, nullable=False, default=0)
+
+    inserted_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    group = relationship("Group")
@@ -3,7 +3,8 @@ from sqlalchemy import (
     TIMESTAMP, func, ForeignKey,
     UUID, text, BOOLEAN
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
+from pgvector.sqlalchemy import Vector
 
 from database.models import Base
 
@@ -22,6 +23,8 @@ class Message(Base):
     group_id = Column(Integer, ForeignKey("base.group.id"))
 
     content = Column(Text)
+    # Filled in background by services.message_embedder; deferred so regular queries do not load it
+    content_embedding = deferred(Column(Vector(384)))
     created_at = Column(TIMESTAMP, nullable=False)
     is_favorite = Column(BOOLEAN, default=False)
 
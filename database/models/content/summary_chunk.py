@@ -0,0 +1,20 @@
+from sqlalchemy import (
+    Column, Integer, Text,
+    TIMESTAMP, func, ForeignKey
+)
+
+from database.models import Base
+
+
+class SummaryChunk(Base):
+    __tablename__ = "summary_chunk"
+    __table_args__ = {"schema": "content"}
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    group_id = Column(Integer, ForeignKey("base.group.id"), nullable=False)
+    first_message_id = Column(Integer, nullable=False)
+    last_message_id = Column(Integer, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    summary = Column(Text, nullable=False)
+
+    inserted_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
@@ -0,0 +1,30 @@
+from sqlalchemy import (
+    Column, Integer, Text,
+    TIMESTAMP, func
+)
+
+from database.models import Base
+
+
+class WebCache(Base):
+    __tablename__ = "web_cache"
+    __table_args__ = {"schema": "content"}
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(Text, nullable=False)
+    fingerprint = Column(Text, nullable=False)
+    key = Column(Text, nullable=False)
+    value = Column(Text, nullable=False)
+    content_hash = Column(Text, nullable=False)
+    hits = Column(Integer, nullable=False, default=0)
+    inserted_at = Column(
+        TIMESTAMP(timezone=True),
+        server_default=func.timezone('America/Sao_Paulo', func.now()),
+        nullable=False
+    )
+    refreshed_at = Column(
+        TIMESTAMP(timezone=True),
+        server_default=func.timezone('America/Sao_Paulo', func.now()),
+        nullable=False
+    )
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False)
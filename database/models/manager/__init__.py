@@ -3,3 +3,4 @@ from database.models.manager.command import Command
 from database.models.manager.interaction import Interaction
 from database.models.manager.agent import Agent
 from database.models.manager.remember import Remember
+from database.models.manager.response_cache import ResponseCache
\ No newline at end of file
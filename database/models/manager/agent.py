@@ -1,6 +1,6 @@
 from sqlalchemy import (
     Column, Integer, Text,
-    TIMESTAMP, func, Boolean, Numeric
+    TIMESTAMP, func, Boolean, Numeric, ForeignKey
 )
 
 from database.models import Base
@@ -13,5 +13,12 @@ class Agent(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(Text, nullable=False, unique=True)
     prompt = Column(Text, nullable=False)
+    routing_policy = Column(Text, nullable=False, default="default")
+    max_input_price = Column(Numeric(10, 2))
+    pinned_model_id = Column(Integer, ForeignKey("manager.model.id"))
+    cache_enabled = Column(Boolean, nullable=False, default=False)
+    cache_ttl_seconds = Column(Integer, nullable=False, default=3600)
+    cache_threshold = Column(Numeric(4, 3), nullable=False, default=0.95)
+    context_token_budget = Column(Integer)
 
     inserted_at = Column(TIMESTAMP, server_default=func.now())
\ No newline at end of file
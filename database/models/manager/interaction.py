@@ -1,6 +1,6 @@
 from sqlalchemy import (
     Column, Integer, Text,
-    TIMESTAMP, func, ForeignKey
+    TIMESTAMP, func, ForeignKey, SmallInteger
 )
 from sqlalchemy.orm import relationship
 
@@ -22,6 +22,10 @@ class Interaction(Base):
     system_behavior = Column(Text)
     input_tokens = Column(Integer, nullable=False)
     output_tokens = Column(Integer)
+    cached_tokens = Column(Integer, nullable=False, default=0)
+    latency_ms = Column(Integer)
+    route_policy = Column(Text)
+    attempt = Column(SmallInteger, nullable=False, default=1)
     inserted_at = Column(
         TIMESTAMP(timezone=True),
         server_default=func.timezone('America/Sao_Paulo', func.now()),
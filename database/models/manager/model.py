@@ -19,5 +19,6 @@ class Model(Base):
     audio_default = Column(Boolean, nullable=False, default=False)
     image_default = Column(Boolean, nullable=False, default=False)
     embedding_default = Column(Boolean, nullable=False, default=False)
+    routable = Column(Boolean, nullable=False, default=False)
 
     inserted_at = Column(TIMESTAMP, server_default=func.now())
\ No newline at end of file
@@ -0,0 +1,34 @@
+from sqlalchemy import (
+    Column, Integer, Text,
+    TIMESTAMP, func, ForeignKey
+)
+from sqlalchemy.orm import relationship
+from pgvector.sqlalchemy import Vector
+
+from database.models import Base
+
+
+class ResponseCache(Base):
+    __tablename__ = "response_cache"
+    __table_args__ = {"schema": "manager"}
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    agent_id = Column(Integer, ForeignKey("manager.agent.id"), nullable=False)
+    model_id = Column(Integer, ForeignKey("manager.model.id"), nullable=False)
+    fingerprint = Column(Text, nullable=False)
+    prompt = Column(Text, nullable=False)
+    prompt_embedding = Column(Vector(384), nullable=False)
+    response = Column(Text, nullable=False)
+    input_tokens = Column(Integer, nullable=False, default=0)
+    output_tokens = Column(Integer, nullable=False, default=0)
+    latency_ms = Column(Integer)
+    hits = Column(Integer, nullable=False, default=0)
+    inserted_at = Column(
+        TIMESTAMP(timezone=True),
+        server_default=func.timezone('America/Sao_Paulo', func.now()),
+        nullable=False
+    )
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False)
+
+    agent = relationship("Agent", backref="cached_responses")
+    model = relationship("Model")
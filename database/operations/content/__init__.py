@@ -1,2 +1,5 @@
 from database.operations.content.message import MessageRepository
-from database.operations.content.media import MediaRepository
\ No newline at end of file
+from database.operations.content.media import MediaRepository
+from database.operations.content.chat_summary import ChatSummaryRepository
+from database.operations.content.summary_chunk import SummaryChunkRepository
+from database.operations.content.web_cache import WebCacheRepository
\ No newline at end of file
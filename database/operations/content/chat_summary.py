@@ -0,0 +1,50 @@
+from datetime import datetime
+from typing import Optional, List
+
+from sqlalchemy import select, func
+
+from database.models.content import ChatSummary, Message
+from database.operations import BaseRepository
+
+
+class ChatSummaryRepository(BaseRepository[ChatSummary]):
+    async def find_by_group(self, group_id: int) -> Optional[ChatSummary]:
+        return await self.find_one_by(group_id=group_id)
+
+    async def save_summary(self, group_id: int, summary: str, last_message_id: int, new_messages: int) -> ChatSummary:
+        chat_summary = await self.find_by_group(group_id)
+
+        if chat_summary is None:
+            return await self.insert(ChatSummary(
+                group_id=group_id,
+                summary=summary,
+                last_message_id=last_message_id,
+                message_count=new_messages
+            ))
+
+        return await self.update(chat_summary.id, {
+            "summary": summary,
+            "last_message_id": last_message_id,
+            "message_count": chat_summary.message_count + new_messages
+        })
+
+    async def find_stale_groups(self, since: datetime, min_new: int) -> List[int]:
+        """Groups with at least ``min_new`` messages after their summary, among those active since ``since``."""
+        last_summarized = (
+            select(ChatSummary.last_message_id)
+            .filter(ChatSummary.group_id == Message.group_id)
+            .scalar_subquery()
+        )
+
+        result = await self.db.execute(
+            select(Message.group_id)
+            .filter(
+                Message.group_id.is_not(None),
+                Message.deleted_at.is_(None),
+                Message.created_at >= since,
+                Message.id > func.coalesce(last_summarized, 0)
+            )
+            .group_by(Message.group_id)
+            .having(func.count(Message.id) >= min_new)
+        )
+        return list(result.scalars().all())
@@ -2,7 +2,7 @@ from typing import Optional, List
 from datetime import datetime, timedelta
 
 from sqlalchemy.orm import joinedload
-from sqlalchemy import select, and_, desc
+from sqlalchemy import select, update, and_, desc, func
 
 from database.models.base import User
 from database.models.content import Message
@@ -43,6 +43,146 @@ class MessageRepository(BaseRepository[Message]):
         )
         return list(result.unique().scalars().all())
 
+    async def find_chat_messages(
+            self,
+            group_id: Optional[int] = None,
+            sender_id: Optional[int] = None,
+            after_id: Optional[int] = None,
+            limit: int = 100
+    ) -> List[Message]:
+        """Latest messages of a group (or sent by a user, in private chats), newest first.
+
+        With ``after_id`` only the messages inserted after that one are returned.
+        """
+        filters = [Message.deleted_at.is_(None)]
+        if group_id is not None:
+            filters.append(Message.group_id == group_id)
+        else:
+            filters.append(Message.user_id == sender_id)
+        if after_id is not None:
+            filters.append(Message.id > after_id)
+
+        result = await self.db.execute(
+            select(Message)
+            .options(joinedload(Message.sender))
+            .filter(and_(*filters))
+            .order_by(desc(Message.created_at))
+            .limit(limit)
+        )
+        return list(result.unique().scalars().all())
+
+    async def find_group_messages_after(self, group_id: int, after_id: int, limit: int = 200) -> List[Message]:
+        """Messages of a group inserted after ``after_id``, oldest first."""
+        result = await self.db.execute(
+            select(Message)
+            .options(joinedload(Message.sender))
+            .filter(
+                and_(
+                    Message.group_id == group_id,
+                    Message.id > after_id,
+                    Message.deleted_at.is_(None)
+                )
+            )
+            .order_by(Message.id)
+            .limit(limit)
+        )
+        return list(result.unique().scalars().all())
+
+    async def find_group_messages_since(self, group_id: int, since: datetime, limit: int = 5000) -> List[Message]:
+        """Messages of a group sent since ``since``, oldest first, capped to the latest ``limit``."""
+        latest = (
+            select(Message.id)
+            .filter(
+                and_(
+                    Message.group_id == group_id,
+                    Message.created_at >= since,
+                    Message.deleted_at.is_(None)
+                )
+            )
+            .order_by(desc(Message.id))
+            .limit(limit)
+            .subquery()
+        )
+
+        result = await self.db.execute(
+            select(Message)
+            .options(joinedload(Message.sender))
+            .filter(Message.id.in_(select(latest.c.id)))
+            .order_by(Message.id)
+        )
+        return list(result.unique().scalars().all())
+
+    async def find_pending_embedding(self, limit: int = 256) -> List[tuple[int, str]]:
+        """
+        ``(id, content)`` of messages with content and no embedding yet, oldest first.
+
+        The rows stay locked until ``set_embeddings`` commits, so workers running the
+        job at the same time take different batches.
+        """
+        result = await self.db.execute(
+            select(Message.id, Message.content)
+            .filter(
+                and_(
+                    Message.content_embedding.is_(None),
+                    Message.content.is_not(None),
+                    Message.deleted_at.is_(None)
+                )
+            )
+            .order_by(Message.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        return [(row.id, row.content) for row in result.all()]
+
+    async def count_pending_embedding(self) -> int:
+        result = await self.db.execute(
+            select(func.count(Message.id))
+            .filter(
+                and_(
+                    Message.content_embedding.is_(None),
+                    Message.content.is_not(None),
+                    Message.deleted_at.is_(None)
+                )
+            )
+        )
+        return result.scalar_one()
+
+    async def set_embeddings(self, embeddings: dict[int, list[float]]) -> None:
+        await self.db.execute(
+            update(Message),
+            [{"id": message_id, "content_embedding": embedding} for message_id, embedding in embeddings.items()]
+        )
+        await self.db.commit()
+
+    async def find_similar_in_chat(
+            self,
+            embedding: list[float],
+            group_id: Optional[int] = None,
+            sender_id: Optional[int] = None,
+            exclude_ids: Optional[List[int]] = None,
+            min_similarity: float = 0.5,
+            limit: int = 5
+    ) -> List[tuple[Message, float]]:
+        """Messages of a group (or sent by a user) closest to ``embedding``, with their cosine similarity."""
+        distance = Message.content_embedding.cosine_distance(embedding)
+
+        filters = [Message.deleted_at.is_(None), distance <= 1 - min_similarity]
+        if group_id is not None:
+            filters.append(Message.group_id == group_id)
+        else:
+            filters.append(Message.user_id == sender_id)
+        if exclude_ids:
+            filters.append(Message.id.not_in(exclude_ids))
+
+        result = await self.db.execute(
+            select(Message, distance.label("distance"))
+            .options(joinedload(Message.sender))
+            .filter(and_(*filters))
+            .order_by(distance)
+            .limit(limit)
+        )
+        return [(row.Message, 1 - row.distance) for row in result.unique().all()]
+
     async def find_group_messages_by_sender(
             self,
             group_id: int,
@@ -0,0 +1,49 @@
+from datetime import datetime
+from typing import Optional, List
+
+from sqlalchemy import select, delete
+
+from database.models.content import SummaryChunk
+from database.operations import BaseRepository
+
+
+class SummaryChunkRepository(BaseRepository[SummaryChunk]):
+    async def find_in_range(self, group_id: int, first_message_id: int, last_message_id: int) -> List[SummaryChunk]:
+        """Chunks entirely inside the message id range, ordered by their first message."""
+        result = await self.db.execute(
+            select(SummaryChunk)
+            .filter(
+                SummaryChunk.group_id == group_id,
+                SummaryChunk.first_message_id >= first_message_id,
+                SummaryChunk.last_message_id <= last_message_id
+            )
+            .order_by(SummaryChunk.first_message_id, SummaryChunk.last_message_id.desc())
+        )
+        return list(result.scalars().all())
+
+    async def save_chunk(
+            self,
+            group_id: int,
+            first_message_id: int,
+            last_message_id: int,
+            message_count: int,
+            summary: str
+    ) -> Optional[SummaryChunk]:
+        """None when a concurrent call already saved the same range."""
+        try:
+            return await self.insert(SummaryChunk(
+                group_id=group_id,
+                first_message_id=first_message_id,
+                last_message_id=last_message_id,
+                message_count=message_count,
+                summary=summary
+            ))
+        except ValueError:
+            return None
+
+    async def delete_older_than(self, before: datetime) -> int:
+        result = await self.db.execute(
+            delete(SummaryChunk).where(SummaryChunk.inserted_at < before)
+        )
+        await self.db.commit()
+        return result.rowcount
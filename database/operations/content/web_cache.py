@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import select, update, delete, func
+
+from database.models.content import WebCache
+from database.operations import BaseRepository
+
+
+class WebCacheRepository(BaseRepository[WebCache]):
+    async def find_entry(self, kind: str, fingerprint: str) -> Optional[WebCache]:
+        result = await self.db.execute(
+            select(WebCache).filter(WebCache.kind == kind, WebCache.fingerprint == fingerprint)
+        )
+        return result.scalar_one_or_none()
+
+    async def register_hits(self, entry_id: int, hits: int = 1) -> None:
+        await self.db.execute(
+            update(WebCache)
+            .where(WebCache.id == entry_id)
+            .values(hits=WebCache.hits + hits)
+        )
+        await self.db.commit()
+
+    async def save_entry(
+            self,
+            kind: str,
+            fingerprint: str,
+            key: str,
+            value: str,
+            content_hash: str,
+            ttl_seconds: int,
+    ) -> WebCache:
+        """Creates the entry or refreshes it; the value is only rewritten when its hash changed."""
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)
+        entry = await self.find_entry(kind, fingerprint)
+
+        if entry is None:
+            try:
+                return await self.insert(WebCache(
+                    kind=kind,
+                    fingerprint=fingerprint,
+                    key=key,
+                    value=value,
+                    content_hash=content_hash,
+                    expires_at=expires_at,
+                ))
+            except ValueError:
+                # Saved by a concurrent call in the meantime
+                entry = await self.find_entry(kind, fingerprint)
+
+        data = {"refreshed_at": func.now(), "expires_at": expires_at}
+        if entry.content_hash != content_hash:
+            data.update(value=value, content_hash=content_hash)
+        return await self.update(entry.id, data)
+
+    async def delete_expired(self, before: datetime) -> int:
+        result = await self.db.execute(
+            delete(WebCache).where(WebCache.expires_at <= before)
+        )
+        await self.db.commit()
+        return result.rowcount
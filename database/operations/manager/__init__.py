@@ -2,4 +2,5 @@ from database.operations.manager.agent import AgentRepository
 from database.operations.manager.model import ModelRepository
 from database.operations.manager.command import CommandRepository
 from database.operations.manager.interaction import InteractionRepository
-from database.operations.manager.remember import RememberRepository
\ No newline at end of file
+from database.operations.manager.remember import RememberRepository
+from database.operations.manager.response_cache import ResponseCacheRepository
\ No newline at end of file
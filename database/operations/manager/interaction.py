@@ -54,7 +54,8 @@ class InteractionRepository(BaseRepository[Interaction]):
                 Model.output_price,
                 sql_func.count(Interaction.id).label('interaction_count'),
                 sql_func.sum(Interaction.input_tokens).label('total_input_tokens'),
-                sql_func.sum(Interaction.output_tokens).label('total_output_tokens')
+                sql_func.sum(Interaction.output_tokens).label('total_output_tokens'),
+                sql_func.sum(Interaction.cached_tokens).label('total_cached_tokens')
             )
             .join(User, Interaction.user_id == User.id)
             .join(Model, Interaction.model_id == Model.id)
@@ -83,6 +84,7 @@ class InteractionRepository(BaseRepository[Interaction]):
                     'total_interactions': 0,
                     'total_input_tokens': 0,
                     'total_output_tokens': 0,
+                    'total_cached_tokens': 0,
                     'total_tokens': 0,
                     'estimated_cost': 0.0,
                     'models_used': []
@@ -90,6 +92,7 @@ class InteractionRepository(BaseRepository[Interaction]):
 
             input_tokens = row.total_input_tokens or 0
             output_tokens = row.total_output_tokens or 0
+            cached_tokens = row.total_cached_tokens or 0
             total_tokens = input_tokens + output_tokens
 
             input_price = float(row.input_price or 0)
@@ -106,6 +109,7 @@ class InteractionRepository(BaseRepository[Interaction]):
                 'interaction_count': row.interaction_count,
                 'input_tokens': input_tokens,
                 'output_tokens': output_tokens,
+                'cached_tokens': cached_tokens,
                 'total_tokens': total_tokens,
                 'input_price_per_1m': input_price,
                 'output_price_per_1m': output_price,
@@ -115,6 +119,7 @@ class InteractionRepository(BaseRepository[Interaction]):
             user_data[user_id]['total_interactions'] += row.interaction_count
             user_data[user_id]['total_input_tokens'] += input_tokens
             user_data[user_id]['total_output_tokens'] += output_tokens
+            user_data[user_id]['total_cached_tokens'] += cached_tokens
             user_data[user_id]['total_tokens'] += total_tokens
             user_data[user_id]['estimated_cost'] += model_cost
 
@@ -136,6 +141,19 @@ class InteractionRepository(BaseRepository[Interaction]):
         )
         return list(result.scalars().all())
 
+    async def find_by_agent(self, agent_id: int, start_date: Optional[datetime] = None, limit: int = 20000) -> List[Interaction]:
+        filters = [Interaction.agent_id == agent_id, Interaction.response.isnot(None)]
+        if start_date:
+            filters.append(Interaction.inserted_at >= start_date)
+
+        result = await self.db.execute(
+            select(Interaction)
+            .filter(and_(*filters))
+            .order_by(desc(Interaction.inserted_at))
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
     async def create_interaction(
             self,
             model_id: int,
@@ -147,8 +165,11 @@ class InteractionRepository(BaseRepository[Interaction]):
             response: Optional[str] = None,
             command_id: Optional[int] = None,
             agent_id: Optional[int] = None,
-            system_behavior: Optional[str] = None
-    ,
+            system_behavior: Optional[str] = None,
+            latency_ms: Optional[int] = None,
+            route_policy: Optional[str] = None,
+            attempt: int = 1,
+            cached_tokens: int = 0,
     ) -> Interaction:
         interaction = Interaction(
             model_id=model_id,
@@ -161,9 +182,35 @@ class InteractionRepository(BaseRepository[Interaction]):
             output_tokens=output_tokens,
             command_id=command_id,
             agent_id=agent_id,
+            latency_ms=latency_ms,
+            route_policy=route_policy,
+            attempt=attempt,
+            cached_tokens=cached_tokens,
         )
         return await self.insert(interaction)
 
+    async def get_recent_latencies(self, hours: int = 24, limit_per_model: int = 100) -> List[tuple[int, int]]:
+        """Returns ``(model_id, latency_ms)`` of the latest interactions of each model."""
+        ranked = (
+            select(
+                Interaction.model_id,
+                Interaction.latency_ms,
+                sql_func.row_number().over(
+                    partition_by=Interaction.model_id,
+                    order_by=desc(Interaction.inserted_at)
+                ).label("position")
+            )
+            .filter(Interaction.latency_ms.isnot(None))
+            .filter(Interaction.inserted_at >= datetime.now() - timedelta(hours=hours))
+            .subquery()
+        )
+
+        result = await self.db.execute(
+            select(ranked.c.model_id, ranked.c.latency_ms)
+            .filter(ranked.c.position <= limit_per_model)
+        )
+        return [(row.model_id, row.latency_ms) for row in result.all()]
+
     async def get_total_tokens_by_user(
             self,
             user_id: int,
@@ -36,6 +36,12 @@ class ModelRepository(BaseRepository[Model]):
         )
         return result.scalar_one_or_none()
 
+    async def get_routable_models(self) -> List[Model]:
+        result = await self.db.execute(
+            select(Model).filter((Model.routable == True) | (Model.text_default == True))
+        )
+        return list(result.scalars().all())
+
     async def set_as_default(self, model_id: int) -> Optional[Model]:
         all_models = await self.find_all()
         for model in all_models:
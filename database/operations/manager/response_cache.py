@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import select, update, delete, func
+
+from database.models.manager import ResponseCache
+from database.operations import BaseRepository
+
+
+class ResponseCacheRepository(BaseRepository[ResponseCache]):
+    async def find_similar(
+            self,
+            agent_id: int,
+            fingerprint: str,
+            embedding: list[float],
+            threshold: float
+    ) -> Optional[tuple[ResponseCache, float]]:
+        """Nearest live entry with the same fingerprint, if its cosine similarity reaches ``threshold``."""
+        distance = ResponseCache.prompt_embedding.cosine_distance(embedding)
+
+        result = await self.db.execute(
+            select(ResponseCache, distance.label("distance"))
+            .filter(
+                ResponseCache.agent_id == agent_id,
+                ResponseCache.fingerprint == fingerprint,
+                ResponseCache.expires_at > func.now(),
+                distance <= 1 - threshold
+            )
+            .order_by(distance)
+            .limit(1)
+        )
+
+        row = result.first()
+        if row is None:
+            return None
+        return row.ResponseCache, 1 - row.distance
+
+    async def register_hit(self, cache_id: int) -> None:
+        await self.db.execute(
+            update(ResponseCache)
+            .where(ResponseCache.id == cache_id)
+            .values(hits=ResponseCache.hits + 1)
+        )
+        await self.db.commit()
+
+    async def create_entry(
+            self,
+            agent_id: int,
+            model_id: int,
+            fingerprint: str,
+            prompt: str,
+            embedding: list[float],
+            response: str,
+            ttl_seconds: int,
+            input_tokens: int = 0,
+            output_tokens: int = 0,
+            latency_ms: Optional[int] = None,
+    ) -> ResponseCache:
+        entry = ResponseCache(
+            agent_id=agent_id,
+            model_id=model_id,
+            fingerprint=fingerprint,
+            prompt=prompt,
+            prompt_embedding=embedding,
+            response=response,
+            input_tokens=input_tokens or 0,
+            output_tokens=output_tokens or 0,
+            latency_ms=latency_ms,
+            expires_at=datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds),
+        )
+        return await self.insert(entry)
+
+    async def delete_expired(self) -> int:
+        result = await self.db.execute(
+            delete(ResponseCache).where(ResponseCache.expires_at <= func.now())
+        )
+        await self.db.commit()
+        return result.rowcount
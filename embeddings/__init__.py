@@ -1 +1,2 @@
-from embeddings.generate_embeddings import generate_text_embeddings
\ No newline at end of file
+from embeddings.generate_embeddings import generate_text_embeddings
+from embeddings.local import encode, encode_batch, LOCAL_EMBEDDING_DIM
\ No newline at end of file
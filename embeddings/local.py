@@ -0,0 +1,33 @@
+"""
+Local sentence embeddings.
+
+Used where a round trip to the embeddings API would cost more than the work it
+saves (cache lookups, classification). The model is small, multilingual and runs
+on CPU; it is loaded once per process on first use.
+"""
+import asyncio
+from functools import lru_cache
+
+from sentence_transformers import SentenceTransformer
+
+from utils import get_env_var
+
+
+LOCAL_EMBEDDING_MODEL = get_env_var("LOCAL_EMBEDDING_MODEL") or "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+LOCAL_EMBEDDING_DIM = 384
+
+
+@lru_cache(maxsize=1)
+def load_encoder() -> SentenceTransformer:
+    return SentenceTransformer(LOCAL_EMBEDDING_MODEL, device="cpu")
+
+
+def encode_batch(texts: list[str]) -> list[list[float]]:
+    """Normalized embeddings, so the dot product is the cosine similarity. Blocking."""
+    vectors = load_encoder().encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+    return vectors.tolist()
+
+
+async def encode(text: str) -> list[float]:
+    vectors = await asyncio.to_thread(encode_batch, [text])
+    return vectors[0]
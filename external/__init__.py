@@ -1,3 +1,3 @@
 from external.evolution import get_group_info, evolution_instance_key
-from external.openrouter import completions, embeddings
-from external.firecrawl import get_url_content
\ No newline at end of file
+from external.openrouter import completions, embeddings, stream_completions, chat_payload, cached_tokens
+from external.scraper import get_url_content
\ No newline at end of file
@@ -0,0 +1,126 @@
+"""
+Brave Search API client.
+
+Requests go through the pooled ``brave`` client and the resilience policies. Brave
+reports its quota in every response (``X-RateLimit-Limit``, ``-Remaining`` and
+``-Reset``, one comma-separated value per window: per second first, then per month);
+the per-second window feeds a local token bucket, so a burst of searches waits for
+its turn instead of getting 429s. The remaining quota is published as
+``brave_quota_remaining{window}``.
+"""
+import asyncio
+import time
+from typing import Optional
+
+from external.http import get_client
+from external.resilience import call, get_upstream
+from utils import get_env_var
+from utils.metrics import metrics
+
+
+BRAVE_ENDPOINT = "https://api.search.brave.com/res/v1"
+UPSTREAM = "brave"
+WINDOWS = ("second", "month")
+
+RATE_LIMIT = float(get_env_var("BRAVE_RATE_LIMIT_PER_SECOND") or 1)
+RESULT_TYPES = "web,videos"
+RESULT_COUNT = 8
+
+
+def _parse_header(value: Optional[str]) -> list[int]:
+    if not value:
+        return []
+    try:
+        return [int(part.strip()) for part in value.split(",")]
+    except ValueError:
+        return []
+
+
+class TokenBucket:
+    """Requests per second allowed by the plan; ``acquire`` waits for a free slot."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self) -> None:
+        # One waiter at a time, so the queue is served in order
+        async with self._lock:
+            while True:
+                self._refill()
+                wait = max(self._blocked_until - time.monotonic(), 0.0)
+                if not wait and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = wait or (1 - self.tokens) / self.rate
+                metrics.incr("brave_throttled")
+                await asyncio.sleep(wait)
+
+    def update(self, limit: Optional[int], remaining: Optional[int], reset: Optional[int]) -> None:
+        """Adjusts the bucket to what Brave reported for the per-second window."""
+        if limit:
+            self.rate = float(limit)
+            self.capacity = max(self.rate, 1.0)
+        if remaining is not None:
+            self._refill()
+            self.tokens = min(self.tokens, float(remaining))
+            if remaining == 0 and reset:
+                self._blocked_until = time.monotonic() + reset
+
+
+class BraveClient:
+    def __init__(self, rate: float = RATE_LIMIT):
+        self.bucket = TokenBucket(rate)
+
+    def _headers(self) -> dict:
+        return {
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip",
+            "x-subscription-token": get_env_var("BRAVE_KEY"),
+        }
+
+    def _record_quota(self, headers) -> None:
+        limits = _parse_header(headers.get("x-ratelimit-limit"))
+        remaining = _parse_header(headers.get("x-ratelimit-remaining"))
+        resets = _parse_header(headers.get("x-ratelimit-reset"))
+
+        for window, value in zip(WINDOWS, remaining):
+            metrics.set_gauge("brave_quota_remaining", value, window=window)
+        for window, value in zip(WINDOWS, limits):
+            metrics.set_gauge("brave_quota_limit", value, window=window)
+
+        self.bucket.update(
+            limits[0] if limits else None,
+            remaining[0] if remaining else None,
+            resets[0] if resets else None,
+        )
+
+    async def search(self, query: str, result_types: str = RESULT_TYPES, count: int = RESULT_COUNT) -> dict:
+        """
+        Web search restricted to ``result_types`` (Brave ``result_filter``), so the
+        response does not carry news, discussions, FAQ... that are never read.
+        """
+        client = get_client(UPSTREAM)
+        timeout = get_upstream(UPSTREAM).policy.http_timeout()
+        params = {"q": query, "count": count, "result_filter": result_types, "text_decorations": "false"}
+
+        async def request() -> dict:
+            await self.bucket.acquire()
+            response = await client.get(f"{BRAVE_ENDPOINT}/web/search", params=params, headers=self._headers(), timeout=timeout)
+            self._record_quota(response.headers)
+            response.raise_for_status()
+            return response.json()
+
+        return await call(UPSTREAM, "search", request)
+
+
+brave_client = BraveClient()
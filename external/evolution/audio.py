@@ -1,6 +1,4 @@
-import httpx
-
-from external.evolution.base import evolution_api, evolution_api_key, evolution_instance_name
+from external.evolution.base import evolution_api, evolution_instance_name, evolution_request
 
 
 async def send_audio(contact_id: str, audio_base64: str, message_id: str):
@@ -14,11 +12,4 @@ async def send_audio(contact_id: str, audio_base64: str, message_id: str):
         }
     }
 
-    headers = {
-        "Content-Type": "application/json",
-        "apikey": evolution_api_key
-    }
-
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=payload, headers=headers, timeout=60)
-        return response.json()
\ No newline at end of file
+    return await evolution_request("send_audio", "POST", url, idempotent=False, payload=payload, timeout=60)
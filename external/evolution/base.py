@@ -1,6 +1,42 @@
+from typing import Optional
+
+import httpx
+
+from external.http import get_client
+from external.resilience import call, get_upstream
 from utils import get_env_var
 
 evolution_api = get_env_var("EVOLUTION_API")
 evolution_api_key = get_env_var("EVOLUTION_API_KEY")
 evolution_instance_name = get_env_var("EVOLUTION_INSTANCE_NAME")
-evolution_instance_key = get_env_var("EVOLUTION_INSTANCE_KEY")
\ No newline at end of file
+evolution_instance_key = get_env_var("EVOLUTION_INSTANCE_KEY")
+
+UPSTREAM = "evolution"
+
+
+async def evolution_request(
+        operation: str, method: str, url: str,
+        idempotent: bool, payload: Optional[dict] = None, timeout: Optional[float] = None
+) -> dict:
+    """
+    Sends a request to the Evolution API through the pooled client and the upstream
+    retry/circuit breaker policies.
+
+    Sends (messages, media) must pass ``idempotent=False``: they are only repeated when
+    the request never reached the server, otherwise the contact could get it twice.
+    """
+    headers = {
+        "Content-Type": "application/json",
+        "apikey": evolution_api_key,
+    }
+
+    client = get_client(UPSTREAM)
+    policy = get_upstream(UPSTREAM).policy
+    request_timeout = httpx.Timeout(timeout, connect=policy.connect_timeout) if timeout else policy.http_timeout()
+
+    async def request() -> dict:
+        response = await client.request(method, url, json=payload, headers=headers, timeout=request_timeout)
+        response.raise_for_status()
+        return response.json()
+
+    return await call(UPSTREAM, operation, request, idempotent=idempotent)
@@ -8,13 +8,12 @@ from __future__ import annotations
 
 from typing import Optional
 
-import httpx
 from log import logger
 
 from external.evolution.base import (
     evolution_instance_name,
-    evolution_api_key,
     evolution_api,
+    evolution_request,
 )
 
 
@@ -26,7 +25,7 @@ MIMETYPE_JPEG = "image/jpeg"
 MIMETYPE_MP4 = "video/mp4"
 
 
-def extract_quoted_image_bytes(webhook_data: dict) -> Optional[bytes]:
+async def extract_quoted_image_bytes(webhook_data: dict) -> Optional[bytes]:
     """
     Extrai bytes da imagem de uma mensagem quotada do webhook.
 
@@ -38,7 +37,7 @@ def extract_quoted_image_bytes(webhook_data: dict) -> Optional[bytes]:
 
     Examples:
         >>> data = {'data': {'contextInfo': {'quotedMessage': {'imageMessage': {'jpegThumbnail': {...}}}}}}
-        >>> img_bytes = extract_quoted_image_bytes(data)
+        >>> img_bytes = await extract_quoted_image_bytes(data)
     """
     try:
         context_info = webhook_data["data"]["contextInfo"]
@@ -58,12 +57,12 @@ def extract_quoted_image_bytes(webhook_data: dict) -> Optional[bytes]:
         return bytes(byte_array)
 
     except (KeyError, TypeError) as e:
-        await logger.warning("EvolutionImage", "Erro ao extrair imagem quotada", str(e))
+        await logger.warn("EvolutionImage", "Erro ao extrair imagem quotada", str(e))
         return None
 
 
 async def _send_media_request(
-    url: str, payload: dict, timeout: float = DEFAULT_TIMEOUT
+    url: str, payload: dict, operation: str, timeout: float = DEFAULT_TIMEOUT
 ) -> dict:
     """
     Envia uma requisição genérica de mídia para a Evolution API.
@@ -71,6 +70,7 @@ async def _send_media_request(
     Args:
         url: URL completa da API
         payload: Payload da requisição
+        operation: Nome da operação nas métricas do upstream
         timeout: Timeout da requisição em segundos
 
     Returns:
@@ -78,16 +78,9 @@ async def _send_media_request(
 
     Raises:
         httpx.HTTPStatusError: Se a requisição falhar com status HTTP diferente de 2xx
+        CircuitOpenError: Se o circuito da Evolution API estiver aberto
     """
-    headers = {
-        "Content-Type": "application/json",
-        "apikey": evolution_api_key,
-    }
-
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        response = await client.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        return response.json()
+    return await evolution_request(operation, "POST", url, idempotent=False, payload=payload, timeout=timeout)
 
 
 async def send_sticker(contact_id: str, image_base64: str) -> dict:
@@ -113,7 +106,7 @@ async def send_sticker(contact_id: str, image_base64: str) -> dict:
     payload = {"number": contact_id, "sticker": image_base64}
 
     try:
-        return await _send_media_request(url, payload)
+        return await _send_media_request(url, payload, "send_sticker")
     except Exception as e:
         await logger.error("EvolutionSticker", "Erro ao enviar sticker", str(e))
         raise
@@ -141,7 +134,7 @@ async def send_animated_sticker(contact_id: str, sticker_url: str) -> dict:
     payload = {"number": contact_id, "sticker": sticker_url}
 
     try:
-        return await _send_media_request(url, payload)
+        return await _send_media_request(url, payload, "send_sticker")
     except Exception as e:
         await logger.error(
             "EvolutionSticker", "Erro ao enviar sticker animado", str(e)
@@ -160,7 +153,7 @@ async def send_image(
 
     Args:
         contact_id: ID do contato (número com sufixo @s.whatsapp.net ou ID do grupo)
-        image_base64: Imagem em formato base64
+        image_base64: Imagem em formato base64 ou URL pública (a Evolution baixa a URL)
         filename: Nome do arquivo (padrão: "gork.jpeg")
         caption: Legenda da imagem (vazia por padrão)
 
@@ -189,7 +182,7 @@ async def send_image(
     }
 
     try:
-        return await _send_media_request(url, payload)
+        return await _send_media_request(url, payload, "send_image")
     except Exception as e:
         await logger.error("EvolutionImage", "Erro ao enviar imagem", str(e))
         raise
@@ -207,7 +200,7 @@ async def send_video(
 
     Args:
         contact_id: ID do contato (número com sufixo @s.whatsapp.net ou ID do grupo)
-        video_base64: Vídeo em formato base64
+        video_base64: Vídeo em formato base64 ou URL pública (a Evolution baixa a URL)
         quoted_message_id: ID da mensagem para resposta (opcional)
         filename: Nome do arquivo (padrão: "gork.mp4")
         caption: Legenda do vídeo (vazia por padrão)
@@ -242,7 +235,7 @@ async def send_video(
         payload["quoted"] = {"key": {"id": quoted_message_id}}
 
     try:
-        return await _send_media_request(url, payload)
+        return await _send_media_request(url, payload, "send_video")
     except Exception as e:
         await logger.error("EvolutionVideo", "Erro ao enviar vídeo", str(e))
         raise
@@ -269,16 +262,8 @@ async def get_profile_info(number: str) -> dict:
 
     payload = {"number": number}
 
-    headers = {
-        "Content-Type": "application/json",
-        "apikey": evolution_api_key,
-    }
-
     try:
-        async with httpx.AsyncClient(timeout=DEFAULT_TIMEOUT) as client:
-            response = await client.post(url, json=payload, headers=headers)
-            response.raise_for_status()
-            return response.json()
+        return await evolution_request("profile_info", "POST", url, idempotent=True, payload=payload)
     except Exception as e:
         await logger.error("EvolutionProfile", "Erro ao obter perfil", str(e))
         raise
@@ -1,10 +1,10 @@
 import base64
 
-import httpx
-
-from external.evolution.base import evolution_instance_name, evolution_api_key, evolution_api
+from external.evolution.base import evolution_instance_name, evolution_api, evolution_request
+from utils.singleflight import singleflight
 
 
+@singleflight("download_media", key=lambda message_id, convert_to_mp4=False: f"{message_id}:{convert_to_mp4}")
 async def download_media(message_id: str, convert_to_mp4: bool = False) -> tuple[bytes, str]:
     media_url = f"{evolution_api}/chat/getBase64FromMediaMessage/{evolution_instance_name}"
 
@@ -17,19 +17,10 @@ async def download_media(message_id: str, convert_to_mp4: bool = False) -> tuple
         "convertToMp4": convert_to_mp4
     }
 
-    headers = {
-        "Content-Type": "application/json",
-        "apikey": evolution_api_key
-    }
-
-    async with httpx.AsyncClient() as client:
-        response = await client.post(media_url, json=payload, headers=headers, timeout=60)
-        response.raise_for_status()
+    result = await evolution_request("download_media", "POST", media_url, idempotent=True, payload=payload, timeout=60)
 
-        result = response.json()
-
-        if 'base64' in result:
-            return result["base64"], result["fileName"]
+    if 'base64' in result:
+        return result["base64"], result["fileName"]
 
 
 async def send_media(contact_id: str, file_path: str):
@@ -45,11 +36,4 @@ async def send_media(contact_id: str, file_path: str):
         "mediatype": "document"
     }
 
-    headers = {
-        "Content-Type": "application/json",
-        "apikey": evolution_api_key
-    }
-
-    async with httpx.AsyncClient() as client:
-        response = await client.post(media_url, json=payload, headers=headers, timeout=30)
-        response.raise_for_status()
\ No newline at end of file
+    await evolution_request("send_media", "POST", media_url, idempotent=False, payload=payload)
\ No newline at end of file
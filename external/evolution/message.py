@@ -1,6 +1,4 @@
-import httpx
-
-from external.evolution.base import evolution_api, evolution_api_key, evolution_instance_name
+from external.evolution.base import evolution_api, evolution_instance_name, evolution_request
 
 
 async def send_message(contact_id: str, message: str, message_id: str = None):
@@ -14,11 +12,4 @@ async def send_message(contact_id: str, message: str, message_id: str = None):
     if message_id:
         payload.update({"quoted": {"key": {"id": message_id}}})
 
-    headers = {
-        "Content-Type": "application/json",
-        "apikey": evolution_api_key
-    }
-
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=payload, headers=headers, timeout=60)
-        return response.json()
\ No newline at end of file
+    return await evolution_request("send_message", "POST", url, idempotent=False, payload=payload)
@@ -0,0 +1,46 @@
+"""
+Text extraction from scraped HTML.
+
+``trafilatura.extract`` is CPU bound and holds the GIL, so running it in a thread
+still stalls the event loop of the worker. It runs in a small process pool instead,
+created lazily and shut down with the application.
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import trafilatura
+
+from utils import get_env_var
+
+
+WORKERS = int(get_env_var("EXTRACT_WORKERS") or 2)
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _extract(html: str) -> str:
+    return trafilatura.extract(html) or ""
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # forkserver: the children do not inherit the threads and sockets of the server
+        _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("forkserver"))
+    return _pool
+
+
+async def extract_text(html: Optional[str]) -> str:
+    """Main text of the page, empty if nothing could be extracted."""
+    if not html:
+        return ""
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), _extract, html)
+
+
+def close_extractor() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
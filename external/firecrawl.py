@@ -1,15 +1,31 @@
+import asyncio
+from typing import Optional
+
 from firecrawl import Firecrawl
 from firecrawl.v2.utils.error_handler import WebsiteNotSupportedError
-import trafilatura
 
 from utils import get_env_var
 
 
-def get_url_content(url: str) -> str:
+_client: Optional[Firecrawl] = None
+
+
+def _get_client() -> Firecrawl:
+    global _client
+    if _client is None:
+        _client = Firecrawl(api_key=get_env_var("FIRECRAWL_KEY"))
+    return _client
+
+
+def _scrape(url: str) -> str:
     try:
-        firecrawl = Firecrawl(api_key=get_env_var("FIRECRAWL_KEY"))
-        content = firecrawl.scrape(url, formats=["html"])
-        extracted_text = trafilatura.extract(content.html)
-        return extracted_text
+        content = _get_client().scrape(url, formats=["html"])
+        return content.html or ""
     except WebsiteNotSupportedError:
-        return ""
\ No newline at end of file
+        return ""
+
+
+async def scrape_html(url: str) -> str:
+    """Page HTML rendered by Firecrawl, for sites that need JavaScript or block plain requests."""
+    # Firecrawl's client is blocking, keep it off the event loop
+    return await asyncio.to_thread(_scrape, url)
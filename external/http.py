@@ -0,0 +1,28 @@
+"""
+Shared HTTP clients for the external upstreams.
+
+Opening an ``httpx.AsyncClient`` per call pays a new TCP/TLS handshake every time.
+Each upstream gets one pooled client per process instead, created lazily and closed
+on application shutdown.
+"""
+import httpx
+
+
+DEFAULT_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=10, keepalive_expiry=30)
+
+_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def get_client(upstream: str) -> httpx.AsyncClient:
+    """Returns the pooled client of ``upstream``. Timeouts are given per request."""
+    client = _clients.get(upstream)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(limits=DEFAULT_LIMITS)
+        _clients[upstream] = client
+    return client
+
+
+async def close_clients() -> None:
+    for client in _clients.values():
+        await client.aclose()
+    _clients.clear()
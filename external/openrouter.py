@@ -1,44 +1,94 @@
+import json
 from datetime import datetime
+from typing import AsyncIterator, Optional
 
 import httpx
 
+from external.http import get_client
+from external.resilience import call, get_upstream
 from log import openrouter_logger
 from utils import get_env_var
+from utils.singleflight import singleflight
 
 
 OPENROUTER_ENDPOINT = "https://openrouter.ai/api/v1"
+UPSTREAM = "openrouter"
 
-async def completions(payload: dict) -> dict:
-    start = datetime.now()
-    headers = {
+
+def _headers() -> dict:
+    return {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {get_env_var('OPENROUTER_KEY')}",
     }
 
-    with httpx.Client(timeout=120) as client:
-        duration = datetime.now() - start
-        try:
-            response = client.post(f"{OPENROUTER_ENDPOINT}/chat/completions", json=payload, headers=headers)
-            response.raise_for_status()
-            minutes = duration.total_seconds() / 60
-            await openrouter_logger.info("OpenRouter", "Conversation", f"Model: {payload.get('model')} - Time took: {minutes:.2f}. Payload: {payload}")
-            return response.json()
-        except Exception as error:
-            minutes = duration.total_seconds() / 60
-            await openrouter_logger.info(
-                "OpenRouter",
-                "Conversation",
-                f"Model: {payload.get('model')} - Time took: {minutes:.2f}. Payload: {payload}. Error: {error}"
-            )
-            raise error
+
+# Providers that only cache prompts marked with cache_control; the others (OpenAI,
+# DeepSeek, Grok...) cache repeated prefixes automatically
+CACHE_CONTROL_PREFIXES = ("anthropic/", "google/gemini")
+
+
+def chat_payload(model: str, messages: list[dict], response_format: Optional[dict] = None) -> dict:
+    """
+    Chat completion payload. Messages should come static first (agent prompt) and
+    dynamic last, so the prefix is the same between calls; the first system message
+    is marked as a cache breakpoint for the providers that need it.
+
+    ``response_format`` is only sent when given, callers check the model supports it.
+    """
+    if model.startswith(CACHE_CONTROL_PREFIXES) and messages and messages[0]["role"] == "system":
+        system = messages[0]
+        messages = [
+            {
+                "role": "system",
+                "content": [{"type": "text", "text": system["content"], "cache_control": {"type": "ephemeral"}}],
+            },
+            *messages[1:]
+        ]
+
+    payload = {"model": model, "messages": messages, "usage": {"include": True}}
+    if response_format is not None:
+        payload["response_format"] = response_format
+    return payload
+
+
+def cached_tokens(usage: dict) -> int:
+    """Prompt tokens read from the provider cache, 0 when not reported."""
+    return (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+
+
+@singleflight("completions")
+async def completions(payload: dict) -> dict:
+    start = datetime.now()
+    headers = _headers()
+    client = get_client(UPSTREAM)
+    timeout = get_upstream(UPSTREAM).policy.http_timeout()
+
+    async def request() -> dict:
+        response = await client.post(f"{OPENROUTER_ENDPOINT}/chat/completions", json=payload, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    try:
+        # Completions have no side effects, so they are retried and hedged like idempotent calls
+        result = await call(UPSTREAM, "completions", request, hedge=True, latency_key=payload.get("model"))
+        minutes = (datetime.now() - start).total_seconds() / 60
+        await openrouter_logger.info("OpenRouter", "Conversation", f"Model: {payload.get('model')} - Time took: {minutes:.2f}. Payload: {payload}")
+        return result
+    except Exception as error:
+        minutes = (datetime.now() - start).total_seconds() / 60
+        await openrouter_logger.info(
+            "OpenRouter",
+            "Conversation",
+            f"Model: {payload.get('model')} - Time took: {minutes:.2f}. Payload: {payload}. Error: {error}"
+        )
+        raise error
 
 
 async def embeddings(text: str, model: str) -> dict:
     start = datetime.now()
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {get_env_var('OPENROUTER_KEY')}",
-    }
+    headers = _headers()
+    client = get_client(UPSTREAM)
+    timeout = get_upstream(UPSTREAM).policy.http_timeout()
 
     payload = {
       "model": model,
@@ -46,20 +96,73 @@ async def embeddings(text: str, model: str) -> dict:
       "encodingFormat": "float"
     }
 
-    with httpx.Client(timeout=120) as client:
-        try:
-            response = client.post(f"{OPENROUTER_ENDPOINT}/embeddings", json=payload, headers=headers)
+    async def request() -> dict:
+        response = await client.post(f"{OPENROUTER_ENDPOINT}/embeddings", json=payload, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    try:
+        result = await call(UPSTREAM, "embeddings", request, latency_key=f"embeddings:{model}")
+        duration = datetime.now() - start
+        minutes = duration.total_seconds() / 60
+        await openrouter_logger.info("OpenRouter", "Embedding", f"Model: {payload.get('model')} - Time took: {minutes:.2f}")
+        return result
+    except Exception as error:
+        duration = datetime.now() - start
+        minutes = duration.total_seconds() / 60
+        await openrouter_logger.info(
+            "OpenRouter",
+            "Conversation",
+            f"Model: {payload.get('model')} - Time took: {minutes:.2f}. Payload: {payload}. Error: {error}"
+        )
+        raise error
+
+async def stream_completions(payload: dict) -> AsyncIterator[dict]:
+    """Streams a chat completion, yielding each parsed SSE chunk as it arrives.
+
+    The last chunk carries the ``usage`` block, so callers can still account tokens.
+    Opening the stream goes through the retry and circuit breaker policies; once the
+    first chunk is yielded the stream is not retried.
+    """
+    start = datetime.now()
+    headers = _headers()
+    client = get_client(UPSTREAM)
+    timeout = get_upstream(UPSTREAM).policy.http_timeout()
+
+    stream_payload = {**payload, "stream": True, "usage": {"include": True}}
+
+    async def open_stream() -> httpx.Response:
+        request = client.build_request(
+            "POST", f"{OPENROUTER_ENDPOINT}/chat/completions",
+            json=stream_payload, headers=headers, timeout=timeout
+        )
+        response = await client.send(request, stream=True)
+        if response.is_error:
+            await response.aclose()
             response.raise_for_status()
-            duration = datetime.now() - start
-            minutes = duration.total_seconds() / 60
-            await openrouter_logger.info("OpenRouter", "Embedding", f"Model: {payload.get('model')} - Time took: {minutes:.2f}")
-            return response.json()
-        except Exception as error:
-            duration = datetime.now() - start
-            minutes = duration.total_seconds() / 60
-            await openrouter_logger.info(
-                "OpenRouter",
-                "Conversation",
-                f"Model: {payload.get('model')} - Time took: {minutes:.2f}. Payload: {payload}. Error: {error}"
-            )
-            raise error
\ No newline at end of file
+        return response
+
+    try:
+        response = await call(UPSTREAM, "stream", open_stream, latency_key=f"stream:{payload.get('model')}")
+        try:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                yield json.loads(data)
+        finally:
+            await response.aclose()
+
+        minutes = (datetime.now() - start).total_seconds() / 60
+        await openrouter_logger.info("OpenRouter", "Stream", f"Model: {payload.get('model')} - Time took: {minutes:.2f}. Payload: {payload}")
+    except Exception as error:
+        minutes = (datetime.now() - start).total_seconds() / 60
+        await openrouter_logger.info(
+            "OpenRouter",
+            "Stream",
+            f"Model: {payload.get('model')} - Time took: {minutes:.2f}. Payload: {payload}. Error: {error}"
+        )
+        raise error
@@ -0,0 +1,282 @@
+"""
+Resilience layer for the calls made to external upstreams (OpenRouter, Evolution).
+
+- Retry with jittered exponential backoff. Only idempotent calls retry on every
+  transient error; the others only retry when the request never reached the server.
+- Hedging: when the first request is slower than the rolling p95 of the operation, a
+  second one is fired and the first answer wins. Used for completions, where a single
+  slow provider can hold a handler for minutes.
+- Circuit breaker per upstream: after N consecutive failures calls fail fast with
+  ``CircuitOpenError`` until a probe succeeds.
+
+Policies can be overridden per upstream by env vars named
+``RESILIENCE_<UPSTREAM>_<FIELD>``, e.g. ``RESILIENCE_OPENROUTER_TIMEOUT=60``.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, fields, replace
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import httpx
+
+from log import logger
+from utils import get_env_var
+from utils.metrics import metrics
+
+
+T = TypeVar("T")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+
+
+@dataclass(frozen=True)
+class UpstreamPolicy:
+    attempts: int = 3
+    base_delay: float = 0.5          # Backoff base, in seconds
+    max_delay: float = 8.0
+    timeout: float = 30.0            # Read timeout of a single attempt
+    connect_timeout: float = 5.0
+    failure_threshold: int = 5       # Consecutive failures that open the circuit
+    reset_timeout: float = 30.0      # Seconds open before a probe is allowed
+    hedge_delay: float = 10.0        # Used until there are enough samples for a p95
+    hedge_min_delay: float = 2.0
+
+    def http_timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.timeout, connect=self.connect_timeout)
+
+
+DEFAULT_POLICIES = {
+    "openrouter": UpstreamPolicy(attempts=3, timeout=120.0, reset_timeout=30.0),
+    "evolution": UpstreamPolicy(attempts=3, base_delay=0.3, max_delay=4.0, timeout=30.0, connect_timeout=3.0, reset_timeout=15.0),
+    "brave": UpstreamPolicy(attempts=3, base_delay=1.0, timeout=15.0, reset_timeout=60.0),
+}
+
+
+def _load_policy(upstream: str) -> UpstreamPolicy:
+    policy = DEFAULT_POLICIES.get(upstream, UpstreamPolicy())
+    overrides = {}
+    for field in fields(UpstreamPolicy):
+        value = get_env_var(f"RESILIENCE_{upstream.upper()}_{field.name.upper()}")
+        if value:
+            overrides[field.name] = int(value) if field.type is int else float(value)
+    return replace(policy, **overrides)
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, upstream: str, retry_in: float):
+        super().__init__(f"Circuit open for {upstream}, retry in {retry_in:.0f}s")
+        self.upstream = upstream
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(self, upstream: str, failure_threshold: int, reset_timeout: float):
+        self.upstream = upstream
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._publish()
+
+    def before_call(self) -> None:
+        if self.state == CLOSED:
+            return
+
+        elapsed = time.monotonic() - self.opened_at
+        if self.state == OPEN and elapsed >= self.reset_timeout:
+            self._set_state(HALF_OPEN)
+
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return
+
+        metrics.incr("circuit_rejected", upstream=self.upstream)
+        raise CircuitOpenError(self.upstream, max(0.0, self.reset_timeout - elapsed))
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probing = False
+        if self.state != CLOSED:
+            self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            if self.state != OPEN:
+                metrics.incr("circuit_opened", upstream=self.upstream)
+            self._set_state(OPEN)
+
+    def release(self) -> None:
+        """Frees the half-open probe slot when the call ended without a verdict (e.g. cancelled)."""
+        self._probing = False
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        self._publish()
+
+    def _publish(self) -> None:
+        metrics.set_gauge("circuit_state", STATE_VALUES[self.state], upstream=self.upstream)
+
+
+class LatencyTracker:
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        if len(self._samples) < MIN_LATENCY_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+class Upstream:
+    def __init__(self, name: str):
+        self.name = name
+        self.policy = _load_policy(name)
+        self.breaker = CircuitBreaker(name, self.policy.failure_threshold, self.policy.reset_timeout)
+        self._latencies: dict[str, LatencyTracker] = {}
+
+    def latency(self, key: str) -> LatencyTracker:
+        if key not in self._latencies:
+            self._latencies[key] = LatencyTracker()
+        return self._latencies[key]
+
+    def hedge_delay(self, key: str) -> float:
+        p95 = self.latency(key).p95()
+        if p95 is None:
+            return self.policy.hedge_delay
+        return max(self.policy.hedge_min_delay, p95)
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """Full jitter backoff; honours Retry-After on 429/503 when the upstream sends it."""
+        if isinstance(error, httpx.HTTPStatusError):
+            retry_after = error.response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return min(float(retry_after), self.policy.max_delay)
+        return random.uniform(0, min(self.policy.max_delay, self.policy.base_delay * 2 ** attempt))
+
+
+_upstreams: dict[str, Upstream] = {}
+
+
+def get_upstream(name: str) -> Upstream:
+    if name not in _upstreams:
+        _upstreams[name] = Upstream(name)
+    return _upstreams[name]
+
+
+def is_transient(error: BaseException) -> bool:
+    """Errors worth retrying and that say something about the upstream health."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+def is_not_sent(error: BaseException) -> bool:
+    """The request never reached the server, so even a non idempotent call can be repeated."""
+    return isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+
+
+async def _hedged(upstream: Upstream, operation: str, latency_key: str, func: Callable[[], Awaitable[T]]) -> T:
+    primary = asyncio.create_task(func())
+    pending = {primary}
+
+    # From here on, whatever is still running is cancelled when this returns, raises or
+    # is cancelled (e.g. by the ``wait_for`` of the caller)
+    try:
+        done, _ = await asyncio.wait(pending, timeout=upstream.hedge_delay(latency_key))
+        if done:
+            return primary.result()
+
+        metrics.incr("hedge_launched", upstream=upstream.name, operation=operation)
+        hedge = asyncio.create_task(func())
+        names = {primary: "primary", hedge: "hedge"}
+        pending = {primary, hedge}
+
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    metrics.incr("hedge_wins", upstream=upstream.name, operation=operation, winner=names[task])
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def call(
+        upstream_name: str,
+        operation: str,
+        func: Callable[[], Awaitable[T]],
+        idempotent: bool = True,
+        hedge: bool = False,
+        latency_key: Optional[str] = None,
+) -> T:
+    """
+    Runs ``func`` under the retry, hedging and circuit breaker policies of the upstream.
+
+    Args:
+        upstream_name: Upstream key, e.g. "openrouter" or "evolution"
+        operation: Operation name, used in metrics and logs
+        func: Zero-argument coroutine factory doing a single request. It must raise on
+            failure (``response.raise_for_status()``) so the error can be classified
+        idempotent: Whether the call can be repeated after it may have reached the server
+        hedge: Fires a second request when the first is slower than the rolling p95
+        latency_key: Groups latency samples for the p95, defaults to ``operation``.
+            Completions use the model, since latency depends mostly on it
+
+    Raises:
+        CircuitOpenError: If the upstream circuit is open
+    """
+    upstream = get_upstream(upstream_name)
+    latency_key = latency_key or operation
+
+    for attempt in range(upstream.policy.attempts):
+        upstream.breaker.before_call()
+        start = time.monotonic()
+        try:
+            result = await (_hedged(upstream, operation, latency_key, func) if hedge else func())
+        except asyncio.CancelledError:
+            upstream.breaker.release()
+            raise
+        except Exception as error:
+            transient = is_transient(error)
+            if transient:
+                upstream.breaker.record_failure()
+            else:
+                upstream.breaker.release()
+
+            retryable = transient if idempotent else is_not_sent(error)
+            last_attempt = attempt == upstream.policy.attempts - 1
+            if not retryable or last_attempt:
+                metrics.incr("upstream_calls", upstream=upstream.name, operation=operation, outcome="error")
+                raise
+
+            delay = upstream.backoff(attempt, error)
+            metrics.incr("upstream_retries", upstream=upstream.name, operation=operation)
+            await logger.warn("Resilience", f"{upstream.name} {operation}", f"Attempt {attempt + 1} failed ({error!r}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        elapsed = time.monotonic() - start
+        upstream.breaker.record_success()
+        upstream.latency(latency_key).observe(elapsed)
+        metrics.observe("upstream_latency_seconds", elapsed, upstream=upstream.name, operation=operation)
+        metrics.incr("upstream_calls", upstream=upstream.name, operation=operation, outcome="ok")
+        return result
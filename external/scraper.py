@@ -0,0 +1,143 @@
+"""
+Page content for ``!search``.
+
+Pages are fetched directly with the pooled HTTP client first: the body is streamed
+and dropped as soon as it is not HTML or passes ``SCRAPER_MAX_BYTES``. Firecrawl is
+only used when the direct fetch is blocked or yields too little text, which is what
+pages rendered by JavaScript look like.
+
+Which engine works is learned per domain: a domain whose direct fetches keep failing
+goes straight to Firecrawl, and is tried directly again after
+``SCRAPER_RETRY_LOCAL_SECONDS`` in case it changed.
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlparse
+
+import httpx
+
+from external.extract import extract_text
+from external.firecrawl import scrape_html
+from external.http import get_client
+from utils import get_env_var
+from utils.metrics import metrics
+from utils.singleflight import singleflight
+
+
+UPSTREAM = "scraper"
+MAX_BYTES = int(get_env_var("SCRAPER_MAX_BYTES") or 3 * 1024 * 1024)
+TIMEOUT = httpx.Timeout(float(get_env_var("SCRAPER_TIMEOUT_SECONDS") or 10), connect=5)
+MIN_TEXT_CHARS = int(get_env_var("SCRAPER_MIN_TEXT_CHARS") or 300)
+RETRY_LOCAL_SECONDS = int(get_env_var("SCRAPER_RETRY_LOCAL_SECONDS") or 24 * 3600)
+MAX_DOMAINS = 2000
+
+HTML_TYPES = ("text/html", "application/xhtml+xml")
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.5",
+    "Accept-Language": "pt-BR,pt;q=0.9,en;q=0.8",
+}
+
+
+@dataclass
+class DomainStats:
+    score: float = 1.0       # Moving average of direct fetch successes
+    remote_since: Optional[float] = None
+
+
+class DomainPreference:
+    """Per-domain choice between the direct fetch and Firecrawl, kept for the most recent domains."""
+
+    def __init__(self, alpha: float = 0.5, threshold: float = 0.3):
+        self.alpha = alpha
+        self.threshold = threshold
+        self._domains: OrderedDict[str, DomainStats] = OrderedDict()
+
+    def _stats(self, domain: str) -> DomainStats:
+        stats = self._domains.pop(domain, None) or DomainStats()
+        self._domains[domain] = stats
+        while len(self._domains) > MAX_DOMAINS:
+            self._domains.popitem(last=False)
+        return stats
+
+    def use_local(self, domain: str) -> bool:
+        stats = self._stats(domain)
+        if stats.remote_since is None:
+            return True
+        if time.monotonic() - stats.remote_since > RETRY_LOCAL_SECONDS:
+            stats.remote_since, stats.score = None, self.threshold
+            return True
+        return False
+
+    def record(self, domain: str, ok: bool) -> None:
+        stats = self._stats(domain)
+        stats.score = (1 - self.alpha) * stats.score + self.alpha * (1.0 if ok else 0.0)
+        if stats.score < self.threshold and stats.remote_since is None:
+            stats.remote_since = time.monotonic()
+            metrics.incr("scraper_remote_domains")
+
+
+domain_preference = DomainPreference()
+
+
+async def fetch_html(url: str) -> Optional[str]:
+    """HTML of ``url`` fetched directly, None if blocked, not HTML or too large."""
+    client = get_client(UPSTREAM)
+    async with client.stream("GET", url, headers=HEADERS, timeout=TIMEOUT, follow_redirects=True) as response:
+        if response.status_code >= 400:
+            metrics.incr("scraper_local_aborts", reason=f"status_{response.status_code // 100}xx")
+            return None
+
+        content_type = response.headers.get("content-type", "").lower()
+        if not content_type.startswith(HTML_TYPES):
+            metrics.incr("scraper_local_aborts", reason="content_type")
+            return None
+
+        if int(response.headers.get("content-length") or 0) > MAX_BYTES:
+            metrics.incr("scraper_local_aborts", reason="size")
+            return None
+
+        body = bytearray()
+        async for chunk in response.aiter_bytes():
+            body.extend(chunk)
+            if len(body) > MAX_BYTES:
+                metrics.incr("scraper_local_aborts", reason="size")
+                return None
+
+        return body.decode(response.encoding or "utf-8", errors="replace")
+
+
+async def _local_content(url: str) -> str:
+    try:
+        html = await fetch_html(url)
+    except httpx.HTTPError:
+        metrics.incr("scraper_local_aborts", reason="error")
+        return ""
+    return await extract_text(html)
+
+
+@singleflight("url_content", key=lambda url: url)
+async def get_url_content(url: str) -> str:
+    """Main text of the page, empty if it could not be read by any engine."""
+    domain = urlparse(url).netloc.lower()
+
+    local = ""
+    if domain_preference.use_local(domain):
+        start = time.monotonic()
+        local = await _local_content(url)
+        ok = len(local) >= MIN_TEXT_CHARS
+        domain_preference.record(domain, ok)
+
+        metrics.incr("scraper_fetches", engine="local", outcome="ok" if ok else "fallback")
+        metrics.observe("scraper_fetch_seconds", time.monotonic() - start, engine="local")
+        if ok:
+            return local
+
+    start = time.monotonic()
+    content = await extract_text(await scrape_html(url))
+    metrics.incr("scraper_fetches", engine="firecrawl", outcome="ok" if content else "empty")
+    metrics.observe("scraper_fetch_seconds", time.monotonic() - start, engine="firecrawl")
+    # A short page is still better than nothing when Firecrawl fails too
+    return content or local
@@ -2,20 +2,40 @@ import uvicorn
 from scheduler import scheduler
 from fastapi import FastAPI
 
-from database import init_agents
-from services import set_remembers
-from api import webhook_evolution_router
+from services import (
+    set_remembers, set_response_cache_cleanup, set_message_buffer_eviction,
+    set_summarizer, set_summary_chunk_cleanup, set_message_embedder, set_web_cache_cleanup
+)
+from api import webhook_evolution_router, metrics_router
+from external.extract import close_extractor
+from external.http import close_clients
+from services.agent_registry import load_agent_registry
+from services.intent_classifier import load_intent_classifier
 
 
 app = FastAPI()
 app.include_router(webhook_evolution_router)
+app.include_router(metrics_router)
 
 @app.on_event("startup")
 async def startup_event():
-    await init_agents()
+    await load_agent_registry(scheduler)
     await set_remembers(scheduler)
+    await set_response_cache_cleanup(scheduler)
+    await set_message_buffer_eviction(scheduler)
+    await set_summarizer(scheduler)
+    await set_summary_chunk_cleanup(scheduler)
+    await set_message_embedder(scheduler)
+    await set_web_cache_cleanup(scheduler)
+    await load_intent_classifier()
     scheduler.start()
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await close_clients()
+    close_extractor()
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=90001)
@@ -6,7 +6,10 @@ from typing import Optional, List
 from datetime import timedelta
 
 from minio import Minio
+from minio.commonconfig import ENABLED, Filter
+from minio.datatypes import Object
 from minio.error import S3Error
+from minio.lifecycleconfig import Expiration, LifecycleConfig, Rule
 from PIL import Image
 
 from utils import get_env_var
@@ -172,6 +175,38 @@ class S3Client:
 
         return object_name
 
+    async def upload_file(
+            self,
+            file_path: str,
+            object_name: str,
+            content_type: str,
+            bucket_name: str = "whatsapp"
+    ) -> str:
+        """
+        Upload a file from disk to MinIO, streamed in parts
+
+        Args:
+            file_path: Local file path
+            object_name: S3 object name
+            content_type: Content type of the object
+            bucket_name: Bucket name
+
+        Returns:
+            S3 object name
+        """
+        loop = asyncio.get_event_loop()
+
+        await loop.run_in_executor(
+            None,
+            self.client.fput_object,
+            bucket_name,
+            object_name,
+            file_path,
+            content_type
+        )
+
+        return object_name
+
     async def get_presigned_url(
             self,
             sub_path: str,
@@ -234,6 +269,67 @@ class S3Client:
         except S3Error:
             return False
 
+    async def get_object_info(self, bucket_name: str, object_path: str) -> Optional[Object]:
+        """
+        Get the metadata of an object (size, content type, etag...)
+
+        Args:
+            bucket_name: Bucket name
+            object_path: Object path
+
+        Returns:
+            Object metadata, None if the object does not exist
+        """
+        if not self.client:
+            raise RuntimeError("MinIO client not initialized")
+
+        loop = asyncio.get_event_loop()
+        object_path = object_path.lstrip('/')
+
+        try:
+            return await loop.run_in_executor(
+                None,
+                self.client.stat_object,
+                bucket_name,
+                object_path
+            )
+        except S3Error:
+            return None
+
+    async def set_prefix_expiration(self, bucket_name: str, prefix: str, days: int):
+        """
+        Expire the objects under a prefix after some days (bucket lifecycle rule)
+
+        Args:
+            bucket_name: Bucket name
+            prefix: Object prefix the rule applies to
+            days: Days after creation until the objects are removed
+        """
+        loop = asyncio.get_event_loop()
+        rule_id = f"expire-{prefix.strip('/').replace('/', '-')}"
+
+        config = await loop.run_in_executor(
+            None,
+            self.client.get_bucket_lifecycle,
+            bucket_name
+        )
+        rules = [rule for rule in (config.rules if config else []) if rule.rule_id != rule_id]
+        rules.append(
+            Rule(
+                ENABLED,
+                rule_filter=Filter(prefix=prefix),
+                rule_id=rule_id,
+                expiration=Expiration(days=days),
+            )
+        )
+
+        await loop.run_in_executor(
+            None,
+            self.client.set_bucket_lifecycle,
+            bucket_name,
+            LifecycleConfig(rules)
+        )
+
     async def delete_object(self, bucket_name: str, object_path: str) -> bool:
         """
         Delete an object from bucket
@@ -1,7 +1,13 @@
-from services.manage_interaction import manage_interaction
+from services.manage_interaction import manage_interaction, manage_interaction_stream
 from services.remember import set_remembers, action_remember
 from services.translator import translate_to_pt
 from services.save_image import save_image, describe_image
 from services.message_context import verifiy_media
 from services.save_profile_pic import save_profile_pic
-from services.params import parse_params
\ No newline at end of file
+from services.params import parse_params
+from services.response_cache import set_response_cache_cleanup
+from services.message_buffer import set_message_buffer_eviction
+from services.summarizer import set_summarizer
+from services.period_summary import set_summary_chunk_cleanup
+from services.message_embedder import set_message_embedder
+from services.web_cache import set_web_cache_cleanup
\ No newline at end of file
@@ -0,0 +1,185 @@
+"""
+In-memory agent registry.
+
+Agents (``manager.agent``) are loaded once per process instead of queried on every
+call, and their prompts are compiled into templates: the ``{CURRENT_*}``
+placeholders are located once, so rendering only formats the current date into the
+precomputed slots. Chat calls use the ``static`` form instead, with the values sent
+in a separate message, so the system prompt stays identical and cacheable.
+
+``agents/*.md`` is the source of the file agents. A scheduler job polls the files'
+mtime and writes the ones whose content differs from the stored prompt to the
+database, so a prompt edit is live without a restart. The whole table is reloaded
+every ``AGENT_REFRESH_SECONDS`` as well, which picks up agents and settings edited
+directly in the database and changes written by another worker.
+"""
+import os
+import re
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Optional
+from zoneinfo import ZoneInfo
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from database import PgConnection
+from database.init_db import agent_files, sync_agent_files
+from database.models.manager import Agent
+from database.operations.manager import AgentRepository
+from log import logger
+from utils import get_env_var
+from utils.metrics import metrics
+
+
+RELOAD_SECONDS = int(get_env_var("AGENT_RELOAD_SECONDS") or 10)
+REFRESH_SECONDS = int(get_env_var("AGENT_REFRESH_SECONDS") or 60)
+TIMEZONE = ZoneInfo("America/Sao_Paulo")
+
+PLACEHOLDERS: dict[str, Callable[[datetime], str]] = {
+    "CURRENT_DATETIME": lambda now: now.strftime("%Y-%m-%d %H:%M:%S (%A)"),
+    "CURRENT_DATE": lambda now: now.strftime("%B %d, %Y"),
+    "CURRENT_YEAR": lambda now: str(now.year),
+    "CURRENT_MONTH_YEAR": lambda now: now.strftime("%B %Y"),
+}
+PLACEHOLDER_PATTERN = re.compile(r"\{(" + "|".join(PLACEHOLDERS) + r")\}")
+
+
+class Template:
+    """A prompt split into literal parts and placeholder slots."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self._parts: list[str | Callable[[datetime], str]] = []
+
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            self._parts.append(text[position:match.start()])
+            self._parts.append(PLACEHOLDERS[match.group(1)])
+            position = match.end()
+        self._parts.append(text[position:])
+
+        # Same prompt with the placeholders as references, byte-identical between calls
+        self.static = PLACEHOLDER_PATTERN.sub(r"[\1]", text)
+        self.placeholders = list(dict.fromkeys(PLACEHOLDER_PATTERN.findall(text)))
+
+    @property
+    def dynamic(self) -> bool:
+        return len(self._parts) > 1
+
+    def render(self, now: Optional[datetime] = None) -> str:
+        if not self.dynamic:
+            return self.text
+
+        now = now or datetime.now(TIMEZONE)
+        return "".join(part if isinstance(part, str) else part(now) for part in self._parts)
+
+
+def reference_values(templates: list[Template], now: Optional[datetime] = None) -> Optional[str]:
+    """Values of the references in the ``static`` prompts, sent apart so their prefix can be cached."""
+    names = list(dict.fromkeys(name for template in templates for name in template.placeholders))
+    if not names:
+        return None
+
+    now = now or datetime.now(TIMEZONE)
+    values = "\n".join(f"[{name}] = {PLACEHOLDERS[name](now)}" for name in names)
+    return f"Valores atuais das referências do prompt:\n{values}"
+
+
+@lru_cache(maxsize=256)
+def compile_template(text: str) -> Template:
+    return Template(text)
+
+
+def render(text: str, now: Optional[datetime] = None) -> str:
+    """Renders any prompt, e.g. a system prompt given by the caller instead of an agent."""
+    return compile_template(text).render(now)
+
+
+class AgentRegistry:
+    def __init__(self):
+        self._agents: dict[str, Agent] = {}
+        self._templates: dict[str, Template] = {}
+        self._mtimes: dict[str, float] = {}
+        self._loaded_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+    async def load(self, db) -> None:
+        agents = await AgentRepository(Agent, db).find_all(limit=1000)
+
+        self._agents = {agent.name: agent for agent in agents}
+        self._templates = {agent.name: compile_template(agent.prompt) for agent in agents}
+        self._loaded_at = time.monotonic()
+        metrics.set_gauge("agents_loaded", len(agents))
+
+    async def get(self, db, name: str) -> Optional[Agent]:
+        agent = self._agents.get(name)
+        if agent is None:
+            # Created after the last load, e.g. by another worker
+            agent = await AgentRepository(Agent, db).find_by_name(name)
+            if agent is not None:
+                # Detached, so a rollback of the caller's session does not expire the shared instance
+                db.expunge(agent)
+                self._agents[name] = agent
+                self._templates[name] = compile_template(agent.prompt)
+        return agent
+
+    async def template(self, db, name: str) -> Optional[Template]:
+        agent = await self.get(db, name)
+        if agent is None:
+            return None
+        return self._templates[name]
+
+    async def render(self, db, name: str, now: Optional[datetime] = None) -> Optional[str]:
+        """The agent prompt with the placeholders filled, None if the agent does not exist."""
+        agent = await self.get(db, name)
+        if agent is None:
+            return None
+        return self._templates[name].render(now)
+
+    def changed_files(self) -> list[str]:
+        changed = []
+        for name, path in agent_files().items():
+            mtime = os.path.getmtime(path)
+            if self._mtimes.get(name) != mtime:
+                changed.append(name)
+            self._mtimes[name] = mtime
+        return changed
+
+    async def reload(self) -> None:
+        changed = self.changed_files()
+        if not changed and time.monotonic() - self._loaded_at < REFRESH_SECONDS:
+            return
+
+        async with PgConnection() as db:
+            written = await sync_agent_files(db, changed) if changed else []
+            await self.load(db)
+
+        if written:
+            metrics.incr("agent_reloads", len(written))
+            await logger.info("AgentRegistry", "Reload", f"Updated from files: {', '.join(written)}")
+
+
+agent_registry = AgentRegistry()
+
+
+async def load_agent_registry(scheduler: AsyncIOScheduler):
+    """Syncs ``agents/*.md``, loads the registry and schedules the hot reload."""
+    _ = agent_registry.changed_files()
+    async with PgConnection() as db:
+        changed = await sync_agent_files(db)
+        await agent_registry.load(db)
+
+    await logger.info("AgentRegistry", "Load", f"{len(agent_registry)} agents, updated from files: {', '.join(changed) or '-'}")
+
+    scheduler.add_job(
+        agent_registry.reload,
+        'interval',
+        seconds=RELOAD_SECONDS,
+        id="agent_registry_reload",
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
@@ -0,0 +1,94 @@
+"""
+Token-budgeted conversation context.
+
+Fits chat messages into the agent's ``context_token_budget`` (tokens counted
+locally, see ``utils.tokens``) instead of a fixed number of messages. Messages
+longer than ``CONTEXT_MAX_MESSAGE_TOKENS`` are elided in the middle, so one pasted
+wall of text does not push the rest of the conversation out.
+"""
+import asyncio
+from dataclasses import dataclass, replace
+from typing import Optional
+
+from services.agent_registry import agent_registry
+from services.message_buffer import BufferedMessage
+from services.model_router import model_router
+from utils import get_env_var
+from utils.metrics import metrics
+from utils.tokens import count_tokens, correction, truncate, MESSAGE_OVERHEAD
+
+
+DEFAULT_BUDGET = int(get_env_var("CONTEXT_DEFAULT_BUDGET") or 3000)
+MAX_MESSAGE_TOKENS = int(get_env_var("CONTEXT_MAX_MESSAGE_TOKENS") or 250)
+
+
+@dataclass
+class ContextBudget:
+    agent_name: str
+    tokens: int
+    model: Optional[str]
+
+
+async def get_budget(db, agent_name: str) -> ContextBudget:
+    """Budget of the agent, counted with the tokenizer of the model it is most likely routed to."""
+    agent = await agent_registry.get(db, agent_name)
+    _, candidates = await model_router.route(db, agent)
+
+    model = candidates[0].openrouter_id if candidates else None
+    tokens = agent.context_token_budget if agent and agent.context_token_budget else DEFAULT_BUDGET
+    return ContextBudget(agent_name=agent_name, tokens=tokens, model=model)
+
+
+def _fit(
+        messages: list[BufferedMessage],
+        budget: ContextBudget,
+        reserved: str,
+        dedupe: bool,
+) -> tuple[list[BufferedMessage], int, int]:
+    available = int(budget.tokens / correction(budget.model)) - count_tokens(reserved, budget.model)
+
+    selected, seen, used, truncated = [], set(), 0, 0
+    for message in messages:
+        if dedupe:
+            if message.content.lower() in seen:
+                continue
+            seen.add(message.content.lower())
+
+        tokens = count_tokens(message.format(), budget.model) + MESSAGE_OVERHEAD
+        if count_tokens(message.content, budget.model) > MAX_MESSAGE_TOKENS:
+            message = replace(message, content=truncate(message.content, MAX_MESSAGE_TOKENS, budget.model))
+            tokens = count_tokens(message.format(), budget.model) + MESSAGE_OVERHEAD
+            truncated += 1
+
+        # The first message always goes in, an empty context is worse than a slightly long one
+        if selected and used + tokens > available:
+            break
+
+        selected.append(message)
+        used += tokens
+
+    return selected, used, truncated
+
+
+async def fit_messages(
+        messages: list[BufferedMessage],
+        budget: ContextBudget,
+        reserved: str = "",
+        dedupe: bool = False,
+) -> list[BufferedMessage]:
+    """
+    Takes messages in the given order until the budget is spent.
+
+    Args:
+        messages: Newest first for a reply context, oldest first to process a backlog
+        reserved: The rest of the prompt (summary, last message), counted against the budget
+        dedupe: Skips messages whose content was already taken, ignoring case
+    """
+    selected, used, truncated = await asyncio.to_thread(_fit, messages, budget, reserved, dedupe)
+
+    metrics.observe("context_tokens", used, agent=budget.agent_name)
+    metrics.observe("context_messages", len(selected), agent=budget.agent_name)
+    if truncated:
+        metrics.incr("context_truncated_messages", truncated, agent=budget.agent_name)
+
+    return selected
@@ -0,0 +1,250 @@
+"""
+Local intent classifier.
+
+A kNN over local embeddings of the messages already labeled by the
+``intent-classifier`` agent (``manager.interaction``). It answers when the nearest
+neighbours agree; otherwise ``classify_intent`` falls back to the LLM. Only
+text messages are classified locally: attached or quoted media changes the rules
+of the agent prompt, so those always go to the LLM.
+
+Usage:
+    python -m services.intent_classifier train [--days 180]
+    python -m services.intent_classifier report [--days 180] [--holdout 0.2]
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import statistics
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+
+from database import PgConnection
+from database.models.manager import Agent, Interaction
+from database.operations.manager import AgentRepository, InteractionRepository
+from embeddings import encode, encode_batch
+from embeddings.local import LOCAL_EMBEDDING_MODEL
+from log import logger
+from utils import get_env_var, project_root
+from utils.metrics import metrics
+
+
+CLASSIFIER_PATH = get_env_var("INTENT_CLASSIFIER_PATH") or f"{project_root}/embeddings/models/intent-classifier.npz"
+ENABLED = (get_env_var("INTENT_CLASSIFIER_LOCAL") or "true").lower() == "true"
+
+K = 7
+MIN_SIMILARITY = float(get_env_var("INTENT_CLASSIFIER_MIN_SIMILARITY") or 0.75)
+MIN_AGREEMENT = float(get_env_var("INTENT_CLASSIFIER_MIN_AGREEMENT") or 0.85)
+
+VALID_INTENTS = [
+    "remember", "search", "image", "sticker", "transcribe",
+    "resume", "model", "help", "conversation", "audio"
+]
+
+PROMPT_PATTERN = re.compile(
+    r"Mensagem: (?P<message>.*):\n"
+    r"Informações da última mensagem:\n"
+    r"Mensagem de áudio: (?P<audio>\w+)\n"
+    r"Imagem anexada: (?P<image>\w+)\n"
+    r"Quote áudio: (?P<audio_quote>\w+)\n"
+    r"Quote imagem: (?P<image_quote>\w+)",
+    re.DOTALL
+)
+
+
+def normalize_label(response: str) -> Optional[str]:
+    """``"Search, Audio"`` -> ``"search,audio"``; None if the intent is not valid."""
+    parts = [part.strip().lower() for part in response.split(",")]
+    if parts[0] not in VALID_INTENTS:
+        return None
+    return parts[0] + (",audio" if "audio" in parts[1:] else "")
+
+
+def parse_prompt(user_prompt: str) -> Optional[str]:
+    """Extracts the message of a text-only ``intent-classifier`` prompt."""
+    match = PROMPT_PATTERN.search(user_prompt)
+    if not match:
+        return None
+    if any(match.group(flag) != "Não" for flag in ("audio", "image", "audio_quote", "image_quote")):
+        return None
+    return match.group("message").strip()
+
+
+@dataclass
+class Prediction:
+    label: str
+    agreement: float
+    similarity: float
+
+
+class IntentClassifier:
+    def __init__(self, vectors: np.ndarray, labels: np.ndarray, encoder_model: str):
+        self.vectors = vectors
+        self.labels = labels
+        self.encoder_model = encoder_model
+
+    @classmethod
+    def fit(cls, messages: list[str], labels: list[str]) -> "IntentClassifier":
+        vectors = np.asarray(encode_batch(messages), dtype=np.float32)
+        return cls(vectors, np.asarray(labels), LOCAL_EMBEDDING_MODEL)
+
+    @classmethod
+    def load(cls, path: str = CLASSIFIER_PATH) -> "IntentClassifier":
+        data = np.load(path, allow_pickle=False)
+        return cls(data["vectors"], data["labels"], str(data["encoder_model"]))
+
+    def save(self, path: str = CLASSIFIER_PATH) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez_compressed(path, vectors=self.vectors, labels=self.labels, encoder_model=np.asarray(self.encoder_model))
+
+    def predict_vector(self, vector: np.ndarray) -> Optional[Prediction]:
+        if len(self.labels) < K:
+            return None
+
+        similarities = self.vectors @ vector
+        nearest = np.argpartition(-similarities, K - 1)[:K]
+
+        votes: dict[str, float] = {}
+        for idx in nearest:
+            votes[self.labels[idx]] = votes.get(self.labels[idx], 0.0) + max(float(similarities[idx]), 0.0)
+
+        label, weight = max(votes.items(), key=lambda item: item[1])
+        total = sum(votes.values())
+        if total == 0:
+            return None
+
+        return Prediction(label=str(label), agreement=weight / total, similarity=float(similarities[nearest].max()))
+
+    @staticmethod
+    def confident(prediction: Optional[Prediction]) -> bool:
+        return prediction is not None and prediction.similarity >= MIN_SIMILARITY and prediction.agreement >= MIN_AGREEMENT
+
+
+_classifier: Optional[IntentClassifier] = None
+
+
+async def load_intent_classifier() -> None:
+    global _classifier
+
+    if not ENABLED or not os.path.exists(CLASSIFIER_PATH):
+        await logger.info("IntentClassifier", "Load", "Local classifier disabled or not trained, using the LLM only")
+        return
+
+    classifier = await asyncio.to_thread(IntentClassifier.load)
+    if classifier.encoder_model != LOCAL_EMBEDDING_MODEL:
+        await logger.warn("IntentClassifier", "Load", f"Trained with {classifier.encoder_model}, retrain it for {LOCAL_EMBEDDING_MODEL}")
+        return
+
+    # Loads the encoder now instead of on the first message
+    await encode("warmup")
+    _classifier = classifier
+    await logger.info("IntentClassifier", "Load", f"{len(classifier.labels)} examples")
+
+
+async def predict_intent(message: str) -> Optional[str]:
+    """Label like ``"search"`` or ``"conversation,audio"`` when the local classifier is confident, else None."""
+    if _classifier is None or not message.strip():
+        return None
+
+    start = time.monotonic()
+    prediction = _classifier.predict_vector(np.asarray(await encode(message), dtype=np.float32))
+    metrics.observe("intent_local_seconds", time.monotonic() - start)
+
+    if not IntentClassifier.confident(prediction):
+        metrics.incr("intent_classifier", outcome="fallback")
+        return None
+
+    metrics.incr("intent_classifier", outcome="local", intent=prediction.label)
+    return prediction.label
+
+
+async def load_examples(days: int) -> tuple[list[str], list[str], list[int]]:
+    """Text-only messages labeled by the agent, with the LLM latency when recorded. Empty without the agent."""
+    async with PgConnection() as db:
+        agent = await AgentRepository(Agent, db).find_by_name("intent-classifier")
+        if agent is None:
+            return [], [], []
+        interactions = await InteractionRepository(Interaction, db).find_by_agent(
+            agent.id, start_date=datetime.now() - timedelta(days=days)
+        )
+
+    messages, labels, latencies = [], [], []
+    for interaction in interactions:
+        message = parse_prompt(interaction.user_prompt)
+        label = normalize_label(interaction.response)
+        if message and label:
+            messages.append(message)
+            labels.append(label)
+            if interaction.latency_ms is not None:
+                latencies.append(interaction.latency_ms)
+
+    return messages, labels, latencies
+
+
+async def train(days: int) -> None:
+    messages, labels, _ = await load_examples(days)
+    if not labels:
+        print(f"no intent-classifier interactions to train on in the last {days} days")
+        return
+    classifier = await asyncio.to_thread(IntentClassifier.fit, messages, labels)
+    classifier.save()
+
+    counts = {label: labels.count(label) for label in sorted(set(labels))}
+    print(f"trained on {len(labels)} examples from the last {days} days -> {CLASSIFIER_PATH}")
+    for label, count in counts.items():
+        print(f"  {label:<20} {count}")
+
+
+async def report(days: int, holdout: float) -> None:
+    messages, labels, llm_latencies = await load_examples(days)
+    if not labels:
+        print(f"no intent-classifier interactions to evaluate in the last {days} days")
+        return
+    examples = list(zip(messages, labels))
+    random.Random(42).shuffle(examples)
+
+    split = int(len(examples) * (1 - holdout))
+    train_set, test_set = examples[:split], examples[split:]
+    classifier = await asyncio.to_thread(IntentClassifier.fit, [m for m, _ in train_set], [l for _, l in train_set])
+
+    answered, correct, correct_all, latencies = 0, 0, 0, []
+    for message, label in test_set:
+        start = time.perf_counter()
+        vector = np.asarray(encode_batch([message])[0], dtype=np.float32)
+        prediction = classifier.predict_vector(vector)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        if prediction is not None and prediction.label == label:
+            correct_all += 1
+        if IntentClassifier.confident(prediction):
+            answered += 1
+            correct += prediction.label == label
+
+    total = len(test_set) or 1
+    print(f"examples: {len(train_set)} train / {len(test_set)} holdout (last {days} days)")
+    print(f"thresholds: similarity >= {MIN_SIMILARITY}, agreement >= {MIN_AGREEMENT}")
+    print(f"coverage (answered locally):  {answered / total:.1%}")
+    print(f"accuracy when answered:       {correct / (answered or 1):.1%}")
+    print(f"accuracy without thresholds:  {correct_all / total:.1%}")
+    if latencies:
+        print(f"local latency p50/p95:        {statistics.median(latencies):.1f}ms / {np.percentile(latencies, 95):.1f}ms")
+    if llm_latencies:
+        print(f"LLM latency p50/p95:          {statistics.median(llm_latencies):.0f}ms / {np.percentile(llm_latencies, 95):.0f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["train", "report"])
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.command == "train":
+        asyncio.run(train(args.days))
+    else:
+        asyncio.run(report(args.days, args.holdout))
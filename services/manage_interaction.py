@@ -1,10 +1,143 @@
+import asyncio
+import time
+from contextvars import ContextVar
 from datetime import datetime
-from typing import Optional
+from typing import Any, Optional, AsyncIterator
 from zoneinfo import ZoneInfo
 
-from database.models.manager import Model, Agent, Interaction, Command
-from database.operations.manager import ModelRepository, AgentRepository, InteractionRepository
-from external import completions
+from database.models.manager import Agent, Interaction, Command
+from database.operations.manager import InteractionRepository
+from external import completions, stream_completions, chat_payload, cached_tokens
+from external.resilience import CircuitOpenError
+from log import logger
+from services import response_cache
+from services.agent_registry import agent_registry, compile_template, reference_values
+from services.model_router import model_router, RouteModel, ATTEMPT_TIMEOUT
+from services.structured_output import (
+    OutputSchema, StructuredOutputError, parse, repair_messages, supports_response_format, dump, record
+)
+from utils.metrics import metrics
+from utils.tokens import count_messages, record_usage
+
+
+# Set to a dict in a context to add up the tokens of every call made inside it
+usage_collector: ContextVar[Optional[dict]] = ContextVar("usage_collector", default=None)
+
+
+def _collect_usage(usage: dict) -> None:
+    collected = usage_collector.get()
+    if collected is None:
+        return
+    collected["input_tokens"] = collected.get("input_tokens", 0) + (usage.get("prompt_tokens") or 0)
+    collected["output_tokens"] = collected.get("output_tokens", 0) + (usage.get("completion_tokens") or 0)
+
+
+async def _prepare_interaction(
+        db,
+        user_prompt: str,
+        system_prompt: Optional[str] = None,
+        agent_name: Optional[str] = None,
+) -> tuple[Optional[Agent], str, list[dict]]:
+    agent = await agent_registry.get(db, agent_name) if agent_name else None
+
+    # Static first: the agent prompt, then the caller's extra instructions, and only
+    # then what changes between calls, so providers can cache the prefix
+    system_prompts = []
+    if agent_name is not None:
+        system_prompts.append(await agent_registry.template(db, agent_name))
+    if system_prompt is not None:
+        system_prompts.append(compile_template(system_prompt))
+
+    messages = [{"role": "system", "content": template.static} for template in system_prompts]
+    references = reference_values(system_prompts, datetime.now(ZoneInfo("America/Sao_Paulo")))
+    if references is not None:
+        messages.append({"role": "system", "content": references})
+    messages.append({"role": "user", "content": user_prompt})
+
+    system_prompt = "\n\n".join(message["content"] for message in messages[:-1])
+    return agent, system_prompt, messages
+
+
+async def _record_prompt_tokens(agent_name: Optional[str], model: RouteModel, messages: list[dict], usage: dict) -> None:
+    """Publishes the prompt tokens billed and checks them against the local count."""
+    actual = usage.get("prompt_tokens")
+    if not actual:
+        return
+
+    metrics.observe("prompt_tokens", actual, agent=agent_name or "none")
+    metrics.incr("prompt_cached_tokens", cached_tokens(usage), agent=agent_name or "none")
+    predicted = await asyncio.to_thread(count_messages, messages, model.openrouter_id)
+    record_usage(model.openrouter_id, predicted, actual)
+
+
+async def _fallback(agent_name: Optional[str], model: RouteModel, error: Exception) -> None:
+    metrics.incr("router_fallbacks", agent=agent_name or "none", model=model.openrouter_id)
+    await logger.warn("ModelRouter", "Fallback", f"Agent: {agent_name} - Model: {model.openrouter_id} - Error: {error!r}")
+
+
+def _response_format(output_schema: Optional[OutputSchema], model: RouteModel) -> Optional[dict]:
+    if output_schema is None or not supports_response_format(model.openrouter_id):
+        return None
+    return output_schema.response_format()
+
+
+REPAIR_POLICY = "repair"
+
+
+async def _structured_response(
+        db,
+        agent_name: Optional[str],
+        model: RouteModel,
+        output_schema: OutputSchema,
+        resp: str,
+        interaction: dict,
+        attempt: int,
+) -> Any:
+    """
+    Validates the response, repairing it locally or, as a last resort, with a short call to the same model.
+
+    The repair call is recorded as an interaction of its own (``route_policy="repair"``,
+    the attempt after ``attempt``), with the fields of ``interaction`` it shares with
+    the original one.
+    """
+    try:
+        data, repaired = parse(output_schema, resp)
+        record(agent_name, "repaired" if repaired else "valid")
+        return data
+    except StructuredOutputError as error:
+        await logger.warn("StructuredOutput", "Invalid", f"Agent: {agent_name} - Model: {model.openrouter_id} - Error: {error}")
+        messages = repair_messages(output_schema, resp, error)
+
+    try:
+        start = time.monotonic()
+        req = await asyncio.wait_for(
+            completions(chat_payload(model.openrouter_id, messages, _response_format(output_schema, model))),
+            timeout=ATTEMPT_TIMEOUT
+        )
+        latency = time.monotonic() - start
+        repaired_resp = req["choices"][0]["message"]["content"]
+
+        _collect_usage(req["usage"])
+        await _record_prompt_tokens(agent_name, model, messages, req["usage"])
+        _ = await InteractionRepository(Interaction, db).create_interaction(
+            **interaction,
+            user_prompt=messages[-1]["content"],
+            response=repaired_resp,
+            input_tokens=req["usage"]["prompt_tokens"],
+            output_tokens=req["usage"]["completion_tokens"],
+            cached_tokens=cached_tokens(req["usage"]),
+            latency_ms=int(latency * 1000),
+            route_policy=REPAIR_POLICY,
+            attempt=attempt + 1,
+        )
+
+        data, _ = parse(output_schema, repaired_resp)
+    except Exception:
+        record(agent_name, "failed")
+        raise
+
+    record(agent_name, "retried")
+    return data
 
 
 async def manage_interaction(
@@ -15,56 +148,164 @@ async def manage_interaction(
         system_prompt: Optional[str] = None,
         agent_name: Optional[str] = None,
         command: Optional[Command] = None,
-) -> str:
+        cache_text: Optional[str] = None,
+        cache_context: str = "",
+        output_schema: Optional[OutputSchema] = None,
+) -> Any:
+    """
+    Runs an agent call and records the interaction.
 
-    model_repo = ModelRepository(Model, db)
-    agent_repo = AgentRepository(Agent, db)
+    ``cache_text`` and ``cache_context`` only matter for agents with ``cache_enabled``:
+    the first is the part of the prompt compared by similarity (defaults to the whole
+    ``user_prompt``), the second has to match exactly, e.g. the chat id for agents whose
+    answer depends on the conversation.
 
-    default_model = await model_repo.get_default_model()
-    agent = await agent_repo.find_by_name(agent_name) if agent_name else None
-
-    if system_prompt is not None and agent_name is not None:
-        system_prompt = f"{agent.prompt}\n\n{system_prompt}"
+    With ``output_schema`` the response is validated against it and the parsed data is
+    returned instead of the text (see ``services.structured_output``); raises
+    ``StructuredOutputError`` if no valid response could be obtained.
+    """
+    extra_system_prompt = system_prompt
+    agent, system_prompt, messages = await _prepare_interaction(
+        db, user_prompt, system_prompt, agent_name
+    )
 
-    if system_prompt is None and agent_name is not None:
-        system_prompt = agent.prompt
+    cache_key = None
+    if agent is not None and agent.cache_enabled:
+        cached, cache_key = await response_cache.lookup(
+            db, agent, cache_text or user_prompt, cache_context, extra_system_prompt
+        )
+        if cached is not None and output_schema is None:
+            return cached
+        if cached is not None:
+            try:
+                return parse(output_schema, cached)[0]
+            except StructuredOutputError:
+                pass  # Stored before the schema existed, answered again below
 
-    now = datetime.now(ZoneInfo("America/Sao_Paulo"))
+    policy, candidates = await model_router.route(db, agent)
 
-    system_prompt = system_prompt.replace("{CURRENT_DATETIME}", now.strftime("%Y-%m-%d %H:%M:%S (%A)"))
-    system_prompt = system_prompt.replace("{CURRENT_DATE}", now.strftime("%B %d, %Y"))
-    system_prompt = system_prompt.replace("{CURRENT_YEAR}", str(now.year))
-    system_prompt = system_prompt.replace("{CURRENT_MONTH_YEAR}", now.strftime("%B %Y"))
+    for attempt, model in enumerate(candidates, start=1):
+        start = time.monotonic()
+        try:
+            req = await asyncio.wait_for(
+                completions(chat_payload(model.openrouter_id, messages, _response_format(output_schema, model))),
+                timeout=ATTEMPT_TIMEOUT
+            )
+            resp = req["choices"][0]["message"]["content"]
+        except CircuitOpenError:
+            raise
+        except Exception as error:
+            model_router.record(model, time.monotonic() - start, ok=False)
+            if attempt == len(candidates):
+                raise
+            await _fallback(agent_name, model, error)
+            continue
 
-    payload_term_formatter = {
-        "model": default_model.openrouter_id,
-        "messages": [
-            {
-                "role": "system",
-                "content": system_prompt,
-            },
-            {
-                "role": "user",
-                "content": user_prompt,
-            }
-        ]
-    }
+        latency = time.monotonic() - start
+        model_router.record(model, latency, ok=True)
+        break
 
-    req = await completions(payload_term_formatter)
-    resp = req["choices"][0]["message"]["content"]
+    _collect_usage(req["usage"])
+    await _record_prompt_tokens(agent_name, model, messages, req["usage"])
 
-    interaction_repo = InteractionRepository(Interaction, db)
-    _ = await interaction_repo.create_interaction(
-        model_id=default_model.id,
+    interaction = dict(
+        model_id=model.id,
         user_id=user_id,
         group_id=group_id,
         agent_id=agent.id if agent_name else None,
         command_id=command.id if command else None,
+    )
+    interaction_repo = InteractionRepository(Interaction, db)
+    _ = await interaction_repo.create_interaction(
+        **interaction,
+        system_behavior=system_prompt,
         user_prompt=user_prompt,
         response=resp,
         input_tokens=req["usage"]["prompt_tokens"],
         output_tokens=req["usage"]["completion_tokens"],
-        system_behavior=system_prompt
+        cached_tokens=cached_tokens(req["usage"]),
+        latency_ms=int(latency * 1000),
+        route_policy=policy,
+        attempt=attempt,
     )
 
-    return resp
\ No newline at end of file
+    data = None
+    if output_schema is not None:
+        data = await _structured_response(db, agent_name, model, output_schema, resp, interaction, attempt)
+        resp = dump(data)
+
+    if cache_key is not None:
+        await response_cache.store(
+            db, agent, cache_key, model.id, resp,
+            req["usage"]["prompt_tokens"], req["usage"]["completion_tokens"], int(latency * 1000)
+        )
+
+    return data if output_schema is not None else resp
+
+
+async def manage_interaction_stream(
+        db,
+        user_prompt: str,
+        user_id: int,
+        group_id: Optional[int] = None,
+        system_prompt: Optional[str] = None,
+        agent_name: Optional[str] = None,
+        command: Optional[Command] = None,
+) -> AsyncIterator[str]:
+    """Same as ``manage_interaction`` but yields the response content as it is generated.
+
+    Falls back to the next model only while nothing has been yielded yet. The
+    interaction is recorded once the stream is exhausted.
+    """
+    agent, system_prompt, messages = await _prepare_interaction(
+        db, user_prompt, system_prompt, agent_name
+    )
+    policy, candidates = await model_router.route(db, agent)
+
+    parts = []
+    usage = {}
+    for attempt, model in enumerate(candidates, start=1):
+        start = time.monotonic()
+        try:
+            async for chunk in stream_completions(chat_payload(model.openrouter_id, messages)):
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+
+                for choice in chunk.get("choices", []):
+                    delta = choice.get("delta", {}).get("content")
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+        except CircuitOpenError:
+            raise
+        except Exception as error:
+            model_router.record(model, time.monotonic() - start, ok=False)
+            if parts or attempt == len(candidates):
+                raise
+            await _fallback(agent_name, model, error)
+            continue
+
+        latency = time.monotonic() - start
+        model_router.record(model, latency, ok=True)
+        break
+
+    _collect_usage(usage)
+    await _record_prompt_tokens(agent_name, model, messages, usage)
+
+    interaction_repo = InteractionRepository(Interaction, db)
+    _ = await interaction_repo.create_interaction(
+        model_id=model.id,
+        user_id=user_id,
+        group_id=group_id,
+        agent_id=agent.id if agent_name else None,
+        command_id=command.id if command else None,
+        user_prompt=user_prompt,
+        response="".join(parts),
+        input_tokens=usage.get("prompt_tokens", 0),
+        output_tokens=usage.get("completion_tokens"),
+        cached_tokens=cached_tokens(usage),
+        system_behavior=system_prompt,
+        latency_ms=int(latency * 1000),
+        route_policy=policy,
+        attempt=attempt,
+    )
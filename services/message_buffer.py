@@ -0,0 +1,195 @@
+"""
+Per-chat ring buffer of recent messages.
+
+Context builders (generic reply, web search, resume) read the latest messages of a
+chat from here instead of querying ``content.message`` on every reply. Messages
+are appended by the ingest path as they are saved; a chat is loaded from the
+database the first time it is read.
+
+Buffers live in the worker process. With more than one uvicorn worker a message
+can be ingested by another worker, so a chat not synced for
+``MESSAGE_BUFFER_REFRESH_SECONDS`` fetches only the messages inserted after its
+newest one. Set it to 0 when running a single worker to never refresh.
+"""
+import sys
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from database.models.content import Message
+from database.operations.content import MessageRepository
+from utils import get_env_var
+from utils.metrics import metrics
+
+
+CAPACITY = int(get_env_var("MESSAGE_BUFFER_CAPACITY") or 100)
+MAX_CHATS = int(get_env_var("MESSAGE_BUFFER_MAX_CHATS") or 500)
+IDLE_SECONDS = int(get_env_var("MESSAGE_BUFFER_IDLE_SECONDS") or 3600)
+REFRESH_SECONDS = int(get_env_var("MESSAGE_BUFFER_REFRESH_SECONDS") or 30)
+
+UNKNOWN_SENDER = "Usuário Desconhecido"
+
+
+@dataclass(frozen=True)
+class BufferedMessage:
+    id: Optional[int]
+    message_id: str
+    sender_name: str
+    content: str
+    created_at: datetime
+
+    @classmethod
+    def from_message(cls, message: Message) -> "BufferedMessage":
+        return cls(
+            id=message.id,
+            message_id=message.message_id,
+            sender_name=message.sender.name or message.sender.phone_jid or UNKNOWN_SENDER,
+            content=message.content or "",
+            created_at=message.created_at,
+        )
+
+    def format(self, today: Optional[datetime] = None) -> str:
+        """``"Name: content - HH:MM"``, with the full date for messages not sent today."""
+        today = (today or datetime.now()).date()
+        if self.created_at.date() != today:
+            timestamp = self.created_at.strftime('%d/%m/%Y %H:%M')
+        else:
+            timestamp = self.created_at.strftime('%H:%M')
+        return f"{self.sender_name}: {self.content} - {timestamp}"
+
+    def size(self) -> int:
+        return sys.getsizeof(self.content) + sys.getsizeof(self.sender_name) + sys.getsizeof(self.message_id) + 200
+
+
+class ChatBuffer:
+    def __init__(self):
+        self.messages: deque[BufferedMessage] = deque(maxlen=CAPACITY)
+        self.last_access = time.monotonic()
+        self.synced_at = time.monotonic()
+
+    @property
+    def last_id(self) -> Optional[int]:
+        ids = [message.id for message in self.messages if message.id is not None]
+        return max(ids) if ids else None
+
+    def add(self, message: BufferedMessage) -> None:
+        for idx, existing in enumerate(self.messages):
+            if existing.message_id == message.message_id:
+                self.messages[idx] = message
+                return
+
+        if self.messages and message.created_at < self.messages[-1].created_at:
+            # Late arrival (e.g. synced from another worker), keep the buffer ordered
+            ordered = sorted([*self.messages, message], key=lambda item: item.created_at)
+            self.messages = deque(ordered[-CAPACITY:], maxlen=CAPACITY)
+            return
+        self.messages.append(message)
+
+
+def chat_key(group_id: Optional[int], user_id: Optional[int]) -> str:
+    return f"group:{group_id}" if group_id is not None else f"user:{user_id}"
+
+
+class MessageBuffer:
+    def __init__(self):
+        self._chats: OrderedDict[str, ChatBuffer] = OrderedDict()
+
+    def append(self, message: Message, sender_name: str) -> None:
+        """
+        Adds a message just saved to the chats it belongs to: its group and its sender,
+        mirroring the group and sender queries. Chats not in memory are skipped, they
+        load everything on their first read.
+        """
+        buffered = BufferedMessage(
+            id=message.id,
+            message_id=message.message_id,
+            sender_name=sender_name or UNKNOWN_SENDER,
+            content=message.content or "",
+            created_at=message.created_at,
+        )
+        keys = [chat_key(None, message.user_id)]
+        if message.group_id is not None:
+            keys.append(chat_key(message.group_id, None))
+
+        for key in keys:
+            chat = self._chats.get(key)
+            if chat is not None:
+                chat.add(buffered)
+        self._publish()
+
+    async def recent(self, db, limit: int, group_id: Optional[int] = None, user_id: Optional[int] = None) -> list[BufferedMessage]:
+        """Latest ``limit`` messages of a group, or sent by a user when no group is given, newest first."""
+        key = chat_key(group_id, user_id)
+        chat = self._chats.get(key)
+        message_repo = MessageRepository(Message, db)
+
+        if chat is None or limit > CAPACITY:
+            metrics.incr("message_buffer_lookups", outcome="miss")
+            messages = await message_repo.find_chat_messages(group_id=group_id, sender_id=user_id, limit=max(limit, CAPACITY))
+            chat = ChatBuffer()
+            for message in reversed(messages):
+                chat.add(BufferedMessage.from_message(message))
+            self._chats[key] = chat
+            self._evict_overflow()
+
+        elif REFRESH_SECONDS and time.monotonic() - chat.synced_at > REFRESH_SECONDS:
+            metrics.incr("message_buffer_lookups", outcome="refresh")
+            messages = await message_repo.find_chat_messages(group_id=group_id, sender_id=user_id, after_id=chat.last_id, limit=CAPACITY)
+            for message in reversed(messages):
+                chat.add(BufferedMessage.from_message(message))
+            chat.synced_at = time.monotonic()
+
+        else:
+            metrics.incr("message_buffer_lookups", outcome="hit")
+
+        hits = metrics.counter("message_buffer_lookups", outcome="hit")
+        lookups = hits + metrics.counter("message_buffer_lookups", outcome="miss") + metrics.counter("message_buffer_lookups", outcome="refresh")
+        metrics.set_gauge("message_buffer_hit_rate", round(hits / lookups, 3))
+
+        chat.last_access = time.monotonic()
+        self._chats.move_to_end(key)
+        self._publish()
+
+        return list(reversed(chat.messages))[:limit]
+
+    def _evict_overflow(self) -> None:
+        while len(self._chats) > MAX_CHATS:
+            self._chats.popitem(last=False)
+            metrics.incr("message_buffer_evictions", reason="capacity")
+
+    def evict_idle(self) -> None:
+        threshold = time.monotonic() - IDLE_SECONDS
+        for key in [key for key, chat in self._chats.items() if chat.last_access < threshold]:
+            del self._chats[key]
+            metrics.incr("message_buffer_evictions", reason="idle")
+        self._publish()
+
+    def _publish(self) -> None:
+        messages = sum(len(chat.messages) for chat in self._chats.values())
+        metrics.set_gauge("message_buffer_chats", len(self._chats))
+        metrics.set_gauge("message_buffer_messages", messages)
+
+    def memory_bytes(self) -> int:
+        return sum(message.size() for chat in self._chats.values() for message in chat.messages)
+
+
+message_buffer = MessageBuffer()
+
+
+async def evict_idle_chats():
+    message_buffer.evict_idle()
+    metrics.set_gauge("message_buffer_bytes", message_buffer.memory_bytes())
+
+
+async def set_message_buffer_eviction(scheduler: AsyncIOScheduler):
+    scheduler.add_job(
+        evict_idle_chats,
+        'interval',
+        minutes=5,
+        id="message_buffer_eviction",
+        replace_existing=True
+    )
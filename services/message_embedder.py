@@ -0,0 +1,101 @@
+"""
+Conversation memory over the embedded chat history.
+
+A scheduler job embeds the messages saved since its last run, in batches, with the
+local encoder (``content.message.content_embedding``). The generic reply then looks
+up the past messages of the chat closest to the one being answered, beyond the
+recent window that is already in the prompt.
+"""
+import asyncio
+import time
+from typing import Optional
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from database import PgConnection
+from database.models.content import Message
+from database.operations.content import MessageRepository
+from embeddings import encode, encode_batch
+from log import logger
+from services.message_buffer import BufferedMessage
+from utils import get_env_var
+from utils.metrics import metrics
+
+
+ENABLED = (get_env_var("CONVERSATION_MEMORY") or "true").lower() == "true"
+INTERVAL_SECONDS = int(get_env_var("MESSAGE_EMBEDDING_INTERVAL_SECONDS") or 30)
+BATCH_SIZE = int(get_env_var("MESSAGE_EMBEDDING_BATCH_SIZE") or 256)
+MAX_BATCHES = 20
+TOP_K = int(get_env_var("CONVERSATION_MEMORY_TOP_K") or 5)
+MIN_SIMILARITY = float(get_env_var("CONVERSATION_MEMORY_MIN_SIMILARITY") or 0.55)
+MIN_QUERY_LENGTH = 12
+
+
+async def embed_pending_messages():
+    async with PgConnection() as db:
+        message_repo = MessageRepository(Message, db)
+
+        for _ in range(MAX_BATCHES):
+            pending = await message_repo.find_pending_embedding(BATCH_SIZE)
+            if not pending:
+                break
+
+            start = time.monotonic()
+            vectors = await asyncio.to_thread(encode_batch, [content for _, content in pending])
+            await message_repo.set_embeddings({message_id: vector for (message_id, _), vector in zip(pending, vectors)})
+
+            metrics.incr("message_embeddings", len(pending))
+            metrics.observe("message_embedding_batch_seconds", time.monotonic() - start)
+
+            if len(pending) < BATCH_SIZE:
+                break
+
+        metrics.set_gauge("message_embedding_backlog", await message_repo.count_pending_embedding())
+
+
+async def recall(
+        db,
+        query: str,
+        group_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        exclude_ids: Optional[list[int]] = None,
+) -> list[BufferedMessage]:
+    """Past messages of the chat related to ``query``, oldest first. Empty when disabled or on error."""
+    if not ENABLED or len(query.strip()) < MIN_QUERY_LENGTH:
+        return []
+
+    start = time.monotonic()
+    try:
+        embedding = await encode(query)
+        # Savepoint: a failed query must not abort the caller's transaction, nor expire
+        # what it already loaded (as a full rollback would)
+        async with db.begin_nested():
+            message_repo = MessageRepository(Message, db)
+            found = await message_repo.find_similar_in_chat(
+                embedding, group_id=group_id, sender_id=user_id,
+                exclude_ids=exclude_ids, min_similarity=MIN_SIMILARITY, limit=TOP_K
+            )
+    except Exception as error:
+        await logger.error("ConversationMemory", "Recall", str(error))
+        return []
+
+    metrics.observe("conversation_memory_seconds", time.monotonic() - start)
+    metrics.observe("conversation_memory_messages", len(found))
+
+    messages = [BufferedMessage.from_message(message) for message, _ in found]
+    return sorted(messages, key=lambda message: message.created_at)
+
+
+async def set_message_embedder(scheduler: AsyncIOScheduler):
+    if not ENABLED:
+        return
+
+    scheduler.add_job(
+        embed_pending_messages,
+        'interval',
+        seconds=INTERVAL_SECONDS,
+        id="message_embedder",
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
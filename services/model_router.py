@@ -0,0 +1,177 @@
+"""
+Model routing for agent calls.
+
+Each agent has a ``routing_policy`` (``manager.agent``) that orders the candidate
+models of a call:
+
+- ``default``: the ``text_default`` model, then the other routable models as fallback
+- ``pinned``: the agent ``pinned_model_id``, then the ``default`` chain
+- ``fastest``: lowest expected latency among the models under ``max_input_price``
+- ``cheapest``: lowest price among the models with an acceptable error rate and latency
+
+The candidates are the models flagged ``routable``. Latency and error rate are kept
+per model in a rolling window, warmed from ``manager.interaction.latency_ms`` on the
+first call of the process. Callers try the candidates in order, falling back to the
+next one on timeout or error.
+"""
+import asyncio
+import statistics
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from database.models.manager import Model, Agent, Interaction
+from database.operations.manager import ModelRepository, InteractionRepository
+from utils import get_env_var
+from utils.metrics import metrics
+
+
+ROUTER_WINDOW = 100
+MIN_SAMPLES = 5
+MODELS_TTL = 300  # Seconds before the routable models are read again
+PRIOR_LATENCY = 3.0  # Optimistic, so models without samples get tried
+ERROR_PENALTY = 4.0
+
+ATTEMPT_TIMEOUT = float(get_env_var("ROUTER_ATTEMPT_TIMEOUT") or 60)
+MAX_ATTEMPTS = int(get_env_var("ROUTER_MAX_ATTEMPTS") or 3)
+MAX_ERROR_RATE = float(get_env_var("ROUTER_MAX_ERROR_RATE") or 0.2)
+ACCEPTABLE_LATENCY = float(get_env_var("ROUTER_ACCEPTABLE_LATENCY") or 20)
+
+POLICIES = ("default", "pinned", "fastest", "cheapest")
+
+
+@dataclass(frozen=True)
+class RouteModel:
+    id: int
+    name: str
+    openrouter_id: str
+    input_price: float
+    output_price: float
+    text_default: bool
+
+    @classmethod
+    def from_model(cls, model: Model) -> "RouteModel":
+        return cls(
+            id=model.id,
+            name=model.name,
+            openrouter_id=model.openrouter_id,
+            input_price=float(model.input_price or 0),
+            output_price=float(model.output_price or 0),
+            text_default=bool(model.text_default),
+        )
+
+
+class ModelStats:
+    def __init__(self, window: int = ROUTER_WINDOW):
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.outcomes: deque[bool] = deque(maxlen=window)
+
+    def record(self, latency: float, ok: bool) -> None:
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency)
+
+    @property
+    def error_rate(self) -> float:
+        if len(self.outcomes) < MIN_SAMPLES:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    @property
+    def latency(self) -> float:
+        if len(self.latencies) < MIN_SAMPLES:
+            return PRIOR_LATENCY
+        return statistics.median(self.latencies)
+
+
+class ModelRouter:
+    def __init__(self):
+        self._models: dict[int, RouteModel] = {}
+        self._stats: dict[int, ModelStats] = {}
+        self._loaded_at = 0.0
+        self._warmed = False
+        self._lock = asyncio.Lock()
+
+    def stats(self, model_id: int) -> ModelStats:
+        if model_id not in self._stats:
+            self._stats[model_id] = ModelStats()
+        return self._stats[model_id]
+
+    async def _refresh(self, db) -> None:
+        if time.monotonic() - self._loaded_at < MODELS_TTL:
+            return
+
+        async with self._lock:
+            if time.monotonic() - self._loaded_at < MODELS_TTL:
+                return
+
+            models = await ModelRepository(Model, db).get_routable_models()
+            self._models = {model.id: RouteModel.from_model(model) for model in models}
+
+            if not self._warmed:
+                samples = await InteractionRepository(Interaction, db).get_recent_latencies(limit_per_model=ROUTER_WINDOW)
+                for model_id, latency_ms in samples:
+                    self.stats(model_id).record(latency_ms / 1000, ok=True)
+                self._warmed = True
+
+            self._loaded_at = time.monotonic()
+
+    def _score(self, model: RouteModel) -> float:
+        stats = self.stats(model.id)
+        return stats.latency * (1 + ERROR_PENALTY * stats.error_rate)
+
+    def _acceptable(self, model: RouteModel) -> bool:
+        stats = self.stats(model.id)
+        return stats.error_rate <= MAX_ERROR_RATE and stats.latency <= ACCEPTABLE_LATENCY
+
+    def _default_chain(self) -> list[RouteModel]:
+        defaults = [model for model in self._models.values() if model.text_default]
+        others = sorted((model for model in self._models.values() if not model.text_default), key=self._score)
+        return defaults + others
+
+    async def route(self, db, agent: Optional[Agent]) -> tuple[str, list[RouteModel]]:
+        """Returns the policy applied and the candidate models, in the order they should be tried."""
+        await self._refresh(db)
+
+        policy = agent.routing_policy if agent is not None and agent.routing_policy in POLICIES else "default"
+        models = list(self._models.values())
+
+        if policy == "pinned":
+            pinned = self._models.get(agent.pinned_model_id)
+            if pinned is None and agent.pinned_model_id is not None:
+                model = await ModelRepository(Model, db).find_by_id(agent.pinned_model_id)
+                pinned = RouteModel.from_model(model) if model else None
+            chain = self._default_chain()
+            candidates = ([pinned] if pinned else []) + [model for model in chain if pinned is None or model.id != pinned.id]
+
+        elif policy == "fastest":
+            ceiling = float(agent.max_input_price) if agent.max_input_price is not None else None
+            allowed = [model for model in models if ceiling is None or model.input_price <= ceiling]
+            candidates = sorted(allowed, key=self._score)
+
+        elif policy == "cheapest":
+            candidates = sorted(
+                models,
+                key=lambda model: (not self._acceptable(model), model.input_price + model.output_price, self._score(model))
+            )
+
+        else:
+            candidates = self._default_chain()
+
+        if not candidates:
+            candidates = self._default_chain()
+
+        return policy, candidates[:MAX_ATTEMPTS]
+
+    def record(self, model: RouteModel, latency: float, ok: bool) -> None:
+        stats = self.stats(model.id)
+        stats.record(latency, ok)
+
+        metrics.incr("router_calls", model=model.openrouter_id, outcome="ok" if ok else "error")
+        metrics.set_gauge("router_error_rate", round(stats.error_rate, 3), model=model.openrouter_id)
+        if ok:
+            metrics.observe("router_latency_seconds", latency, model=model.openrouter_id)
+
+
+model_router = ModelRouter()
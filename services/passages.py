@@ -0,0 +1,124 @@
+"""
+Passage selection for the ``source-resumer`` prompt.
+
+The extracted text of a page is split into passages (paragraphs, merged up to
+``PASSAGE_TOKENS`` or split by sentence when longer), the passages are scored
+against the search terms and the question with BM25, and only the best ones are
+kept, up to the token budget of the source. They go into the prompt in the order
+they appear in the page.
+"""
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Optional
+
+from utils.metrics import metrics
+from utils.tokens import count_tokens, truncate
+
+
+PASSAGE_TOKENS = 160
+BM25_K1 = 1.5
+BM25_B = 0.75
+SEPARATOR = "\n[...]\n"
+
+PARAGRAPH_PATTERN = re.compile(r"\n\s*\n|\n(?=[-*•] )")
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+WORD_PATTERN = re.compile(r"\w+")
+
+# Too common to tell passages apart
+STOPWORDS = frozenset(
+    "a o as os um uma de da do das dos e em no na nos nas por para com sem que se ao aos "
+    "the of and to in on for with is are was be it this that by as at or from an"
+    .split()
+)
+
+
+def terms(text: str) -> list[str]:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return [word for word in WORD_PATTERN.findall(text) if word not in STOPWORDS and len(word) > 1]
+
+
+def split_passages(text: str, model: Optional[str] = None) -> list[str]:
+    passages, current = [], ""
+    for paragraph in PARAGRAPH_PATTERN.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+
+        pieces = [paragraph]
+        if count_tokens(paragraph, model) > PASSAGE_TOKENS:
+            pieces = SENTENCE_PATTERN.split(paragraph)
+
+        for piece in pieces:
+            candidate = f"{current}\n{piece}" if current else piece
+            if current and count_tokens(candidate, model) > PASSAGE_TOKENS:
+                passages.append(current)
+                candidate = piece
+            current = candidate
+
+    if current:
+        passages.append(current)
+    return passages
+
+
+def bm25_scores(passages: list[str], query: str) -> list[float]:
+    query_terms = set(terms(query))
+    documents = [Counter(terms(passage)) for passage in passages]
+    if not documents or not query_terms:
+        return [0.0] * len(passages)
+
+    average_length = sum(sum(document.values()) for document in documents) / len(documents) or 1
+    frequencies = {term: sum(1 for document in documents if term in document) for term in query_terms}
+
+    scores = []
+    for document in documents:
+        length = sum(document.values())
+        score = 0.0
+        for term in query_terms:
+            count = document.get(term, 0)
+            if not count:
+                continue
+            idf = math.log(1 + (len(documents) - frequencies[term] + 0.5) / (frequencies[term] + 0.5))
+            score += idf * count * (BM25_K1 + 1) / (count + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length))
+        scores.append(score)
+    return scores
+
+
+def _record_tokens(original: int, selected: int) -> None:
+    metrics.incr("search_passage_tokens", original, outcome="extracted")
+    metrics.incr("search_passage_tokens", selected, outcome="selected")
+    metrics.incr("search_passage_tokens", original - selected, outcome="saved")
+
+
+def select_passages(text: str, query: str, budget: int, model: Optional[str] = None) -> str:
+    """The passages of ``text`` most relevant to ``query`` that fit ``budget`` tokens. Blocking."""
+    original = count_tokens(text, model)
+    if original <= budget:
+        _record_tokens(original, original)
+        return text
+
+    passages = split_passages(text, model)
+    scores = bm25_scores(passages, query)
+    # Stable sort: passages without any query term keep the page order, so the lead comes first
+    ranked = sorted(range(len(passages)), key=lambda idx: scores[idx], reverse=True)
+
+    selected, used = [], 0
+    for idx in ranked:
+        tokens = count_tokens(passages[idx], model)
+        if used + tokens > budget:
+            continue
+        selected.append(idx)
+        used += tokens
+
+    if not selected:
+        # Passages longer than the budget, e.g. text without punctuation
+        selected_text = truncate(text, budget, model)
+        used = count_tokens(selected_text, model)
+    else:
+        selected_text = SEPARATOR.join(passages[idx] for idx in sorted(selected))
+
+    _record_tokens(original, used)
+    metrics.observe("search_passage_ratio", used / original)
+    return selected_text
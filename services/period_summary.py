@@ -0,0 +1,187 @@
+"""
+Map-reduce summaries of long periods (``!resume :period=1d``).
+
+The messages of the period are split into chunks that fit the ``resume-map`` token
+budget, the chunks are summarized concurrently and the partial summaries are
+combined by ``resume-reduce`` (in more than one round if they do not fit its budget).
+
+Chunk summaries are stored in ``content.summary_chunk`` by message id range. A later
+call covering the same messages reuses them: chunking starts a new chunk wherever a
+stored one begins, so only the messages outside stored ranges are summarized again.
+"""
+import asyncio
+import re
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+from typing import Optional
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from database import PgConnection
+from database.models.content import Message, SummaryChunk
+from database.operations.content import MessageRepository, SummaryChunkRepository
+from log import logger
+from services.context_builder import ContextBudget, get_budget, MAX_MESSAGE_TOKENS
+from services.manage_interaction import manage_interaction
+from services.message_buffer import BufferedMessage
+from utils import get_env_var
+from utils.metrics import metrics
+from utils.tokens import count_tokens, truncate, MESSAGE_OVERHEAD
+
+
+MAX_MESSAGES = int(get_env_var("RESUME_MAX_MESSAGES") or 5000)
+CONCURRENCY = int(get_env_var("RESUME_MAP_CONCURRENCY") or 4)
+MAX_PERIOD = timedelta(days=7)
+CHUNK_RETENTION = MAX_PERIOD + timedelta(days=1)
+SEPARATOR = "\n---\n"
+
+PERIOD_PATTERN = re.compile(r"^(\d+)([mhd])$")
+PERIOD_UNITS = {"m": "minutes", "h": "hours", "d": "days"}
+
+
+@dataclass
+class Chunk:
+    first_message_id: int
+    last_message_id: int
+    messages: list[BufferedMessage]
+    summary: Optional[str] = None
+
+
+def parse_period(value) -> Optional[timedelta]:
+    """``"30m"``, ``"6h"`` or ``"1d"``; a bare number is read as hours. None if invalid or above 7 days."""
+    match = PERIOD_PATTERN.match(f"{value}h" if isinstance(value, int) else str(value).lower())
+    if not match:
+        return None
+
+    period = timedelta(**{PERIOD_UNITS[match.group(2)]: int(match.group(1))})
+    if not period or period > MAX_PERIOD:
+        return None
+    return period
+
+
+def _partition(messages: list[BufferedMessage], stored: list[SummaryChunk], budget: ContextBudget) -> list[Chunk]:
+    # Widest stored chunk per first message, ``find_in_range`` returns them first
+    stored_by_first: dict[int, SummaryChunk] = {}
+    for chunk in stored:
+        stored_by_first.setdefault(chunk.first_message_id, chunk)
+
+    chunks, idx = [], 0
+    while idx < len(messages):
+        found = stored_by_first.get(messages[idx].id)
+        if found is not None:
+            chunks.append(Chunk(found.first_message_id, found.last_message_id, [], found.summary))
+            while idx < len(messages) and messages[idx].id <= found.last_message_id:
+                idx += 1
+            continue
+
+        current, used = [], 0
+        while idx < len(messages):
+            message = messages[idx]
+            if current and message.id in stored_by_first:
+                break
+
+            if count_tokens(message.content, budget.model) > MAX_MESSAGE_TOKENS:
+                message = replace(message, content=truncate(message.content, MAX_MESSAGE_TOKENS, budget.model))
+            tokens = count_tokens(message.format(), budget.model) + MESSAGE_OVERHEAD
+            if current and used + tokens > budget.tokens:
+                break
+
+            current.append(message)
+            used += tokens
+            idx += 1
+
+        chunks.append(Chunk(current[0].id, current[-1].id, current))
+
+    return chunks
+
+
+def _pack(summaries: list[str], budget: ContextBudget) -> list[list[str]]:
+    """Groups consecutive summaries so each group fits the budget."""
+    groups, current, used = [], [], 0
+    for summary in summaries:
+        tokens = count_tokens(summary, budget.model) + MESSAGE_OVERHEAD
+        if current and used + tokens > budget.tokens:
+            groups.append(current)
+            current, used = [], 0
+        current.append(summary)
+        used += tokens
+
+    if current:
+        groups.append(current)
+    return groups
+
+
+async def _run_agent(semaphore: asyncio.Semaphore, agent_name: str, prompt: str, user_id: int, group_id: int) -> str:
+    # One session per call, an AsyncSession can not be shared by concurrent tasks
+    async with semaphore:
+        async with PgConnection() as db:
+            return await manage_interaction(db, prompt, agent_name=agent_name, user_id=user_id, group_id=group_id)
+
+
+async def _map(semaphore: asyncio.Semaphore, chunk: Chunk, user_id: int, group_id: int) -> None:
+    prompt = "\n".join(message.format() for message in chunk.messages)
+    chunk.summary = await _run_agent(semaphore, "resume-map", prompt, user_id, group_id)
+
+    async with PgConnection() as db:
+        _ = await SummaryChunkRepository(SummaryChunk, db).save_chunk(
+            group_id, chunk.first_message_id, chunk.last_message_id, len(chunk.messages), chunk.summary
+        )
+
+
+async def _reduce(semaphore: asyncio.Semaphore, summaries: list[str], budget: ContextBudget, user_id: int, group_id: int) -> str:
+    while True:
+        groups = _pack(summaries, budget)
+        if len(groups) == 1 or len(groups) == len(summaries):
+            # Either everything fits or no two summaries fit together, one last call with all of them
+            return await _run_agent(semaphore, "resume-reduce", SEPARATOR.join(summaries), user_id, group_id)
+
+        metrics.incr("resume_reduce_rounds")
+        summaries = await asyncio.gather(*[
+            _run_agent(semaphore, "resume-reduce", SEPARATOR.join(group), user_id, group_id)
+            for group in groups
+        ])
+
+
+async def summarize_period(db, group_id: int, user_id: int, period: timedelta) -> Optional[str]:
+    """Summary of the group messages sent in the last ``period``, None if there are none."""
+    message_repo = MessageRepository(Message, db)
+    messages = await message_repo.find_group_messages_since(group_id, datetime.now() - period, MAX_MESSAGES)
+    messages = [BufferedMessage.from_message(message) for message in messages if (message.content or "").strip()]
+    if not messages:
+        return None
+
+    chunk_repo = SummaryChunkRepository(SummaryChunk, db)
+    stored = await chunk_repo.find_in_range(group_id, messages[0].id, messages[-1].id)
+
+    map_budget = await get_budget(db, "resume-map")
+    reduce_budget = await get_budget(db, "resume-reduce")
+    chunks = await asyncio.to_thread(_partition, messages, stored, map_budget)
+
+    pending = [chunk for chunk in chunks if chunk.summary is None]
+    metrics.incr("resume_chunks", len(chunks) - len(pending), outcome="cached")
+    metrics.incr("resume_chunks", len(pending), outcome="new")
+
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    await asyncio.gather(*[_map(semaphore, chunk, user_id, group_id) for chunk in pending])
+
+    summaries = [chunk.summary for chunk in chunks]
+    if len(summaries) == 1:
+        return summaries[0]
+    return await _reduce(semaphore, summaries, reduce_budget, user_id, group_id)
+
+
+async def clean_summary_chunks():
+    async with PgConnection() as db:
+        chunk_repo = SummaryChunkRepository(SummaryChunk, db)
+        deleted = await chunk_repo.delete_older_than(datetime.now() - CHUNK_RETENTION)
+    await logger.info("PeriodSummary", "Cleanup", f"{deleted} summary chunks removed")
+
+
+async def set_summary_chunk_cleanup(scheduler: AsyncIOScheduler):
+    scheduler.add_job(
+        clean_summary_chunks,
+        'interval',
+        hours=24,
+        id="summary_chunk_cleanup",
+        replace_existing=True
+    )
@@ -0,0 +1,142 @@
+"""
+Semantic response cache for agent calls.
+
+Agents with ``cache_enabled`` store their answers with an embedding of the prompt.
+A later call of the same agent whose prompt is similar enough (``cache_threshold``,
+cosine) and whose fingerprint matches gets the stored answer instead of a completion.
+
+The fingerprint groups what has to match exactly: the agent template, any extra
+system prompt, a context given by the caller (e.g. the chat, for agents that depend
+on the conversation) and the current date for templates using date placeholders.
+"""
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from database import PgConnection
+from database.models.manager import Agent, ResponseCache
+from database.operations.manager import ResponseCacheRepository
+from embeddings import encode
+from log import logger
+from utils.metrics import metrics
+from utils.singleflight import payload_key
+
+
+CLEANUP_INTERVAL_MINUTES = 60
+
+
+@dataclass
+class CacheKey:
+    fingerprint: str
+    text: str
+    embedding: list[float]
+
+
+def _fingerprint(agent: Agent, system_prompt: Optional[str], cache_context: str) -> str:
+    date = ""
+    if "{CURRENT_" in agent.prompt:
+        date = datetime.now(ZoneInfo("America/Sao_Paulo")).strftime("%Y-%m-%d")
+    return payload_key(agent.name, agent.prompt, system_prompt, cache_context, date)
+
+
+def _record_lookup(agent_name: str, hit: bool) -> None:
+    metrics.incr("response_cache_lookups", agent=agent_name, outcome="hit" if hit else "miss")
+    hits = metrics.counter("response_cache_lookups", agent=agent_name, outcome="hit")
+    misses = metrics.counter("response_cache_lookups", agent=agent_name, outcome="miss")
+    metrics.set_gauge("response_cache_hit_rate", round(hits / (hits + misses), 3), agent=agent_name)
+
+
+async def lookup(
+        db,
+        agent: Agent,
+        cache_text: str,
+        cache_context: str = "",
+        system_prompt: Optional[str] = None,
+) -> tuple[Optional[str], Optional[CacheKey]]:
+    """
+    Looks for a cached answer.
+
+    Returns:
+        The cached response, or None, and the key to store the answer under on a miss.
+        The key is None when the cache could not be used, so nothing is stored.
+    """
+    start = time.monotonic()
+    try:
+        key = CacheKey(
+            fingerprint=_fingerprint(agent, system_prompt, cache_context),
+            text=cache_text,
+            embedding=await encode(cache_text),
+        )
+
+        # Savepoint: a failed query must not abort the caller's transaction, nor expire
+        # the agent and everything else it already loaded (as a full rollback would)
+        async with db.begin_nested():
+            cache_repo = ResponseCacheRepository(ResponseCache, db)
+            found = await cache_repo.find_similar(agent.id, key.fingerprint, key.embedding, float(agent.cache_threshold))
+    except Exception as error:
+        await logger.error("ResponseCache", "Lookup", str(error))
+        return None, None
+
+    metrics.observe("response_cache_lookup_seconds", time.monotonic() - start, agent=agent.name)
+    _record_lookup(agent.name, found is not None)
+
+    if found is None:
+        return None, key
+
+    entry, similarity = found
+    await cache_repo.register_hit(entry.id)
+
+    metrics.incr("response_cache_saved_tokens", entry.input_tokens + entry.output_tokens, agent=agent.name)
+    metrics.incr("response_cache_saved_seconds", (entry.latency_ms or 0) / 1000, agent=agent.name)
+    metrics.observe("response_cache_similarity", similarity, agent=agent.name)
+
+    return entry.response, key
+
+
+async def store(
+        db,
+        agent: Agent,
+        key: CacheKey,
+        model_id: int,
+        response: str,
+        input_tokens: int,
+        output_tokens: Optional[int],
+        latency_ms: int,
+) -> None:
+    try:
+        cache_repo = ResponseCacheRepository(ResponseCache, db)
+        _ = await cache_repo.create_entry(
+            agent_id=agent.id,
+            model_id=model_id,
+            fingerprint=key.fingerprint,
+            prompt=key.text,
+            embedding=key.embedding,
+            response=response,
+            ttl_seconds=agent.cache_ttl_seconds,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens or 0,
+            latency_ms=latency_ms,
+        )
+    except Exception as error:
+        await logger.error("ResponseCache", "Store", str(error))
+
+
+async def clean_response_cache():
+    async with PgConnection() as db:
+        cache_repo = ResponseCacheRepository(ResponseCache, db)
+        deleted = await cache_repo.delete_expired()
+    await logger.info("ResponseCache", "Cleanup", f"{deleted} expired entries removed")
+
+
+async def set_response_cache_cleanup(scheduler: AsyncIOScheduler):
+    scheduler.add_job(
+        clean_response_cache,
+        'interval',
+        minutes=CLEANUP_INTERVAL_MINUTES,
+        id="response_cache_cleanup",
+        replace_existing=True
+    )
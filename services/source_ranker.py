@@ -0,0 +1,210 @@
+"""
+Local source selection for ``!search``.
+
+Ranks the Brave results by the similarity of their title and description to the
+question and the recent messages of the chat, with the local encoder, and picks the
+top ones with maximal marginal relevance so two results saying the same thing are
+not both taken. Used instead of the ``source-selector`` agent when
+``SEARCH_SOURCE_SELECTOR=local``; ``web_search`` still asks the agent when the best
+result is not similar enough or the encoder fails.
+
+``report`` replays the choices the agent made (``manager.interaction``) and prints
+how often the local ranking agrees with them.
+
+Usage:
+    python -m services.source_ranker report [--days 30]
+"""
+import argparse
+import asyncio
+import html
+import json
+import re
+import statistics
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+
+from database import PgConnection
+from database.models.manager import Agent, Interaction
+from database.operations.manager import AgentRepository, InteractionRepository
+from embeddings import encode_batch
+from utils import get_env_var
+
+
+TOP_K = 3
+MMR_LAMBDA = float(get_env_var("SOURCE_RANKER_MMR_LAMBDA") or 0.7)
+MIN_SCORE = float(get_env_var("SOURCE_RANKER_MIN_SCORE") or 0.25)
+HISTORY_WEIGHT = 0.5
+HISTORY_MESSAGES = 5
+CACHE_SIZE = 2000
+
+TAG_PATTERN = re.compile(r"<[^>]+>")
+PROMPT_PATTERN = re.compile(r"Users interactions:\s*(?P<conversation>.*?)\s*Sources:\s*(?P<sources>.*)", re.DOTALL)
+SOURCE_PATTERN = re.compile(
+    r"^\s*(?P<idx>\d+) - (?P<title>.*?)\n\s*URL - .*?\n\s*Description - (?P<description>.*?)\n\s*Date of publication",
+    re.DOTALL | re.MULTILINE
+)
+LAST_MESSAGE_PREFIX = "Ultima mensagem enviada: "
+MESSAGE_PATTERN = re.compile(
+    r"^(?:Ultima mensagem enviada: )?(?:[^:\n]+: )?(?P<text>.*?)(?: - (?:\d{2}/\d{2}/\d{4} )?\d{2}:\d{2})?$"
+)
+
+
+@dataclass
+class Ranking:
+    indices: list[int]
+    best_score: float
+
+
+_vectors: OrderedDict[str, np.ndarray] = OrderedDict()
+
+
+def _embed(texts: list[str]) -> np.ndarray:
+    """Normalized embeddings, reusing the ones of texts seen recently (Brave results repeat). Blocking."""
+    missing = list(dict.fromkeys(text for text in texts if text not in _vectors))
+    if missing:
+        for text, vector in zip(missing, encode_batch(missing)):
+            _vectors[text] = np.asarray(vector, dtype=np.float32)
+
+    for text in texts:
+        _vectors.move_to_end(text)
+    while len(_vectors) > CACHE_SIZE:
+        _vectors.popitem(last=False)
+
+    return np.stack([_vectors[text] for text in texts])
+
+
+def snippet(reference: dict) -> str:
+    description = html.unescape(TAG_PATTERN.sub("", reference.get("description") or ""))
+    return f"{reference.get('title') or ''}. {description}".strip()
+
+
+def _query_vector(question: str, history: list[str]) -> np.ndarray:
+    vector = _embed([question])[0]
+    if history:
+        vector = vector + HISTORY_WEIGHT * _embed(history).mean(axis=0)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+def mmr(relevance: np.ndarray, similarity: np.ndarray, k: int, lambda_: float = MMR_LAMBDA) -> list[int]:
+    """
+    Maximal marginal relevance: each pick maximizes ``lambda * relevance - (1 - lambda) *
+    similarity to the already picked``.
+    """
+    selected: list[int] = []
+    candidates = list(range(len(relevance)))
+    while candidates and len(selected) < k:
+        if selected:
+            redundancy = similarity[np.ix_(candidates, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(candidates))
+
+        scores = lambda_ * relevance[candidates] - (1 - lambda_) * redundancy
+        best = candidates[int(np.argmax(scores))]
+        selected.append(best)
+        candidates.remove(best)
+    return selected
+
+
+def rank_sources(question: str, history: list[str], web_references: list[dict], k: int = TOP_K) -> Ranking:
+    """Indices of the ``k`` results to read, in priority order. Blocking."""
+    query = _query_vector(question, history[:HISTORY_MESSAGES])
+    snippets = _embed([snippet(reference) for reference in web_references])
+
+    relevance = snippets @ query
+    indices = mmr(relevance, snippets @ snippets.T, k)
+    return Ranking(indices=indices, best_score=float(relevance.max()) if len(relevance) else 0.0)
+
+
+def _message_text(line: str) -> str:
+    return MESSAGE_PATTERN.match(line).group("text")
+
+
+def parse_prompt(prompt: str) -> Optional[tuple[str, list[str], list[dict]]]:
+    """
+    Question, history and results of a ``source-selector`` prompt. The conversation
+    is newest first, with the question either as the first message or appended at
+    the end as "Ultima mensagem enviada" when it was not in the buffer yet.
+    """
+    match = PROMPT_PATTERN.search(prompt)
+    if not match:
+        return None
+
+    lines = [line.strip() for line in match.group("conversation").splitlines() if line.strip()]
+    references = [
+        {"title": source.group("title").strip(), "description": source.group("description").strip()}
+        for source in SOURCE_PATTERN.finditer(match.group("sources"))
+    ]
+    if not lines or not references:
+        return None
+
+    if lines[-1].startswith(LAST_MESSAGE_PREFIX):
+        question, conversation = _message_text(lines[-1]), lines[:-1]
+    else:
+        question, conversation = _message_text(lines[0]), lines[1:]
+
+    # Same history as the live path: newest first, without the question itself
+    history = [text for text in map(_message_text, conversation) if text.strip() != question.strip()]
+    return question, history, references
+
+
+def parse_choice(response: str) -> list[int]:
+    """Indices chosen by the agent, in the JSON format or the older comma-separated one."""
+    try:
+        return [int(idx) for idx in json.loads(response)["sources"]]
+    except (ValueError, TypeError, KeyError):
+        return [int(idx) for idx in re.findall(r"\d+", response)]
+
+
+async def report(days: int) -> None:
+    async with PgConnection() as db:
+        agent = await AgentRepository(Agent, db).find_by_name("source-selector")
+        if agent is None:
+            print("no source-selector agent in this database")
+            return
+        interactions = await InteractionRepository(Interaction, db).find_by_agent(
+            agent.id, start_date=datetime.now() - timedelta(days=days)
+        )
+
+    _ = encode_batch(["Aquecimento."])
+    top1, overlap, total, latencies, llm_latencies = 0, 0.0, 0, [], []
+    for interaction in interactions:
+        parsed = parse_prompt(interaction.user_prompt)
+        choice = parse_choice(interaction.response)
+        if parsed is None or not choice:
+            continue
+
+        question, history, references = parsed
+        start = time.perf_counter()
+        ranking = rank_sources(question, history, references, k=len(choice))
+        latencies.append((time.perf_counter() - start) * 1000)
+        if interaction.latency_ms is not None:
+            llm_latencies.append(interaction.latency_ms)
+
+        total += 1
+        top1 += ranking.indices[0] == choice[0]
+        overlap += len(set(ranking.indices) & set(choice)) / len(choice)
+
+    if not total:
+        print(f"no source-selector interactions to compare in the last {days} days")
+        return
+
+    print(f"interactions: {total} (last {days} days), mmr lambda {MMR_LAMBDA}")
+    print(f"same first source:        {top1 / total:.1%}")
+    print(f"overlap with the agent:   {overlap / total:.1%}")
+    print(f"local latency p50/p95:    {statistics.median(latencies):.1f}ms / {np.percentile(latencies, 95):.1f}ms")
+    if llm_latencies:
+        print(f"LLM latency p50/p95:      {statistics.median(llm_latencies):.0f}ms / {np.percentile(llm_latencies, 95):.0f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["report"])
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    asyncio.run(report(args.days))
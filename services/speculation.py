@@ -0,0 +1,73 @@
+"""
+Speculative execution.
+
+Starts work before knowing whether it will be needed, e.g. the generic reply while
+the intent is still being classified. The caller later either uses the result or
+discards it. Every outcome is recorded so the trade-off can be tuned:
+
+- ``speculative_used`` / ``speculative_discarded`` / ``speculative_cancelled``
+- ``speculative_wasted_tokens``: tokens of discarded calls that had already finished.
+  Calls cancelled mid-flight are only counted by ``speculative_cancelled``, their
+  usage never comes back
+- ``speculative_saved_seconds``: time saved compared to running both in sequence
+"""
+import asyncio
+import contextvars
+import time
+from typing import Awaitable, Generic, Optional, TypeVar
+
+from services.manage_interaction import usage_collector
+from utils.metrics import metrics
+
+
+T = TypeVar("T")
+
+
+class Speculation(Generic[T]):
+    def __init__(self, name: str, work: Awaitable[T]):
+        self.name = name
+        self.usage: dict = {}
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+
+        # Own context, so only the tokens spent by this work are collected
+        context = contextvars.copy_context()
+        context.run(usage_collector.set, self.usage)
+        self.task = asyncio.create_task(work, context=context)
+        self.task.add_done_callback(self._on_done)
+
+        metrics.incr("speculative_launched", kind=name)
+
+    def _on_done(self, _):
+        self.finished_at = time.monotonic()
+
+    async def use(self, decided_at: float) -> T:
+        """
+        Waits for the speculative result.
+
+        Args:
+            decided_at: ``time.monotonic()`` when it became known the result is needed.
+                Without speculation the work would only start then
+        """
+        result = await self.task
+        # The done callback runs on a later loop turn, the task may have just finished
+        finished_at = self.finished_at or time.monotonic()
+
+        decision = decided_at - self.started_at
+        work = finished_at - self.started_at
+        metrics.incr("speculative_used", kind=self.name)
+        metrics.incr("speculative_saved_seconds", min(decision, work), kind=self.name)
+        return result
+
+    async def discard(self) -> None:
+        if not self.task.done():
+            self.task.cancel()
+            metrics.incr("speculative_cancelled", kind=self.name)
+            return
+
+        if not self.task.cancelled():
+            self.task.exception()  # Retrieved, so a failed speculation is not logged as unhandled
+
+        tokens = self.usage.get("input_tokens", 0) + self.usage.get("output_tokens", 0)
+        metrics.incr("speculative_discarded", kind=self.name)
+        metrics.incr("speculative_wasted_tokens", tokens, kind=self.name)
@@ -0,0 +1,160 @@
+"""
+Structured output for the agents that answer in JSON.
+
+The schema is sent as ``response_format`` to the models that support it
+(``STRUCTURED_OUTPUT_MODELS``) and the answer is always validated locally against
+the same schema, compiled once at import. An answer that does not parse is first
+repaired here (markdown fences, text around the object, trailing commas, raw line
+breaks in strings); only when that is not enough the model is asked again, with the
+broken answer and the error alone instead of the whole prompt.
+"""
+import json
+import re
+from typing import Any, Optional
+
+from jsonschema import Draft202012Validator
+
+from utils import get_env_var
+from utils.metrics import metrics
+
+
+MODELS = tuple(
+    prefix.strip() for prefix in
+    (get_env_var("STRUCTURED_OUTPUT_MODELS") or "openai/,google/gemini,mistralai/,x-ai/").split(",")
+    if prefix.strip()
+)
+
+FENCE_PATTERN = re.compile(r"^\s*```[a-zA-Z]*\s*|\s*```\s*$")
+TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+OUTCOMES = ("valid", "repaired", "retried", "failed")
+
+REPAIR_PROMPT = (
+    "Corrija a resposta abaixo para que seja um JSON válido de acordo com o schema. "
+    "Mantenha o conteúdo, mude apenas o formato. Retorne somente o JSON.\n\n"
+    "Schema:\n{schema}\n\nErro:\n{error}\n\nResposta:\n{response}"
+)
+
+
+class StructuredOutputError(ValueError):
+    pass
+
+
+class OutputSchema:
+    def __init__(self, name: str, schema: dict):
+        self.name = name
+        self.schema = schema
+        self._validator = Draft202012Validator(schema)
+
+    def response_format(self) -> dict:
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": self.name, "strict": True, "schema": self.schema},
+        }
+
+    def error(self, data: Any) -> Optional[str]:
+        """First validation error, None if ``data`` is valid."""
+        error = next(self._validator.iter_errors(data), None)
+        if error is None:
+            return None
+
+        path = ".".join(str(part) for part in error.absolute_path)
+        return f"{path}: {error.message}" if path else error.message
+
+
+GENERIC_REPLY = OutputSchema("generic_reply", {
+    "type": "object",
+    "properties": {
+        "text": {"type": "string"},
+        "language": {"type": "string", "enum": ["pt", "en", "es"]},
+    },
+    "required": ["text", "language"],
+    "additionalProperties": False,
+})
+
+REMEMBER = OutputSchema("remember", {
+    "type": "object",
+    "properties": {
+        "datetime": {"type": "string", "pattern": r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$"},
+        "message": {"type": "string"},
+        "feedback_message": {"type": "string"},
+    },
+    "required": ["datetime", "message", "feedback_message"],
+    "additionalProperties": False,
+})
+
+SOURCE_SELECTION = OutputSchema("source_selection", {
+    "type": "object",
+    "properties": {
+        "sources": {"type": "array", "items": {"type": "integer", "minimum": 0}, "minItems": 1, "maxItems": 3},
+    },
+    "required": ["sources"],
+    "additionalProperties": False,
+})
+
+
+def supports_response_format(model: str) -> bool:
+    return model.startswith(MODELS)
+
+
+def _repair(text: str) -> str:
+    text = FENCE_PATTERN.sub("", text)
+
+    start = min((idx for idx in (text.find("{"), text.find("[")) if idx != -1), default=-1)
+    end = max(text.rfind("}"), text.rfind("]"))
+    if start != -1 and end > start:
+        text = text[start:end + 1]
+
+    return TRAILING_COMMA_PATTERN.sub(r"\1", text)
+
+
+def parse(output_schema: OutputSchema, text: str) -> tuple[Any, bool]:
+    """
+    Parses and validates a response.
+
+    Returns:
+        The data and whether it had to be repaired
+
+    Raises:
+        StructuredOutputError: Invalid even after the local repair
+    """
+    try:
+        data = json.loads(text)
+        repaired = False
+    except json.JSONDecodeError:
+        try:
+            # strict=False accepts raw line breaks inside strings
+            data = json.loads(_repair(text), strict=False)
+        except json.JSONDecodeError as error:
+            raise StructuredOutputError(f"Invalid JSON: {error}") from None
+        repaired = True
+
+    error = output_schema.error(data)
+    if error is not None:
+        raise StructuredOutputError(f"Schema mismatch: {error}")
+    return data, repaired
+
+
+def repair_messages(output_schema: OutputSchema, text: str, error: StructuredOutputError) -> list[dict]:
+    """Prompt of the retry: only the broken response, the schema and the error."""
+    prompt = REPAIR_PROMPT.format(
+        schema=json.dumps(output_schema.schema, ensure_ascii=False), error=error, response=text
+    )
+    return [{"role": "user", "content": prompt}]
+
+
+def dump(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False)
+
+
+def record(agent_name: Optional[str], outcome: str) -> None:
+    """
+    Counts the outcome of a response: ``valid``, ``repaired`` (locally), ``retried``
+    or ``failed``. The failure rate gauge is the share of responses that did not
+    parse as they came.
+    """
+    agent = agent_name or "none"
+    metrics.incr("structured_output", agent=agent, outcome=outcome)
+
+    counts = {name: metrics.counter("structured_output", agent=agent, outcome=name) for name in OUTCOMES}
+    total = sum(counts.values())
+    metrics.set_gauge("structured_output_failure_rate", (total - counts["valid"]) / total, agent=agent)
@@ -0,0 +1,130 @@
+"""
+Rolling conversation summaries.
+
+Each group keeps a summary in ``content.chat_summary`` together with the id of the
+last message it covers. A scheduler job folds the messages that arrived since then
+into the summary, one batch at a time, through the ``conversation-summarizer``
+agent. The generic reply and ``!resume`` read the summary plus a short tail of
+recent messages instead of the raw history.
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from database import PgConnection
+from database.models.base import User
+from database.models.content import ChatSummary, Message
+from database.operations.base import UserRepository
+from database.operations.content import ChatSummaryRepository, MessageRepository
+from log import logger
+from services.context_builder import get_budget, fit_messages
+from services.manage_interaction import manage_interaction
+from services.message_buffer import BufferedMessage
+from utils import get_env_var
+from utils.metrics import metrics
+
+
+BATCH_SIZE = int(get_env_var("SUMMARY_BATCH_SIZE") or 30)
+INITIAL_WINDOW = int(get_env_var("SUMMARY_INITIAL_WINDOW") or 100)
+INTERVAL_MINUTES = int(get_env_var("SUMMARY_INTERVAL_MINUTES") or 10)
+TAIL = int(get_env_var("SUMMARY_TAIL") or 8)
+ACTIVE_HOURS = 24
+MAX_BATCH = 200
+
+_locks: dict[int, asyncio.Lock] = {}
+
+
+def _build_prompt(summary: Optional[str], messages: list[BufferedMessage]) -> str:
+    lines = "\n".join(message.format() for message in messages)
+    return f"Resumo atual:\n{summary or 'Nenhum'}\n\nNovas mensagens:\n{lines}"
+
+
+async def _pending_messages(db, group_id: int, chat_summary: Optional[ChatSummary]) -> list[BufferedMessage]:
+    message_repo = MessageRepository(Message, db)
+
+    if chat_summary is None:
+        # First summary starts from the latest messages, not the whole history
+        messages = list(reversed(await message_repo.find_chat_messages(group_id=group_id, limit=INITIAL_WINDOW)))
+    else:
+        messages = await message_repo.find_group_messages_after(group_id, chat_summary.last_message_id, MAX_BATCH)
+
+    return [BufferedMessage.from_message(message) for message in messages]
+
+
+async def refresh_summary(db, group_id: int, user_id: int, min_new: int = BATCH_SIZE) -> Optional[ChatSummary]:
+    """
+    Folds the messages not yet summarized into the group summary.
+
+    Nothing is done while fewer than ``min_new`` messages are pending, so the
+    scheduler only pays for full batches; ``!resume`` passes 1 to be up to date.
+    Each batch takes the oldest pending messages that fit the agent token budget.
+
+    Returns:
+        The current summary, None if the group has none and nothing to summarize.
+    """
+    lock = _locks.setdefault(group_id, asyncio.Lock())
+    async with lock:
+        summary_repo = ChatSummaryRepository(ChatSummary, db)
+        chat_summary = await summary_repo.find_by_group(group_id)
+
+        while True:
+            pending = await _pending_messages(db, group_id, chat_summary)
+            if not pending or len(pending) < min_new:
+                return chat_summary
+
+            summary = chat_summary.summary if chat_summary else None
+            budget = await get_budget(db, "conversation-summarizer")
+            batch = await fit_messages(pending, budget, reserved=summary or "")
+
+            with_content = [message for message in batch if message.content.strip()]
+            if with_content:
+                summary = await manage_interaction(
+                    db, _build_prompt(summary, with_content), agent_name="conversation-summarizer",
+                    user_id=user_id, group_id=group_id
+                )
+                metrics.incr("summary_messages", len(with_content))
+
+            chat_summary = await summary_repo.save_summary(group_id, summary or "", batch[-1].id, len(with_content))
+            metrics.incr("summary_refreshes")
+
+            if len(batch) == len(pending) and len(pending) < MAX_BATCH:
+                return chat_summary
+
+
+def summary_tail(messages: list[BufferedMessage], chat_summary: ChatSummary, tail: int = TAIL) -> list[BufferedMessage]:
+    """Messages (newest first) not covered by the summary, never fewer than ``tail``."""
+    uncovered = [message for message in messages if message.id is None or message.id > chat_summary.last_message_id]
+    return uncovered if len(uncovered) >= tail else messages[:tail]
+
+
+async def get_summary(db, group_id: int) -> Optional[ChatSummary]:
+    summary_repo = ChatSummaryRepository(ChatSummary, db)
+    return await summary_repo.find_by_group(group_id)
+
+
+async def summarize_active_chats():
+    async with PgConnection() as db:
+        user_gork = await UserRepository(User, db).find_by_name("Gork")
+        if user_gork is None:
+            return
+
+        summary_repo = ChatSummaryRepository(ChatSummary, db)
+        group_ids = await summary_repo.find_stale_groups(datetime.now() - timedelta(hours=ACTIVE_HOURS), BATCH_SIZE)
+
+        for group_id in group_ids:
+            try:
+                _ = await refresh_summary(db, group_id, user_gork.id)
+            except Exception as error:
+                await logger.error("Summarizer", "Refresh", f"group {group_id}: {error}")
+
+
+async def set_summarizer(scheduler: AsyncIOScheduler):
+    scheduler.add_job(
+        summarize_active_chats,
+        'interval',
+        minutes=INTERVAL_MINUTES,
+        id="conversation_summarizer",
+        replace_existing=True
+    )
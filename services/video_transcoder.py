@@ -0,0 +1,191 @@
+"""
+Re-encoding of videos WhatsApp would not take or play.
+
+``transcode`` runs ffmpeg on a local file or directly on a URL, so a video too large
+to download is read as a stream and never lands on disk whole. The output is H.264
+(main profile, yuv420p) with AAC audio in an MP4 with ``faststart``, downscaled and
+with the bitrate chosen so it fits ``TRANSCODE_TARGET_BYTES``: CRF keeps small
+videos at a constant quality and ``-maxrate``, computed from the duration, caps the
+big ones; ``-fs`` is the last guard when the duration is unknown.
+
+At most ``TRANSCODE_WORKERS`` ffmpeg processes run at once per worker. A transcode
+that passes ``TRANSCODE_TIMEOUT_SECONDS`` or whose caller is cancelled kills its
+process and removes the partial output.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from utils import get_env_var
+from utils.metrics import metrics
+
+
+WORKERS = int(get_env_var("TRANSCODE_WORKERS") or 1)
+TARGET_BYTES = int(get_env_var("TRANSCODE_TARGET_BYTES") or 40 * 1024 * 1024)
+TIMEOUT_SECONDS = float(get_env_var("TRANSCODE_TIMEOUT_SECONDS") or 120)
+PROBE_TIMEOUT_SECONDS = 20
+
+CRF = 23
+PRESET = "veryfast"
+AUDIO_BITRATE = 96_000
+MIN_VIDEO_BITRATE = 150_000
+CONTAINER_OVERHEAD = 0.95
+# Longest side of the output by video bitrate: below 600kbps 480p looks better than a blocky 720p
+MAX_SIDES = ((600_000, 480), (1_200_000, 720), (None, 1280))
+
+COMPATIBLE_VIDEO_CODECS = ("h264",)
+COMPATIBLE_AUDIO_CODECS = ("aac", None)
+COMPATIBLE_PIXEL_FORMATS = ("yuv420p", "yuvj420p")
+COMPATIBLE_FORMATS = ("mov", "mp4")
+
+_slots = asyncio.Semaphore(WORKERS)
+
+
+class TranscodeError(Exception):
+    pass
+
+
+@dataclass
+class VideoInfo:
+    format_name: str
+    duration: Optional[float]
+    video_codec: Optional[str]
+    audio_codec: Optional[str]
+    pixel_format: Optional[str]
+    width: int
+    height: int
+
+
+def _parse_probe(data: dict) -> VideoInfo:
+    streams = data.get("streams") or []
+    video = next((stream for stream in streams if stream.get("codec_type") == "video"), {})
+    audio = next((stream for stream in streams if stream.get("codec_type") == "audio"), {})
+    duration = (data.get("format") or {}).get("duration") or video.get("duration")
+
+    return VideoInfo(
+        format_name=(data.get("format") or {}).get("format_name", ""),
+        duration=float(duration) if duration else None,
+        video_codec=video.get("codec_name"),
+        audio_codec=audio.get("codec_name"),
+        pixel_format=video.get("pix_fmt"),
+        width=int(video.get("width") or 0),
+        height=int(video.get("height") or 0),
+    )
+
+
+async def _run(args: list[str], timeout: float) -> bytes:
+    """Output of the command; the process is killed on timeout or cancellation."""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *args, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+    except OSError as error:
+        raise TranscodeError(f"{args[0]} could not start: {error}") from error
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+
+    if process.returncode != 0:
+        raise TranscodeError(f"{args[0]} exited with {process.returncode}: {stderr.decode(errors='replace')[-500:]}")
+    return stdout
+
+
+async def probe(source: str) -> Optional[VideoInfo]:
+    """Codecs, dimensions and duration of a file or URL, None if ffprobe can not read it."""
+    try:
+        output = await _run(
+            ["ffprobe", "-v", "error", "-print_format", "json", "-show_format", "-show_streams", source],
+            PROBE_TIMEOUT_SECONDS,
+        )
+        return _parse_probe(json.loads(output))
+    except (TranscodeError, asyncio.TimeoutError, ValueError):
+        return None
+
+
+def is_compatible(info: VideoInfo) -> bool:
+    """Whether WhatsApp plays the video as it is."""
+    return (
+        info.video_codec in COMPATIBLE_VIDEO_CODECS
+        and info.audio_codec in COMPATIBLE_AUDIO_CODECS
+        and info.pixel_format in COMPATIBLE_PIXEL_FORMATS
+        and any(name in info.format_name.split(",") for name in COMPATIBLE_FORMATS)
+    )
+
+
+def video_bitrate(duration: Optional[float], target_bytes: int) -> Optional[int]:
+    """Video bitrate that fits ``target_bytes`` with the audio, None when the duration is unknown."""
+    if not duration:
+        return None
+    total = target_bytes * 8 * CONTAINER_OVERHEAD / duration
+    return max(int(total - AUDIO_BITRATE), MIN_VIDEO_BITRATE)
+
+
+def _max_side(bitrate: Optional[int]) -> int:
+    for limit, side in MAX_SIDES:
+        if limit is None or (bitrate is not None and bitrate < limit):
+            return side
+    return MAX_SIDES[-1][1]
+
+
+def ffmpeg_args(source: str, output: str, bitrate: Optional[int], target_bytes: int) -> list[str]:
+    side = _max_side(bitrate)
+    args = [
+        "ffmpeg", "-nostdin", "-v", "error", "-y",
+        "-i", source,
+        "-map", "0:v:0", "-map", "0:a:0?",
+        "-vf", f"scale={side}:{side}:force_original_aspect_ratio=decrease:force_divisible_by=2",
+        "-c:v", "libx264", "-preset", PRESET, "-crf", str(CRF),
+        "-profile:v", "main", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-b:a", str(AUDIO_BITRATE), "-ac", "2",
+        "-movflags", "+faststart",
+        "-fs", str(target_bytes),
+    ]
+    if bitrate is not None:
+        args += ["-maxrate", str(bitrate), "-bufsize", str(bitrate * 2)]
+    return args + [output]
+
+
+async def transcode(source: str, target_bytes: int = TARGET_BYTES, info: Optional[VideoInfo] = None) -> str:
+    """
+    Re-encodes the video of ``source`` (a path or URL) to a temporary MP4 under
+    ``target_bytes``. Returns its path; the caller removes it.
+    """
+    info = info or await probe(source)
+    bitrate = video_bitrate(info.duration if info else None, target_bytes)
+
+    fd, output = tempfile.mkstemp(prefix="transcode_", suffix=".mp4")
+    os.close(fd)
+
+    start = time.monotonic()
+    try:
+        async with _slots:
+            metrics.observe("transcode_wait_seconds", time.monotonic() - start)
+            start = time.monotonic()
+            await _run(ffmpeg_args(source, output, bitrate, target_bytes), TIMEOUT_SECONDS)
+    except asyncio.TimeoutError as error:
+        os.unlink(output)
+        metrics.incr("transcodes", outcome="timeout")
+        raise TranscodeError(f"ffmpeg did not finish in {TIMEOUT_SECONDS:.0f}s") from error
+    except BaseException:
+        os.unlink(output)
+        metrics.incr("transcodes", outcome="error")
+        raise
+
+    size = os.path.getsize(output)
+    if not size:
+        os.unlink(output)
+        metrics.incr("transcodes", outcome="error")
+        raise TranscodeError("ffmpeg produced an empty file")
+
+    metrics.incr("transcodes", outcome="ok")
+    metrics.observe("transcode_seconds", time.monotonic() - start)
+    metrics.observe("transcode_output_bytes", size)
+    return output
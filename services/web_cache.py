@@ -0,0 +1,176 @@
+"""
+Cache of what ``!search`` reads from the web: Brave results by normalized query and
+the extracted text of pages by URL.
+
+Two levels: a per-process LRU in front of ``content.web_cache``, shared by the
+workers and kept across restarts. Each kind has its own TTL. An expired entry that
+was hit at least ``WEB_CACHE_POPULAR_HITS`` times is still served for another TTL
+while a background task fetches it again (stale-while-revalidate), so the common
+questions never wait on Brave or on a scrape. A refresh whose content hash did not
+change only extends the entry.
+"""
+import asyncio
+import hashlib
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from database import PgConnection
+from database.models.content import WebCache
+from database.operations.content import WebCacheRepository
+from log import logger
+from utils import get_env_var
+from utils.metrics import metrics
+
+
+SEARCH_TTL_SECONDS = int(get_env_var("WEB_CACHE_SEARCH_TTL_SECONDS") or 6 * 3600)
+PAGE_TTL_SECONDS = int(get_env_var("WEB_CACHE_PAGE_TTL_SECONDS") or 24 * 3600)
+POPULAR_HITS = int(get_env_var("WEB_CACHE_POPULAR_HITS") or 3)
+MEMORY_ENTRIES = int(get_env_var("WEB_CACHE_MEMORY_ENTRIES") or 500)
+CLEANUP_INTERVAL_MINUTES = 60
+
+SPACES_PATTERN = re.compile(r"\s+")
+
+
+@dataclass
+class CachedValue:
+    id: Optional[int]
+    value: str
+    content_hash: str
+    hits: int
+    expires_at: datetime
+
+
+def content_hash(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def normalize_query(query: str) -> str:
+    return SPACES_PATTERN.sub(" ", query).strip().lower()
+
+
+def normalize_url(url: str) -> str:
+    return url.split("#", 1)[0].strip()
+
+
+class WebCacheLevel:
+    def __init__(self, kind: str, ttl_seconds: int):
+        self.kind = kind
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self._memory: OrderedDict[str, CachedValue] = OrderedDict()
+        self._refreshing: set[str] = set()
+        self._tasks: set[asyncio.Task] = set()
+
+    def _remember(self, fingerprint: str, cached: CachedValue) -> None:
+        self._memory[fingerprint] = cached
+        self._memory.move_to_end(fingerprint)
+        while len(self._memory) > MEMORY_ENTRIES:
+            self._memory.popitem(last=False)
+        metrics.set_gauge("web_cache_memory_entries", len(self._memory), kind=self.kind)
+
+    async def _load(self, fingerprint: str) -> Optional[CachedValue]:
+        cached = self._memory.get(fingerprint)
+        if cached is not None:
+            self._memory.move_to_end(fingerprint)
+            return cached
+
+        async with PgConnection() as db:
+            cache_repo = WebCacheRepository(WebCache, db)
+            entry = await cache_repo.find_entry(self.kind, fingerprint)
+            if entry is None:
+                return None
+            await cache_repo.register_hits(entry.id)
+
+        cached = CachedValue(entry.id, entry.value, entry.content_hash, entry.hits + 1, entry.expires_at)
+        self._remember(fingerprint, cached)
+        return cached
+
+    async def _store(self, fingerprint: str, key: str, value: str) -> None:
+        async with PgConnection() as db:
+            entry = await WebCacheRepository(WebCache, db).save_entry(
+                self.kind, fingerprint, key, value, content_hash(value), int(self.ttl.total_seconds())
+            )
+
+        previous = self._memory.get(fingerprint)
+        hits = previous.hits if previous is not None else 0
+        self._remember(fingerprint, CachedValue(entry.id, entry.value, entry.content_hash, hits, entry.expires_at))
+
+    async def _refresh(self, fingerprint: str, key: str, fetch: Callable[[], Awaitable[str]]) -> None:
+        try:
+            value = await fetch()
+            if value:
+                await self._store(fingerprint, key, value)
+        except Exception as error:
+            await logger.warn("WebCache", "Refresh", f"Kind: {self.kind} - Key: {key} - Error: {error!r}")
+        finally:
+            self._refreshing.discard(fingerprint)
+
+    def _revalidate(self, fingerprint: str, key: str, fetch: Callable[[], Awaitable[str]]) -> None:
+        if fingerprint in self._refreshing:
+            return
+        self._refreshing.add(fingerprint)
+        task = asyncio.create_task(self._refresh(fingerprint, key, fetch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _record(self, outcome: str) -> None:
+        metrics.incr("web_cache_lookups", kind=self.kind, outcome=outcome)
+
+    async def get(self, key: str, fetch: Callable[[], Awaitable[str]]) -> str:
+        """
+        Cached value of ``key``, calling ``fetch`` on a miss. Empty values are
+        returned but not stored, they usually mean the fetch failed.
+        """
+        fingerprint = content_hash(key)
+        try:
+            cached = await self._load(fingerprint)
+        except Exception as error:
+            await logger.error("WebCache", "Lookup", str(error))
+            cached = None
+
+        now = datetime.now(timezone.utc)
+        if cached is not None:
+            cached.hits += 1
+            if now < cached.expires_at:
+                self._record("hit")
+                return cached.value
+
+            if cached.hits > POPULAR_HITS and now < cached.expires_at + self.ttl:
+                self._record("stale")
+                self._revalidate(fingerprint, key, fetch)
+                return cached.value
+
+        self._record("miss")
+        value = await fetch()
+        if value:
+            try:
+                await self._store(fingerprint, key, value)
+            except Exception as error:
+                await logger.error("WebCache", "Store", str(error))
+        return value
+
+
+search_cache = WebCacheLevel("search", SEARCH_TTL_SECONDS)
+page_cache = WebCacheLevel("page", PAGE_TTL_SECONDS)
+
+
+async def clean_web_cache():
+    # Popular entries are served up to one TTL past expiry, keep them that long
+    before = datetime.now(timezone.utc) - timedelta(seconds=max(SEARCH_TTL_SECONDS, PAGE_TTL_SECONDS))
+    async with PgConnection() as db:
+        deleted = await WebCacheRepository(WebCache, db).delete_expired(before)
+    await logger.info("WebCache", "Cleanup", f"{deleted} entries removed")
+
+
+async def set_web_cache_cleanup(scheduler: AsyncIOScheduler):
+    scheduler.add_job(
+        clean_web_cache,
+        'interval',
+        minutes=CLEANUP_INTERVAL_MINUTES,
+        id="web_cache_cleanup",
+        replace_existing=True
+    )
@@ -1 +1,2 @@
-from tts.piper_ import text_to_speech
\ No newline at end of file
+from tts.piper_ import text_to_speech
+from tts.streaming import speak_stream
@@ -1,54 +1,86 @@
 import io
 import re
-import os
 import wave
 import base64
-from datetime import datetime
+import asyncio
+from functools import lru_cache
 
 from piper import SynthesisConfig, PiperVoice
 from utils import project_root
 
 
-async def text_to_speech(text: str, language: str) -> str:
-    syn_config = SynthesisConfig(
-        volume=1.0,
-        length_scale=1.0,
-        noise_scale=0.667,
-        normalize_audio=True,
-    )
+SYN_CONFIG = SynthesisConfig(
+    volume=1.0,
+    length_scale=1.0,
+    noise_scale=0.667,
+    normalize_audio=True,
+)
 
-    languages = {
-        "pt": f"{project_root}/tts/models/pt_BR-faber-medium.onnx",
-        "en": f"{project_root}/tts/models/en_US-ryan-high.onnx",
-        "es": f"{project_root}/tts/models/es_ES-davefx-medium.onnx"
-    }
+LANGUAGES = {
+    "pt": f"{project_root}/tts/models/pt_BR-faber-medium.onnx",
+    "en": f"{project_root}/tts/models/en_US-ryan-high.onnx",
+    "es": f"{project_root}/tts/models/es_ES-davefx-medium.onnx"
+}
 
-    voice = PiperVoice.load(languages.get(language if language in languages else "pt"))
+EMOJI_PATTERN = re.compile(
+    "["
+    u"\U0001F600-\U0001F64F"
+    u"\U0001F300-\U0001F5FF"
+    u"\U0001F680-\U0001F6FF"
+    u"\U0001F1E0-\U0001F1FF"
+    u"\U0001F900-\U0001F9FF"
+    u"\U0001FA70-\U0001FAFF"
+    u"\U00002700-\U000027BF"
+    u"\U0000FE00-\U0000FE0F"
+    u"\U0001F018-\U0001F270"
+    u"\U0001F600-\U0001F636"
+    "]+"
+)
+
+
+@lru_cache(maxsize=len(LANGUAGES))
+def load_voice(language: str) -> PiperVoice:
+    """Loads the Piper voice once per language; loading the .onnx model dominates short syntheses."""
+    return PiperVoice.load(LANGUAGES.get(language if language in LANGUAGES else "pt"))
 
-    wav_buffer = io.BytesIO()
 
-    emoji_pattern = re.compile(
-        "["
-        u"\U0001F600-\U0001F64F"
-        u"\U0001F300-\U0001F5FF"
-        u"\U0001F680-\U0001F6FF"
-        u"\U0001F1E0-\U0001F1FF"
-        u"\U0001F900-\U0001F9FF"
-        u"\U0001FA70-\U0001FAFF"
-        u"\U00002700-\U000027BF"
-        u"\U0000FE00-\U0000FE0F"
-        u"\U0001F018-\U0001F270"
-        u"\U0001F600-\U0001F636"
-        "]+"
-    )
-
-    tt_message = emoji_pattern.sub("", text)
-    tt_message = re.sub(r"\s+", " ", tt_message).strip()
+def clean_text(text: str) -> str:
+    tt_message = EMOJI_PATTERN.sub("", text)
+    return re.sub(r"\s+", " ", tt_message).strip()
 
+
+def synthesize(text: str, language: str) -> bytes:
+    """Synthesizes ``text`` into WAV bytes. Blocking, run it outside the event loop."""
+    voice = load_voice(language)
+
+    wav_buffer = io.BytesIO()
     with wave.open(wav_buffer, "wb") as wav_file:
-        voice.synthesize_wav(tt_message, wav_file, syn_config=syn_config)
+        voice.synthesize_wav(clean_text(text), wav_file, syn_config=SYN_CONFIG)
+
+    return wav_buffer.getvalue()
 
-    audio_bytes = wav_buffer.getvalue()
+
+def concat_wav(segments: list[bytes]) -> bytes:
+    """Joins WAV segments produced by the same voice into a single WAV file."""
+    if not segments:
+        return b""
+
+    output = io.BytesIO()
+    params = None
+
+    with wave.open(output, "wb") as out_file:
+        for segment in segments:
+            with wave.open(io.BytesIO(segment), "rb") as in_file:
+                if params is None:
+                    params = in_file.getparams()
+                    out_file.setparams(params)
+                out_file.writeframes(in_file.readframes(in_file.getnframes()))
+
+    return output.getvalue()
+
+
+async def text_to_speech(text: str, language: str) -> str:
+    audio_bytes = await asyncio.to_thread(synthesize, text, language)
     audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
 
     return audio_base64
@@ -0,0 +1,101 @@
+"""
+Sentence-level streaming TTS.
+
+Text produced by a streamed completion is split into sentences and each sentence is
+synthesized while the rest of the answer is still being generated. Synthesis runs in
+a worker thread, so it overlaps with the network reads of the completion stream.
+"""
+import asyncio
+import base64
+import re
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from tts.piper_ import synthesize, concat_wav
+
+
+DEFAULT_LANGUAGE = "pt"
+MIN_SENTENCE_CHARS = 40  # Short sentences are merged with the next one to avoid choppy audio
+
+SENTENCE_BOUNDARY = re.compile(r"[.!?…]+[\"')\]]*\s+|\n+")
+
+
+class SentenceSplitter:
+    def __init__(self, min_chars: int = MIN_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, chunk: str) -> list[str]:
+        """Adds a text chunk and returns the sentences completed by it."""
+        self._buffer += chunk
+        sentences = []
+
+        start = 0
+        for match in SENTENCE_BOUNDARY.finditer(self._buffer):
+            if match.end() - start < self.min_chars:
+                continue
+
+            sentence = self._buffer[start:match.end()].strip()
+            if sentence:
+                sentences.append(sentence)
+            start = match.end()
+
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> list[str]:
+        rest = self._buffer.strip()
+        self._buffer = ""
+        return [rest] if rest else []
+
+
+async def speak_stream(
+        chunks: AsyncIterator[str],
+        language: asyncio.Future,
+        on_segment: Optional[Callable[[str], Awaitable]] = None,
+        synthesizer: Callable[[str, str], bytes] = synthesize,
+) -> str:
+    """
+    Synthesizes a text stream sentence by sentence.
+
+    Args:
+        chunks: Text deltas, in order
+        language: Resolved with the voice language once it is known. Synthesis waits
+            for it; if the stream ends unresolved, DEFAULT_LANGUAGE is used
+        on_segment: Called with the base64 WAV of each sentence as soon as it is ready
+        synthesizer: Blocking ``(text, language) -> wav bytes`` function
+
+    Returns:
+        Base64 WAV with the whole answer
+    """
+    queue: asyncio.Queue[Optional[str]] = asyncio.Queue()
+    segments: list[bytes] = []
+
+    async def worker():
+        voice_language = await language
+        while (sentence := await queue.get()) is not None:
+            segment = await asyncio.to_thread(synthesizer, sentence, voice_language)
+            segments.append(segment)
+            if on_segment is not None:
+                await on_segment(base64.b64encode(segment).decode("utf-8"))
+
+    synthesis = asyncio.create_task(worker())
+    splitter = SentenceSplitter()
+
+    try:
+        async for chunk in chunks:
+            for sentence in splitter.feed(chunk):
+                queue.put_nowait(sentence)
+
+        for sentence in splitter.flush():
+            queue.put_nowait(sentence)
+        queue.put_nowait(None)
+
+        if not language.done():
+            language.set_result(DEFAULT_LANGUAGE)
+
+        await synthesis
+    finally:
+        if not synthesis.done():
+            synthesis.cancel()
+
+    return base64.b64encode(concat_wav(segments)).decode("utf-8")
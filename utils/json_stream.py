@@ -0,0 +1,116 @@
+"""
+Incremental decoder for flat JSON objects received in chunks.
+
+Agents like ``generic`` answer with ``{"text": "...", "language": "pt"}``. When the
+completion is streamed, this decoder emits the decoded characters of each string
+field as soon as they arrive, so the text can be consumed before the JSON closes.
+"""
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_END = object()
+
+
+class JsonFieldStream:
+    def __init__(self):
+        self.values: dict[str, str] = {}
+        self._state = "start"
+        self._key = ""
+        self._value = ""
+        self._escape: str | None = None
+        self._high_surrogate: str | None = None
+
+    def feed(self, chunk: str) -> list[tuple[str, str]]:
+        """Consumes a chunk and returns the ``(field, decoded_delta)`` pairs found in it.
+
+        Completed string fields are also stored in ``values``.
+        """
+        deltas: dict[str, list[str]] = {}
+
+        for char in chunk:
+            if self._state == "start":
+                if char == "{":
+                    self._state = "outside"
+
+            elif self._state == "outside":
+                if char == '"':
+                    self._key = ""
+                    self._state = "key"
+                elif char == "}":
+                    self._state = "start"
+
+            elif self._state == "key":
+                if self._escape is not None:
+                    self._key += char
+                    self._escape = None
+                elif char == "\\":
+                    self._escape = ""
+                elif char == '"':
+                    self._state = "colon"
+                else:
+                    self._key += char
+
+            elif self._state == "colon":
+                if char == ":":
+                    self._state = "value"
+
+            elif self._state == "value":
+                if char == '"':
+                    self._value = ""
+                    self._state = "string"
+                elif not char.isspace():
+                    self._state = "skip"
+
+            elif self._state == "skip":
+                if char == ",":
+                    self._state = "outside"
+                elif char == "}":
+                    self._state = "start"
+
+            elif self._state == "string":
+                decoded = self._decode(char)
+                if decoded is None:
+                    continue
+                if decoded is _END:
+                    self.values[self._key] = self._value
+                    self._state = "outside"
+                    continue
+
+                self._value += decoded
+                deltas.setdefault(self._key, []).append(decoded)
+
+        return [(key, "".join(parts)) for key, parts in deltas.items()]
+
+    def _decode(self, char: str):
+        if self._escape is None:
+            if char == "\\":
+                self._escape = ""
+                return None
+            if char == '"':
+                return _END
+            return char
+
+        if self._escape == "":
+            if char != "u":
+                self._escape = None
+                return _ESCAPES.get(char, char)
+            self._escape = "u"
+            return None
+
+        self._escape += char
+        if len(self._escape) < 5:
+            return None
+
+        code = int(self._escape[1:], 16)
+        self._escape = None
+
+        if 0xD800 <= code <= 0xDBFF:
+            self._high_surrogate = chr(code)
+            return None
+
+        if 0xDC00 <= code <= 0xDFFF and self._high_surrogate:
+            pair = self._high_surrogate + chr(code)
+            self._high_surrogate = None
+            return pair.encode("utf-16", "surrogatepass").decode("utf-16")
+
+        return chr(code)
+
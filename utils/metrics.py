@@ -0,0 +1,86 @@
+"""
+In-process metrics registry.
+
+Counters, gauges and observations (latency samples) are kept in memory and exposed
+as a snapshot by the ``/metrics`` route. Uvicorn runs more than one worker, so every
+value is per process; the snapshot carries the pid to tell them apart.
+
+Usage:
+from utils.metrics import metrics
+
+metrics.incr("upstream_calls", upstream="openrouter", outcome="ok")
+metrics.set_gauge("circuit_state", 1, upstream="evolution")
+metrics.observe("upstream_latency_seconds", 0.42, upstream="openrouter")
+"""
+import os
+import statistics
+import time
+from collections import deque
+
+
+MAX_OBSERVATIONS = 500
+
+
+def _key(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    formatted = ",".join(f"{label}={value}" for label, value in sorted(labels.items()))
+    return f"{name}{{{formatted}}}"
+
+
+def _percentile(sorted_values: list[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class MetricsRegistry:
+    def __init__(self, max_observations: int = MAX_OBSERVATIONS):
+        self.max_observations = max_observations
+        self.started_at = time.time()
+        self._counters: dict[str, float] = {}
+        self._gauges: dict[str, float] = {}
+        self._observations: dict[str, deque] = {}
+
+    def incr(self, name: str, value: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _key(name, labels)
+        if key not in self._observations:
+            self._observations[key] = deque(maxlen=self.max_observations)
+        self._observations[key].append(value)
+
+    def counter(self, name: str, **labels) -> float:
+        return self._counters.get(_key(name, labels), 0)
+
+    def gauge(self, name: str, **labels) -> float | None:
+        return self._gauges.get(_key(name, labels))
+
+    def snapshot(self) -> dict:
+        summaries = {}
+        for key, values in self._observations.items():
+            if not values:
+                continue
+            ordered = sorted(values)
+            summaries[key] = {
+                "count": len(ordered),
+                "avg": statistics.fmean(ordered),
+                "p50": _percentile(ordered, 0.5),
+                "p95": _percentile(ordered, 0.95),
+                "max": ordered[-1],
+            }
+
+        return {
+            "pid": os.getpid(),
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "counters": dict(self._counters),
+            "gauges": dict(self._gauges),
+            "observations": summaries,
+        }
+
+
+metrics = MetricsRegistry()
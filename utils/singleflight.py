@@ -0,0 +1,73 @@
+"""
+Request coalescing ("singleflight").
+
+Concurrent calls with the same key share a single in-flight execution: the first
+caller starts it and the others await the same result (or exception). Nothing is
+cached after the call finishes, so it only removes duplicated work that overlaps
+in time, e.g. several members of a group firing the same command within seconds.
+
+The execution runs in its own task, so a caller being cancelled (a timeout, a
+hedged request losing) does not cancel it for the others.
+
+Usage:
+from utils.singleflight import singleflight
+
+@singleflight("completions")
+async def completions(payload: dict) -> dict: ...
+"""
+import asyncio
+import functools
+import hashlib
+import json
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from utils.metrics import metrics
+
+
+T = TypeVar("T")
+
+
+def payload_key(*parts) -> str:
+    """Stable hash of JSON-like values; dict key order does not change it."""
+    encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+
+        if task is None:
+            task = asyncio.create_task(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            metrics.incr("singleflight_calls", group=self.name)
+        else:
+            metrics.incr("singleflight_saved", group=self.name)
+
+        return await asyncio.shield(task)
+
+
+def singleflight(name: str, key: Optional[Callable[..., str]] = None):
+    """
+    Coalesces concurrent calls of an async function.
+
+    Args:
+        name: Group name used in the metrics
+        key: Builds the key from the call arguments. Defaults to a hash of all of them
+    """
+    def decorator(func):
+        flight = SingleFlight(name)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            call_key = key(*args, **kwargs) if key else payload_key(args, kwargs)
+            return await flight.do(call_key, lambda: func(*args, **kwargs))
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,134 @@
+"""
+Local token counting.
+
+Counts with the tokenizer of the model family (by the OpenRouter id prefix), so
+prompts can be sized before the call. Tokenizers are downloaded from the Hugging
+Face hub once per process; when one can not be loaded the count falls back to a
+characters-per-token estimate, and the download is tried again after
+``TOKENIZER_RETRY_SECONDS``.
+
+Every call reports the ``prompt_tokens`` OpenRouter actually billed against the
+local count (``record_usage``). The ratio is published as
+``token_estimate_ratio{model}`` and a moving average of it corrects later counts.
+"""
+import math
+import time
+from typing import Optional
+
+from tokenizers import Tokenizer
+
+from utils.env_var import get_env_var
+from utils.metrics import metrics
+
+
+TOKENIZERS = {
+    "openai/": "Xenova/gpt-4o",
+    "anthropic/": "Xenova/claude-tokenizer",
+    "google/": "Xenova/gemma2-tokenizer",
+    "meta-llama/": "Xenova/llama3-tokenizer-new",
+    "mistralai/": "Xenova/mistral-tokenizer-v3",
+    "qwen/": "Qwen/Qwen2.5-7B-Instruct",
+    "deepseek/": "deepseek-ai/DeepSeek-V3",
+}
+DEFAULT_TOKENIZER = get_env_var("DEFAULT_TOKENIZER") or "Xenova/gpt-4o"
+
+TOKENIZER_RETRY_SECONDS = 300
+
+CHARS_PER_TOKEN = 3.5
+MESSAGE_OVERHEAD = 4
+ELISION = " [...] "
+
+_SMOOTHING = 0.1
+_corrections: dict[str, float] = {}
+_tokenizers: dict[str, Tokenizer] = {}
+_failed_at: dict[str, float] = {}
+
+
+def tokenizer_name(model: Optional[str]) -> str:
+    for prefix, name in TOKENIZERS.items():
+        if model and model.startswith(prefix):
+            return name
+    return DEFAULT_TOKENIZER
+
+
+def load_tokenizer(name: str) -> Optional[Tokenizer]:
+    """
+    Blocking on the first call of each tokenizer. Only loaded tokenizers are kept; a
+    failed one (e.g. a transient hub error) is None until the retry delay passes.
+    """
+    tokenizer = _tokenizers.get(name)
+    if tokenizer is not None:
+        return tokenizer
+
+    failed_at = _failed_at.get(name)
+    if failed_at is not None and time.monotonic() - failed_at < TOKENIZER_RETRY_SECONDS:
+        return None
+
+    try:
+        tokenizer = Tokenizer.from_pretrained(name)
+    except Exception:
+        _failed_at[name] = time.monotonic()
+        metrics.incr("tokenizer_load_failures", tokenizer=name)
+        return None
+
+    _failed_at.pop(name, None)
+    _tokenizers[name] = tokenizer
+    return tokenizer
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    if not text:
+        return 0
+
+    tokenizer = load_tokenizer(tokenizer_name(model))
+    if tokenizer is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+def count_messages(messages: list[dict], model: Optional[str] = None) -> int:
+    """Chat payload tokens: contents plus the per-message formatting overhead."""
+    total = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if part.get("type") == "text")
+        total += count_tokens(content or "", model) + MESSAGE_OVERHEAD
+    return total
+
+
+def truncate(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """Keeps the beginning and the end of ``text`` within ``max_tokens``, eliding the middle."""
+    tokenizer = load_tokenizer(tokenizer_name(model))
+
+    if tokenizer is None:
+        max_chars = int(max_tokens * CHARS_PER_TOKEN)
+        if len(text) <= max_chars:
+            return text
+        head = max_chars * 2 // 3
+        return text[:head] + ELISION + text[len(text) - (max_chars - head):]
+
+    offsets = tokenizer.encode(text, add_special_tokens=False).offsets
+    if len(offsets) <= max_tokens:
+        return text
+
+    head = max_tokens * 2 // 3
+    tail = max_tokens - head
+    return text[:offsets[head - 1][1]] + ELISION + text[offsets[-tail][0]:]
+
+
+def correction(model: Optional[str]) -> float:
+    """Billed / counted tokens for the model, 1.0 until a call was measured."""
+    return _corrections.get(tokenizer_name(model), 1.0)
+
+
+def record_usage(model: str, predicted: int, actual: Optional[int]) -> None:
+    if not predicted or not actual:
+        return
+
+    ratio = actual / predicted
+    metrics.observe("token_estimate_ratio", ratio, model=model)
+
+    name = tokenizer_name(model)
+    previous = _corrections.get(name, ratio)
+    _corrections[name] = min(max(previous + _SMOOTHING * (ratio - previous), 0.5), 2.0)